@@ -0,0 +1,364 @@
+"""
+Benchmarks for the hot paths of the Python services, at increasing scales:
+
+- optimizer:  solve_fleet and run_optimization (assets x horizon), full and
+              incremental re-optimization, tenants planned in parallel, and
+              time grid alignment (rows)
+- forecaster: train_and_predict (history rows): raw buckets cold and with a
+              registered model, and server-side aggregated profiles
+- simulator:  Asset.generate_telemetry and the vectorized FleetEngine (assets)
+
+Inputs come from generators.py; Kafka and Postgres are replaced by the
+in-memory stand-ins in standins.py. Each suite runs in its own process
+(every service has its own `main` module).
+
+Timings are compared with baseline.json: a case fails when its median is
+more than --tolerance slower than its baseline. Baselines are machine
+specific, so record them on the machine that runs the comparison.
+
+    python benchmarks/bench.py                        # all suites, compare with the baseline
+    python benchmarks/bench.py --suite optimizer --filter incremental
+    python benchmarks/bench.py --update-baseline      # record the current timings
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+SERVICES = {
+    "optimizer": os.path.join(ROOT, "src", "EMMA.Optimizer"),
+    "forecaster": os.path.join(ROOT, "src", "EMMA.SolarForecaster"),
+    "simulator": os.path.join(ROOT, "src", "energy-simulator"),
+}
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+# Differences below this are noise whatever the ratio
+MIN_SLACK_SECONDS = 0.002
+
+
+class Case:
+    """One benchmark: `setup()` runs untimed before every timed `run()`."""
+
+    def __init__(self, name, run, setup=None, repeat=None):
+        self.name = name
+        self.run = run
+        self.setup = setup or (lambda: None)
+        self.repeat = repeat
+
+
+def measure(case, repeat):
+    repeat = min(repeat, case.repeat or repeat)
+    case.setup()
+    case.run()  # warm-up: imports, caches, allocator
+    timings = []
+    for _ in range(repeat):
+        case.setup()
+        started = time.perf_counter()
+        case.run()
+        timings.append(time.perf_counter() - started)
+    return {"median_s": statistics.median(timings), "min_s": min(timings), "runs": repeat}
+
+
+# --- Suites (run inside the service's own process) ---
+
+def optimizer_cases(workdir):
+    import numpy as np
+    import generators
+    from standins import MemoryDatabase, MemoryProducer
+
+    os.environ["ConnectionStrings__telemetry-db"] = "Host=standin;Database=telemetry"
+    import main
+    from flexible_assets import FleetSource, fleet_from_spec
+    from solver import FleetProblem, solve_fleet
+    from time_grid import QUARTER_HOUR, HOUR, align, span, to_epoch_ns
+
+    rng = np.random.default_rng(42)
+    start = generators.current_hour()
+    # Prices for the longest forecast, so its slots aren't left out as unpriced
+    prices = generators.price_curve(start, 49, rng)
+    main.telemetry_db = MemoryDatabase({"price_window": lambda params: prices.copy()})
+    main.price_cache.horizon = timedelta(hours=48)
+    main.producer = MemoryProducer()
+
+    cases = []
+    for days in (1, 365):
+        # Hourly prices onto a quarter-hour grid, and quarter-hour values back to hours
+        quarter = span(to_epoch_ns([start])[0], to_epoch_ns([start])[0] + days * 24 * HOUR, QUARTER_HOUR)
+        hourly = quarter[::4]
+        hourly_price, quarter_kw = rng.normal(50, 30, len(hourly)), rng.uniform(0, 10, len(quarter))
+        cases.append(Case(f"align_hold[rows={len(hourly)},slots={len(quarter)}]",
+                          lambda q=quarter, h=hourly, p=hourly_price: align(q, QUARTER_HOUR, h, p, fill="hold", max_gap=HOUR)))
+        cases.append(Case(f"align_mean[rows={len(quarter)},slots={len(hourly)}]",
+                          lambda q=quarter, h=hourly, kw=quarter_kw: align(h, HOUR, q, kw)))
+
+    for assets in (1000, 10000):
+        for slots in (24, 48):
+            fleet = fleet_from_spec(generators.fleet_spec(assets, start, slots, rng))
+            slot_ns = np.array([(start + np.timedelta64(i, "h")).value for i in range(slots)], dtype=np.int64)
+            problem = FleetProblem(
+                cost=rng.normal(50, 30, slots),
+                energy_kwh=fleet.energy_kwh,
+                max_power_kw=fleet.max_power_kw,
+                available=fleet.availability(slot_ns),
+                site_limit_kw=assets * 3.0,
+            )
+            cases.append(Case(f"solve_fleet[assets={assets},slots={slots}]",
+                              lambda problem=problem: solve_fleet(problem)))
+
+    for assets in (1, 1000, 10000):
+        for slots in (24, 48):
+            if assets == 1:
+                main.fleet_source = FleetSource(None)
+            else:
+                path = os.path.join(workdir, f"fleet-{assets}-{slots}.json")
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(generators.fleet_spec(assets, start, slots, rng, site_limit_kw=assets * 3.0), f)
+                main.fleet_source = FleetSource(path)
+            predictions = generators.solar_forecast(start, slots, rng)
+            source = main.fleet_source
+
+            def setup(source=source):
+                main.fleet_source = source
+                main.forget_plans([main.FLEET_KEY])
+                main.price_cache.invalidate("benchmark")
+
+            cases.append(Case(f"run_optimization[assets={assets},slots={slots}]",
+                              lambda predictions=predictions: main.run_optimization(predictions), setup))
+
+            if assets > 1 and slots == 24:
+                # A new forecast moving one slot: only the affected part is re-solved
+                state = {"run": 0}
+
+                def setup_incremental(source=source, predictions=predictions, state=state):
+                    main.fleet_source = source
+                    main.forget_plans([main.FLEET_KEY])
+                    main.run_optimization(predictions)
+                    changed = [dict(p) for p in predictions]
+                    slot = state["run"] % len(changed)
+                    changed[slot]["predicted_yield_kwh"] += 25.0
+                    state["predictions"] = changed
+                    state["run"] += 1
+
+                cases.append(Case(f"run_optimization_incremental[assets={assets},slots={slots}]",
+                                  lambda state=state: main.run_optimization(state["predictions"]), setup_incremental))
+
+    # Tenants planned concurrently (as the scheduler's threads do), solved in
+    # those threads or on the solver process pool
+    tenants, workers = 16, min(4, os.cpu_count() or 1)
+    spec = generators.fleet_spec(10000, start, 24, rng)
+    for i, asset in enumerate(spec["assets"]):
+        asset["tenant_id"], asset["market_zone"] = f"tenant-{i % tenants:02d}", "BZN|ES"
+    path = os.path.join(workdir, "fleet-tenants.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(spec, f)
+    tenant_source = FleetSource(path)
+    partitions = [(f"tenant-{t:02d}", "BZN|ES") for t in range(tenants)]
+    predictions = generators.solar_forecast(start, 24, rng)
+    main.OPTIMIZER_PROCESSES = workers
+    pool = main.start_solver_pool()
+    list(pool.map(abs, range(workers * 4)))  # spawn the workers up front
+
+    def setup_tenants():
+        main.fleet_source = tenant_source
+        main.forget_plans(["/".join(p) for p in partitions])
+        main.price_cache.invalidate("benchmark")
+
+    def run_tenants(solver_pool):
+        main.solver_pool = solver_pool
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as threads:
+                list(threads.map(lambda p: main.run_optimization(predictions, key="/".join(p), partition=p), partitions))
+        finally:
+            main.solver_pool = None
+
+    for name, solver_pool in (("threads", None), ("processes", pool)):
+        cases.append(Case(f"run_optimization_tenants[tenants={tenants},assets=10000,solver={name}]",
+                          lambda solver_pool=solver_pool: run_tenants(solver_pool), setup_tenants))
+    return cases
+
+
+def forecaster_cases(workdir):
+    import numpy as np
+    import pandas as pd
+    import generators
+    from standins import MemoryDatabase, MemoryProducer
+
+    os.environ["ConnectionStrings__telemetry-db"] = "Host=standin;Database=telemetry"
+    os.environ["FORECASTER_CACHE_DIR"] = os.path.join(workdir, "cache")
+    import main
+    from history_cache import HistoryCache
+    from model_registry import ModelRegistry
+    from time_grid import hour_of_day, to_epoch_ns
+    from training import fit_model
+
+    main.producer = MemoryProducer()
+    rng = np.random.default_rng(42)
+    cases = []
+    for assets in (10, 100, 1000):
+        history = generators.history_table(assets, 30, rng)
+        profile = generators.hourly_profile(history)
+
+        def fetch(params, history=history):
+            return history[history["time"] >= pd.Timestamp(params["since"])]
+
+        hours, power = hour_of_day(to_epoch_ns(history["time"])), history["power_kw"].to_numpy()
+        cases.append(Case(f"fit_model[rows={len(history)}]",
+                          lambda hours=hours, power=power: fit_model(hours, power), repeat=3))
+
+        counter = {"run": 0}
+
+        def cold(fetch=fetch, counter=counter, assets=assets):
+            # Empty history cache and registry: full fetch and full training
+            main.FORECAST_FEATURES = "raw"
+            counter["run"] += 1
+            run_dir = os.path.join(workdir, f"cold-{assets}-{counter['run']}")
+            main.telemetry_db = MemoryDatabase({"asset_metrics_hourly": fetch})
+            main.history_cache = HistoryCache(os.path.join(run_dir, "history"), window=main.history_cache.window)
+            main.model_registry = ModelRegistry(os.path.join(run_dir, "models"))
+
+        cases.append(Case(f"train_and_predict_cold[rows={len(history)}]", main.train_and_predict, cold, repeat=3))
+
+        warm_dir = os.path.join(workdir, f"warm-{assets}")
+
+        def warm(fetch=fetch, warm_dir=warm_dir):
+            # Cached history and a registered model for the same data: reuse path
+            main.FORECAST_FEATURES = "raw"
+            main.telemetry_db = MemoryDatabase({"asset_metrics_hourly": fetch})
+            main.history_cache = HistoryCache(os.path.join(warm_dir, "history"), window=main.history_cache.window)
+            main.history_cache.load()
+            main.model_registry = ModelRegistry(os.path.join(warm_dir, "models"))
+
+        cases.append(Case(f"train_and_predict_warm[rows={len(history)}]", main.train_and_predict, warm))
+
+        def aggregate(profile=profile, counter=counter, assets=assets):
+            # What TimescaleDB returns for the fleet profile, trained from scratch
+            main.FORECAST_FEATURES = "aggregate"
+            counter["run"] += 1
+            main.telemetry_db = MemoryDatabase({"hour_of_day": lambda params: profile.copy()})
+            main.model_registry = ModelRegistry(os.path.join(workdir, f"aggregate-{assets}-{counter['run']}"))
+
+        cases.append(Case(f"train_and_predict_aggregate[rows={len(history)}]", main.train_and_predict, aggregate))
+    return cases
+
+
+def simulator_cases(workdir):
+    import random
+    import numpy as np
+    import main
+    from fleet import FleetEngine
+
+    random.seed(42)
+    cases = []
+    for assets in (1000, 10000):
+        names = list(main.LOCATIONS)
+        objects = [main.Asset(f"INV-BENCH-{i:06d}", "inverter" if i % 5 else "charger", main.LOCATIONS[names[i % len(names)]])
+                   for i in range(assets)]
+        cases.append(Case(f"generate_telemetry[assets={assets}]",
+                          lambda objects=objects: [asset.generate_telemetry() for asset in objects]))
+
+    for assets in (1000, 10000, 100000):
+        fleet = FleetEngine.synthetic(assets, main.LOCATIONS, rng=np.random.default_rng(42))
+        cases.append(Case(f"fleet_tick_payloads[assets={assets}]",
+                          lambda fleet=fleet: list(fleet.payloads(fleet.tick(), main.TENANT_ID))))
+    return cases
+
+
+SUITES = {"optimizer": optimizer_cases, "forecaster": forecaster_cases, "simulator": simulator_cases}
+
+
+def run_suite(suite, pattern, repeat):
+    """Child process: time the suite's cases and print them as one JSON object."""
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    sys.path[:0] = [SERVICES[suite], BENCH_DIR]
+    os.chdir(SERVICES[suite])
+    workdir = tempfile.mkdtemp(prefix=f"emma-bench-{suite}-")
+    results = {}
+    try:
+        for case in SUITES[suite](workdir):
+            if pattern and pattern not in case.name:
+                continue
+            results[f"{suite}/{case.name}"] = measure(case, repeat)
+            print(f"  {case.name}: {results[f'{suite}/{case.name}']['median_s'] * 1000:.1f} ms", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    # Services may print to stdout; the results are the last line
+    print("\n" + json.dumps(results))
+
+
+# --- Runner ---
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            status = "new"
+        else:
+            limit = base["median_s"] * (1 + tolerance) + MIN_SLACK_SECONDS
+            status = f"{result['median_s'] / base['median_s']:.2f}x"
+            if result["median_s"] > limit:
+                status += " REGRESSION"
+                regressions.append(name)
+        base_ms = f"{base['median_s'] * 1000:10.1f}" if base else f"{'-':>10}"
+        print(f"{name:<70} {result['median_s'] * 1000:10.1f} {base_ms}  {status}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EMMA Python services benchmarks")
+    parser.add_argument("--suite", action="append", choices=sorted(SUITES), help="Suite to run (repeatable, default: all)")
+    parser.add_argument("--filter", type=str, default=None, help="Only run cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case (the median is compared)")
+    parser.add_argument("--baseline", type=str, default=DEFAULT_BASELINE, help="Baseline timings file")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed slowdown over the baseline (0.5 = 50%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the measured timings to the baseline")
+    parser.add_argument("--run-suite", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_suite:
+        run_suite(args.run_suite, args.filter, args.repeat)
+        return
+
+    results = {}
+    for suite in args.suite or sorted(SUITES):
+        print(f"Running {suite} benchmarks...", file=sys.stderr)
+        command = [sys.executable, os.path.abspath(__file__), "--run-suite", suite, "--repeat", str(args.repeat)]
+        if args.filter:
+            command += ["--filter", args.filter]
+        proc = subprocess.run(command, stdout=subprocess.PIPE, text=True)
+        if proc.returncode != 0:
+            print(f"{suite} benchmarks failed (exit code {proc.returncode})", file=sys.stderr)
+            sys.exit(proc.returncode)
+        results.update(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print(f"\n{'case':<70} {'median ms':>10} {'base ms':>10}")
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.update_baseline:
+        baseline.update({name: {"median_s": round(r["median_s"], 6)} for name, r in results.items()})
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(dict(sorted(baseline.items())), f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline updated: {args.baseline}")
+    elif regressions:
+        print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than {args.tolerance:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
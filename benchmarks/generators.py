@@ -0,0 +1,99 @@
+"""
+Synthetic inputs for the benchmarks, shaped like what the services read
+from Postgres and Kafka. Every generator takes a NumPy Generator so runs
+are reproducible.
+"""
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+
+def current_hour():
+    return pd.Timestamp(datetime.now(timezone.utc)).floor("h")
+
+
+def price_curve(start, hours, rng, base=60.0, spread=40.0, negative_share=0.05):
+    """
+    `market_prices` rows (time, price): a daily duck curve with a midday dip
+    and an evening peak, noise, and a share of negative-price hours.
+    """
+    times = pd.date_range(start, periods=hours, freq="h")
+    hour = times.hour.to_numpy()
+    shape = -np.cos((hour - 19) / 24 * 2 * np.pi) - 0.6 * np.exp(-((hour - 13) ** 2) / 8)
+    price = base + spread * shape + rng.normal(0, spread / 4, hours)
+    negative = rng.random(hours) < negative_share
+    price[negative] = -rng.uniform(0, 20, negative.sum())
+    return pd.DataFrame({"time": times, "price": price})
+
+
+def solar_forecast(start, hours, rng, peak_kwh=50.0):
+    """`predictions` of a solar-predictions message, one per hour from `start`."""
+    times = pd.date_range(start, periods=hours, freq="h")
+    hour = times.hour.to_numpy()
+    clear_sky = np.clip(np.sin((hour - 6) / 14 * np.pi), 0, None)
+    yields = peak_kwh * clear_sky * rng.uniform(0.6, 1.0, hours)
+    return [
+        {"timestamp": ts.isoformat(), "predicted_yield_kwh": round(float(y), 2), "confidence": 0.88}
+        for ts, y in zip(times, yields)
+    ]
+
+
+def history_table(assets, days, rng, end=None):
+    """
+    `asset_metrics_hourly` rows as the forecaster selects them
+    (time, asset_id, power_kw): `days` of hourly solar output per asset.
+    """
+    end = current_hour() if end is None else end
+    hours = int(days * 24)
+    times = pd.date_range(end - timedelta(hours=hours), periods=hours, freq="h")
+    hour = np.tile(times.hour.to_numpy(), assets)
+    capacity = np.repeat(rng.uniform(3, 10, assets), hours)
+    power = np.clip(np.sin((hour - 6) / 14 * np.pi), 0, None) * capacity * rng.uniform(0.8, 1.0, hours * assets)
+    return pd.DataFrame({
+        "time": np.tile(times.to_numpy(), assets),
+        "asset_id": np.repeat([f"asset-{i:06d}" for i in range(assets)], hours),
+        "power_kw": power,
+    })
+
+
+def hourly_profile(history):
+    """
+    The fleet's hour-of-day profile as the forecaster's aggregate query returns
+    it (group_key, hour_of_day, power_kw, samples, last_bucket).
+    """
+    hour = history["time"].dt.hour.rename("hour_of_day")
+    profile = history.groupby(hour)["power_kw"].agg(["mean", "size"]).reset_index()
+    last = history.groupby(hour)["time"].max().to_numpy()
+    return pd.DataFrame({
+        "group_key": "global",
+        "hour_of_day": profile["hour_of_day"],
+        "power_kw": profile["mean"],
+        "samples": profile["size"],
+        "last_bucket": last,
+    })
+
+
+def fleet_spec(assets, start, hours, rng, site_limit_kw=None):
+    """
+    Optimizer fleet file (see flexible_assets.fleet_from_spec): EV chargers
+    and batteries with their own needs, power limits and availability windows.
+    """
+    start = pd.Timestamp(start)
+    arrive = rng.integers(0, max(hours // 2, 1), assets)
+    stay = rng.integers(4, max(hours // 2, 5), assets)
+    power = rng.choice([3.7, 7.4, 11.0, 22.0], assets)
+    energy = np.minimum(rng.uniform(5, 60, assets), power * stay)
+    spec = {"assets": [
+        {
+            "asset_id": f"EV-{i:06d}",
+            "energy_kwh": round(float(energy[i]), 2),
+            "max_power_kw": float(power[i]),
+            "available_from": (start + timedelta(hours=int(arrive[i]))).isoformat(),
+            "available_until": (start + timedelta(hours=int(arrive[i] + stay[i]))).isoformat(),
+        }
+        for i in range(assets)
+    ]}
+    if site_limit_kw is not None:
+        spec["site_limit_kw"] = site_limit_kw
+    return spec
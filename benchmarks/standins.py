@@ -0,0 +1,106 @@
+"""
+In-memory stand-ins for Kafka and Postgres with the interfaces the services
+use (InstrumentedProducer, db.Database), so hot paths run end to end
+without a broker or a database.
+"""
+from contextlib import contextmanager
+
+from psycopg2.extensions import adapt
+
+
+class MemoryProducer:
+    """Keeps produced messages in a list; same calls as InstrumentedProducer."""
+
+    def __init__(self):
+        self.messages = []
+
+    def produce(self, topic, value, key=None, **kwargs):
+        self.messages.append((topic, key, value))
+
+    def flush(self, timeout=10.0):
+        return 0
+
+    def close(self, timeout=10.0):
+        pass
+
+    def queue_depth(self):
+        return 0
+
+    def stats(self):
+        return {"produced": len(self.messages)}
+
+
+class MemoryCursor:
+    """
+    Renders statements like a psycopg2 cursor (mogrify quotes values with
+    psycopg2's adapters) and keeps them instead of sending them.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = 0
+
+    def mogrify(self, query, args=None):
+        if isinstance(query, str):
+            query = query.encode("utf-8")
+        if not args:
+            return query
+        return query % tuple(adapt(value).getquoted() for value in args)
+
+    def execute(self, query, args=None):
+        self.connection.statements.append(self.mogrify(query, args))
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MemoryConnection:
+    encoding = "UTF8"
+
+    def __init__(self):
+        self.statements = []
+
+    def cursor(self, name=None):
+        return MemoryCursor(self)
+
+
+class MemoryDatabase:
+    """
+    Stands in for db.Database. `frames` maps a prepared statement name, or
+    a table name found in a read_frame query, to `loader(params) -> DataFrame`.
+    Writes made through `connection()` are rendered and kept in `statements`.
+    """
+
+    def __init__(self, frames=None):
+        self.frames = frames or {}
+        self.statements = []
+
+    @contextmanager
+    def connection(self):
+        conn = MemoryConnection()
+        yield conn
+        self.statements.extend(conn.statements)
+
+    def fetch_prepared(self, name, params=None):
+        return self.frames[name](params)
+
+    def read_frame(self, query, params=None):
+        for name, loader in self.frames.items():
+            if name in query:
+                return loader(params)
+        raise KeyError(f"No stand-in frame for query: {query.strip()[:80]}")
+
+    def fetch_all(self, query, params=None):
+        return []
+
+    def close(self):
+        pass
@@ -102,8 +102,10 @@ var api = builder.AddProject<Projects.EMMA_Api>("emma-api")
   .PublishAsDockerComposeService((_, service) => { service.Name = "emma-api"; });
 
 var solarForecaster = builder.AddPythonApp("solar-forecaster", "../EMMA.SolarForecaster", "main.py")
+  .WithReference(appDb)
   .WithReference(telemetryDb)
   .WithReference(kafka)
+  .WaitFor(appDb)
   .WaitFor(telemetryDb)
   .PublishAsDockerComposeService((_, service) => { service.Name = "solar-forecaster"; });
 
@@ -0,0 +1,237 @@
+import os
+import uuid
+import logging
+import threading
+import weakref
+from contextlib import contextmanager
+
+import pandas as pd
+import psycopg2
+from psycopg2.extensions import make_dsn
+from psycopg2.pool import ThreadedConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Npgsql keys (as injected by Aspire in ConnectionStrings__*) -> libpq keys
+NPGSQL_KEYS = {
+    "host": "host",
+    "server": "host",
+    "port": "port",
+    "username": "user",
+    "user id": "user",
+    "userid": "user",
+    "user": "user",
+    "password": "password",
+    "database": "dbname",
+    "ssl mode": "sslmode",
+    "sslmode": "sslmode",
+    "timeout": "connect_timeout",
+}
+
+STREAM_CHUNK_ROWS = 50_000
+
+# Postgres type OIDs parsed with a fixed type from COPY CSV (the rest, e.g.
+# timestamps, are inferred): ids such as "0042" must stay text
+COPY_TEXT_OIDS = {18, 19, 25, 114, 1042, 1043, 2950, 3802}  # char, name, text, json, bpchar, varchar, uuid, jsonb
+COPY_INT_OIDS = {20, 21, 23}
+COPY_FLOAT_OIDS = {700, 701, 1700}
+COPY_BOOL_OID = 16
+
+
+def to_libpq(conn_str):
+    """Accept libpq/URI connection strings as-is and translate Npgsql `Key=Value;` ones."""
+    if not conn_str or conn_str.startswith(("postgres://", "postgresql://")) or ";" not in conn_str:
+        return conn_str
+    params = {}
+    for item in conn_str.split(";"):
+        if "=" not in item:
+            continue
+        key, value = item.split("=", 1)
+        libpq_key = NPGSQL_KEYS.get(key.strip().lower())
+        if libpq_key:
+            params[libpq_key] = value.strip()
+    return make_dsn(**params)
+
+
+class Database:
+    """
+    Access to one PostgreSQL database for a Python service:
+
+    - a fixed, thread-safe pool of `maxconn` connections, opened on first
+      use (callers wait for a free connection instead of opening new ones)
+    - `statements` registered up front are PREPAREd once per pooled
+      connection and run with `fetch_prepared` / `execute_prepared`
+    - `read_frame` streams large results with COPY ... TO STDOUT into Arrow
+      columns (pyarrow), or through a server-side cursor in bounded chunks
+    """
+
+    def __init__(self, conn_str, name="db", maxconn=4, statements=None, acquire_timeout=30.0):
+        self.name = name
+        self.dsn = to_libpq(conn_str)
+        self.maxconn = maxconn
+        self.statements = dict(statements or {})
+        self.acquire_timeout = acquire_timeout
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._prepared = weakref.WeakSet()  # connections with `statements` prepared
+
+    @property
+    def configured(self):
+        return bool(self.dsn)
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    # minconn == maxconn: psycopg2 closes returned connections
+                    # beyond minconn, which would reopen (and re-PREPARE) them
+                    self._pool = ThreadedConnectionPool(self.maxconn, self.maxconn, self.dsn)
+        return self._pool
+
+    def _prepare(self, conn):
+        if conn in self._prepared or not self.statements:
+            return
+        with conn.cursor() as cur:
+            for name, sql in self.statements.items():
+                cur.execute(f"PREPARE {name} AS {sql}")
+        conn.commit()
+        self._prepared.add(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a pooled connection for one transaction: committed when the
+        block exits normally, rolled back on error.
+        """
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError(f"No free {self.name} connection after {self.acquire_timeout}s")
+        pool = None
+        conn = None
+        try:
+            pool = self._get_pool()
+            conn = pool.getconn()
+            self._prepare(conn)
+            yield conn
+            conn.commit()
+        except Exception:
+            if conn is not None and not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            try:
+                if conn is not None:
+                    pool.putconn(conn, close=bool(conn.closed))
+                    if conn.closed:
+                        self._prepared.discard(conn)
+            finally:
+                self._slots.release()
+
+    def fetch_all(self, sql, params=None):
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+    def _execute_args(self, name, params):
+        placeholders = ", ".join(["%s"] * len(params))
+        return f"EXECUTE {name}" + (f" ({placeholders})" if params else "")
+
+    def fetch_prepared(self, name, params=()):
+        """Run a registered statement and return its rows as a DataFrame."""
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute(self._execute_args(name, params), params)
+            columns = [col.name for col in cur.description]
+            return pd.DataFrame.from_records(cur.fetchall(), columns=columns)
+
+    def execute_prepared(self, cur, name, params=()):
+        """Run a registered statement on a cursor of a `connection()` block."""
+        cur.execute(self._execute_args(name, params), params)
+
+    def read_frame(self, sql, params=None):
+        """Run a (potentially large) SELECT and return it as a DataFrame."""
+        with self.connection() as conn:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                return self._read_server_side(conn, sql, params)
+            return self._read_copy(conn, sql, params)
+
+    def _copy_convert_options(self, cur, query):
+        """Arrow column types from the query's result description."""
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+
+        cur.execute(f"SELECT * FROM ({query}) AS q LIMIT 0")
+        types = {}
+        for col in cur.description:
+            if col.type_code in COPY_TEXT_OIDS:
+                types[col.name] = pa.string()
+            elif col.type_code in COPY_INT_OIDS:
+                types[col.name] = pa.int64()
+            elif col.type_code in COPY_FLOAT_OIDS:
+                types[col.name] = pa.float64()
+            elif col.type_code == COPY_BOOL_OID:
+                types[col.name] = pa.bool_()
+        # COPY CSV writes NULL as an unquoted empty field and '' as "", nothing else is null
+        return pacsv.ConvertOptions(column_types=types, null_values=[""], strings_can_be_null=True,
+                                    quoted_strings_can_be_null=False, true_values=["t"], false_values=["f"])
+
+    def _read_copy(self, conn, sql, params):
+        import pyarrow.csv as pacsv
+
+        with conn.cursor() as cur:
+            query = cur.mogrify(sql.strip().rstrip(";"), params).decode("utf-8")
+            convert_options = self._copy_convert_options(cur, query)
+            copy_sql = f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)"
+
+            # COPY writes into a pipe while Arrow parses the other end block by
+            # block, so the CSV text is never held in memory as a whole.
+            read_fd, write_fd = os.pipe()
+            errors = []
+
+            def copy_out():
+                try:
+                    with open(write_fd, "wb", buffering=1 << 20) as writer:
+                        cur.copy_expert(copy_sql, writer)
+                except Exception as e:
+                    errors.append(e)
+
+            writer_thread = threading.Thread(target=copy_out, name=f"{self.name}-copy", daemon=True)
+            writer_thread.start()
+            try:
+                with open(read_fd, "rb") as reader:
+                    table = pacsv.open_csv(reader, read_options=pacsv.ReadOptions(block_size=1 << 22),
+                                           convert_options=convert_options).read_all()
+            except Exception:
+                # Closing the read end above unblocks the writer; prefer its error
+                writer_thread.join()
+                if errors:
+                    raise errors[0]
+                raise
+            writer_thread.join()
+            if errors:
+                raise errors[0]
+        return table.to_pandas()
+
+    def _read_server_side(self, conn, sql, params):
+        frames = []
+        with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cur:
+            cur.itersize = STREAM_CHUNK_ROWS
+            cur.execute(sql, params)
+            columns = None
+            while True:
+                rows = cur.fetchmany(STREAM_CHUNK_ROWS)
+                if columns is None:
+                    columns = [col.name for col in cur.description]
+                if not rows:
+                    break
+                frames.append(pd.DataFrame.from_records(rows, columns=columns))
+        if not frames:
+            return pd.DataFrame(columns=columns or [])
+        return pd.concat(frames, ignore_index=True)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+            self._prepared.clear()
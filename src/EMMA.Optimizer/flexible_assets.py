@@ -0,0 +1,147 @@
+import os
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from time_grid import NS_PER_HOUR
+
+logger = logging.getLogger("optimizer-engine")
+
+OPEN_START = np.iinfo(np.int64).min
+OPEN_END = np.iinfo(np.int64).max
+
+
+@dataclass
+class FlexibleFleet:
+    """
+    Flexible loads (EV chargers, batteries...) the optimizer schedules.
+    Windows are UTC epoch nanoseconds; open ends use OPEN_START / OPEN_END.
+    `tenant_ids` / `market_zones` (None where unknown) split the fleet into
+    per-tenant, per-zone partitions, each with its own limit from
+    `partition_limits_kw`.
+    """
+    asset_ids: List[str]
+    energy_kwh: np.ndarray
+    max_power_kw: np.ndarray
+    available_from: np.ndarray
+    available_until: np.ndarray
+    site_limit_kw: Optional[float] = None
+    tenant_ids: Optional[List[Optional[str]]] = None
+    market_zones: Optional[List[Optional[str]]] = None
+    partition_limits_kw: Dict[Tuple[str, str], float] = field(default_factory=dict)
+
+    def __len__(self):
+        return len(self.asset_ids)
+
+    def take(self, rows, site_limit_kw=None):
+        """The assets at `rows` as a fleet of their own."""
+        return FlexibleFleet(
+            asset_ids=[self.asset_ids[i] for i in rows],
+            energy_kwh=self.energy_kwh[rows],
+            max_power_kw=self.max_power_kw[rows],
+            available_from=self.available_from[rows],
+            available_until=self.available_until[rows],
+            site_limit_kw=site_limit_kw,
+        )
+
+    def partitions(self):
+        """{(tenant_id, market_zone): fleet}; assets missing either are in none."""
+        if self.tenant_ids is None or self.market_zones is None:
+            return {}
+        rows = {}
+        for i, key in enumerate(zip(self.tenant_ids, self.market_zones)):
+            if None not in key:
+                rows.setdefault(key, []).append(i)
+        return {key: self.take(np.array(idx), self.partition_limits_kw.get(key)) for key, idx in rows.items()}
+
+    def availability(self, slot_starts_ns, slot_hours=1.0):
+        """(A, T) mask of slots lying entirely inside each asset's window."""
+        starts = np.asarray(slot_starts_ns, dtype=np.int64)
+        ends = starts + int(slot_hours * NS_PER_HOUR)
+        return (starts >= self.available_from[:, None]) & (ends <= self.available_until[:, None])
+
+
+def default_fleet():
+    # Previous behaviour: 5 hours of charging for one "flexible_load", anywhere in the horizon
+    return FlexibleFleet(["flexible_load"], np.array([5.0]), np.array([1.0]),
+                         np.array([OPEN_START]), np.array([OPEN_END]))
+
+
+def _to_ns(values, open_value):
+    times = pd.to_datetime(pd.Series(values, dtype="object"), utc=True)
+    return np.where(times.isna(), open_value, times.to_numpy(dtype="datetime64[ns]").view(np.int64))
+
+
+def fleet_from_spec(spec):
+    """
+    Build a fleet from a spec like:
+
+        {"site_limit_kw": 500,
+         "partition_limits": [{"tenant_id": "tenant-a", "market_zone": "BZN|ES", "site_limit_kw": 200}],
+         "assets": [{"asset_id": "EV-001", "energy_kwh": 30, "max_power_kw": 11,
+                     "available_from": "2025-06-01T18:00:00Z", "available_until": "2025-06-02T07:00:00Z",
+                     "tenant_id": "tenant-a", "market_zone": "BZN|ES"}]}
+
+    Windows, tenants and zones are optional. `site_limit_kw` bounds the
+    whole fleet; when optimizing per tenant and zone each partition is
+    bounded by its `partition_limits` entry instead.
+    """
+    assets = spec["assets"]
+
+    def optional(name):
+        return [None if a.get(name) is None else str(a[name]) for a in assets]
+
+    return FlexibleFleet(
+        asset_ids=[str(a["asset_id"]) for a in assets],
+        energy_kwh=np.array([float(a["energy_kwh"]) for a in assets]),
+        max_power_kw=np.array([float(a["max_power_kw"]) for a in assets]),
+        available_from=_to_ns([a.get("available_from") for a in assets], OPEN_START),
+        available_until=_to_ns([a.get("available_until") for a in assets], OPEN_END),
+        site_limit_kw=spec.get("site_limit_kw"),
+        tenant_ids=optional("tenant_id"),
+        market_zones=optional("market_zone"),
+        partition_limits_kw={(str(p["tenant_id"]), str(p["market_zone"])): float(p["site_limit_kw"])
+                             for p in spec.get("partition_limits", [])},
+    )
+
+
+class FleetSource:
+    """Loads the fleet from a JSON file, re-reading it only when it changes."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._fleet = None
+        self._partitions = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if not self.path:
+            return default_fleet()
+        with self._lock:
+            return self._load()
+
+    def partition(self, tenant_id, market_zone):
+        """The tenant's assets in `market_zone`, None if it has none."""
+        if not self.path:
+            return None
+        with self._lock:
+            self._load()
+            if self._partitions is None:
+                self._partitions = self._fleet.partitions()
+            return self._partitions.get((tenant_id, market_zone))
+
+    def _load(self):
+        mtime = os.path.getmtime(self.path)
+        if self._fleet is None or mtime != self._mtime:
+            with open(self.path, encoding="utf-8") as f:
+                self._fleet = fleet_from_spec(json.load(f))
+            self._partitions = None
+            self._mtime = mtime
+            logger.info(f"Loaded {len(self._fleet)} flexible assets from {self.path}")
+        return self._fleet
@@ -0,0 +1,111 @@
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Batching/compression defaults; anything passed to the constructor wins
+DEFAULT_CONFIG = {
+    "linger.ms": 20,
+    "batch.num.messages": 10000,
+    "compression.type": "lz4",
+    "acks": "all",
+    "enable.idempotence": True,
+    "queue.buffering.max.messages": 100000,
+}
+
+LATENCY_WINDOW = 1024
+
+
+class InstrumentedProducer:
+    """
+    One long-lived confluent_kafka Producer per service.
+
+    `produce()` only enqueues; a background thread serves delivery callbacks,
+    which feed the counters returned by `stats()` (produced, delivered,
+    failed, queue depth and delivery latency). The underlying producer is
+    created on first use so the service starts even when Kafka is not yet
+    reachable; `close()` flushes whatever is still queued.
+    """
+
+    def __init__(self, brokers, client_id, **config):
+        self.brokers = brokers
+        self.config = dict(DEFAULT_CONFIG, **config)
+        self.config.update({"bootstrap.servers": brokers, "client.id": client_id})
+        self._producer = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._poller = None
+        self.produced = 0
+        self.delivered = 0
+        self.failed = 0
+        self.last_error = None
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def _ensure_producer(self):
+        if self._producer is None:
+            with self._lock:
+                if self._producer is None:
+                    from confluent_kafka import Producer
+                    self._producer = Producer(self.config)
+                    self._poller = threading.Thread(target=self._poll_loop, name="kafka-producer-poll", daemon=True)
+                    self._poller.start()
+        return self._producer
+
+    def _poll_loop(self):
+        while not self._stop.is_set():
+            self._producer.poll(0.1)
+
+    def _on_delivery(self, err, msg):
+        if err is not None:
+            self.failed += 1
+            self.last_error = str(err)
+            logger.error(f"Delivery to {msg.topic()} failed: {err}")
+            return
+        self.delivered += 1
+        latency = msg.latency()
+        if latency is not None:
+            self._latencies.append(latency)
+
+    def produce(self, topic, value, key=None, headers=None):
+        producer = self._ensure_producer()
+        while True:
+            try:
+                producer.produce(topic, value, key=key, headers=headers, on_delivery=self._on_delivery)
+                self.produced += 1
+                return
+            except BufferError:
+                # Local queue full: give librdkafka a moment to drain it
+                producer.poll(0.1)
+
+    def flush(self, timeout=10.0):
+        """Wait for queued messages; returns how many are still undelivered."""
+        if self._producer is None:
+            return 0
+        return self._producer.flush(timeout)
+
+    def close(self, timeout=10.0):
+        if self._producer is None:
+            return
+        remaining = self.flush(timeout)
+        self._stop.set()
+        self._poller.join(timeout=1.0)
+        if remaining:
+            logger.warning(f"Kafka producer closed with {remaining} undelivered messages")
+
+    def queue_depth(self):
+        return len(self._producer) if self._producer is not None else 0
+
+    def stats(self):
+        latencies = sorted(self._latencies)
+        def pct(q):
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 2) if latencies else None
+        return {
+            "produced": self.produced,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "queue_depth": self.queue_depth(),
+            "delivery_latency_ms": {"p50": pct(0.5), "p95": pct(0.95), "max": pct(1.0)},
+            "last_error": self.last_error,
+        }
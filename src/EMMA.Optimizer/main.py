@@ -1,13 +1,25 @@
 import os
 import json
+import time
 import logging
 import threading
-from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
 import pandas as pd
 import numpy as np
-import psycopg2
-from confluent_kafka import Consumer, Producer, KafkaError
-from fastapi import FastAPI
+from confluent_kafka import Consumer, KafkaError, KafkaException, TopicPartition
+from fastapi import FastAPI, HTTPException, Response
+from psycopg2.extras import execute_values
+
+from db import Database
+from flexible_assets import FleetSource
+from kafka_producer import InstrumentedProducer
+from metrics import SamplingProfiler, count_rows, exposition, mark_success, register_stats, set_consumer_lag, timed
+from price_cache import PriceCurveCache
+from rolling_plan import RollingPlan, propose_plan
+from time_grid import NS_PER_HOUR, NS_PER_MINUTE, align, infer_resolution, span, to_datetimes, to_epoch_ns
+from work_queue import CoalescingScheduler, OffsetTracker
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("optimizer-engine")
@@ -19,151 +31,572 @@ DB_CONNECTION = os.getenv("ConnectionStrings__telemetry-db")
 KAFKA_BROKERS = os.getenv("ConnectionStrings__messaging")
 SOLAR_TOPIC = "solar-predictions"
 COMMAND_TOPIC = "asset-commands"
+MARKET_ALERTS_TOPIC = "market-alerts"
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+OPTIMIZER_WORKERS = int(os.getenv("OPTIMIZER_WORKERS", "2"))
+# Bursts of forecasts within this window collapse into one run on the latest one
+OPTIMIZER_DEBOUNCE_SECONDS = float(os.getenv("OPTIMIZER_DEBOUNCE_SECONDS", "2"))
+OPTIMIZER_MAX_DELAY_SECONDS = float(os.getenv("OPTIMIZER_MAX_DELAY_SECONDS", "30"))
+FLEET_KEY = "fleet"
+# fleet: one plan for the whole fleet, from the fleet-wide forecast; tenant_zone: one plan per
+# tenant and market zone, from the forecaster's per-tenant_zone forecasts (FORECAST_GROUP_BY=tenant_zone)
+OPTIMIZER_PARTITION_BY = os.getenv("OPTIMIZER_PARTITION_BY", "fleet").lower()
+PARTITION_MODES = ("fleet", "tenant_zone")
+# Processes solving tenant-zone plans in parallel; 0 solves in the scheduler's threads
+OPTIMIZER_PROCESSES = int(os.getenv("OPTIMIZER_PROCESSES", str(os.cpu_count() or 1)))
+# market_prices source per market zone as JSON, e.g. {"BZN|ES": "REData"}; other zones use every source
+OPTIMIZER_ZONE_PRICE_SOURCES = json.loads(os.getenv("OPTIMIZER_ZONE_PRICE_SOURCES", "{}"))
+# JSON fleet of flexible assets (see flexible_assets.py); unset keeps the single "flexible_load"
+OPTIMIZER_FLEET_FILE = os.getenv("OPTIMIZER_FLEET_FILE")
+# Site import limit in kW shared by the whole fleet, overrides the fleet file's
+OPTIMIZER_SITE_LIMIT_KW = os.getenv("OPTIMIZER_SITE_LIMIT_KW")
+# Slots whose cost (price - solar yield) moved less than this keep their plan
+OPTIMIZER_COST_THRESHOLD = float(os.getenv("OPTIMIZER_COST_THRESHOLD", "1.0"))
+# Re-solve the whole horizon from scratch every N runs
+OPTIMIZER_FULL_RESOLVE_EVERY = int(os.getenv("OPTIMIZER_FULL_RESOLVE_EVERY", "24"))
+# Planning slot length: 60, or 15 for quarter-hour market periods
+OPTIMIZER_SLOT_MINUTES = int(os.getenv("OPTIMIZER_SLOT_MINUTES", "60"))
+# Assets per command message, keeps messages well below the broker's size limit
+COMMAND_BATCH_SIZE = 1000
+
+producer = InstrumentedProducer(KAFKA_BROKERS, "optimizer")
+fleet_source = FleetSource(OPTIMIZER_FLEET_FILE)
+# Rolling plans by scheduler key (FLEET_KEY, or a tenant_zone forecast group)
+plans = {}
+plans_lock = threading.Lock()
+# Spawned at startup in tenant_zone mode
+solver_pool = None
+telemetry_db = Database(DB_CONNECTION, name="telemetry-db", maxconn=DB_POOL_SIZE, statements={
+    # Loaded from the start of the hour and past the 24h horizon; the cache slices it
+    "price_window": """
+        SELECT time, price
+        FROM market_prices
+        WHERE time >= date_trunc('hour', NOW()) AND time < date_trunc('hour', NOW()) + INTERVAL '25 hours'
+        ORDER BY time ASC
+    """,
+    "zone_price_window": """
+        SELECT time, price
+        FROM market_prices
+        WHERE source = $1
+          AND time >= date_trunc('hour', NOW()) AND time < date_trunc('hour', NOW()) + INTERVAL '25 hours'
+        ORDER BY time ASC
+    """,
+})
+
+# One row per (target_hour, asset_id); re-running an optimization only
+# touches rows whose decision changed
+SCHEDULE_UPSERT = """
+    INSERT INTO optimization_schedules (target_hour, asset_id, action, reason, power_kw)
+    VALUES %s
+    ON CONFLICT (target_hour, asset_id) DO UPDATE
+    SET action = EXCLUDED.action, reason = EXCLUDED.reason, power_kw = EXCLUDED.power_kw,
+        at_time = NOW(), status = 'PENDING'
+    WHERE (optimization_schedules.action, optimization_schedules.reason, optimization_schedules.power_kw,
+           optimization_schedules.status)
+        IS DISTINCT FROM (EXCLUDED.action, EXCLUDED.reason, EXCLUDED.power_kw, 'PENDING')
+"""
+
+SCHEDULE_CANCEL = """
+    UPDATE optimization_schedules s
+    SET status = 'CANCELLED', at_time = NOW()
+    FROM (VALUES %s) AS c (target_hour, asset_id)
+    WHERE s.target_hour = c.target_hour AND s.asset_id = c.asset_id AND s.status = 'PENDING'
+"""
 
-# State
-last_solar_predictions = []
+# Consumer state, for /stats
+consumer_stats = {"received": 0, "skipped": 0, "errors": 0, "reconnects": 0, "committed": 0,
+                  "message_age_seconds": None, "partition_lag": {}}
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
-def get_price_forecast():
+@app.get("/stats")
+def stats():
+    return {
+        "kafka_producer": producer.stats(),
+        "price_cache": price_cache_stats(),
+        "scheduler": scheduler.stats(),
+        "plans": plan_stats(),
+        "consumer": dict(consumer_stats, outstanding_messages=offsets.outstanding())
+    }
+
+@app.get("/metrics")
+def metrics():
+    body, content_type = exposition()
+    return Response(content=body, media_type=content_type)
+
+@app.post("/debug/profiler/start")
+def start_profiler(interval_ms: float = 10, duration_seconds: float = 60):
+    if not profiler.start(interval=interval_ms / 1000, duration=duration_seconds):
+        raise HTTPException(status_code=409, detail="Profiler already running")
+    return profiler.status()
+
+@app.post("/debug/profiler/stop")
+def stop_profiler():
+    profiler.stop()
+    return profiler.status()
+
+@app.get("/debug/profiler")
+def get_profile(limit: int = 200):
+    """Collapsed stacks of the current/last profile, ready for flamegraph tools."""
+    return Response(content=profiler.collapsed(limit), media_type="text/plain")
+
+def load_price_window(source=None):
+    with timed("price_fetch"):
+        if source is None:
+            df = telemetry_db.fetch_prepared("price_window")
+        else:
+            df = telemetry_db.fetch_prepared("zone_price_window", (source,))
+    count_rows("price_fetch", len(df))
+    return df
+
+price_cache = PriceCurveCache(load_price_window)
+zone_price_caches = {zone: PriceCurveCache(lambda source=source: load_price_window(source))
+                     for zone, source in OPTIMIZER_ZONE_PRICE_SOURCES.items()}
+
+def price_cache_stats():
+    caches = [price_cache, *zone_price_caches.values()]
+    totals = {key: sum(cache.stats()[key] for cache in caches)
+              for key in ("hits", "refreshes", "invalidations", "cached_prices")}
+    return dict(totals, zones={zone: cache.stats() for zone, cache in zone_price_caches.items()})
+
+def invalidate_prices(zone, reason):
+    """
+    Invalidate the zone's curve and the all-sources one. Alerts for a zone
+    without a curve of its own (or without a zone) invalidate every curve.
+    """
+    price_cache.invalidate(reason)
+    for cache_zone, cache in zone_price_caches.items():
+        if zone == cache_zone or zone not in zone_price_caches:
+            cache.invalidate(reason)
+
+def get_price_forecast(market_zone=None):
     if not DB_CONNECTION:
         return pd.DataFrame()
     try:
-        conn = psycopg2.connect(DB_CONNECTION)
-        query = """
-            SELECT time, price 
-            FROM market_prices 
-            WHERE time >= NOW() AND time < NOW() + INTERVAL '24 hours'
-            ORDER BY time ASC;
-        """
-        df = pd.read_sql(query, conn)
-        conn.close()
-        return df
+        return zone_price_caches.get(market_zone, price_cache).get()
     except Exception as e:
         logger.error(f"Error fetching prices: {e}")
         return pd.DataFrame()
 
-def save_schedule(target_time, action, reason):
-    if not DB_CONNECTION:
-        return
+def save_schedules(schedule, cancelled=()):
+    """
+    Upsert a run's schedule changes, [(target_hour, asset_id, action, reason, power_kw)],
+    and cancel the [(target_hour, asset_id)] no longer planned, in one
+    transaction. Returns True once committed.
+    """
+    # A repeated (target_hour, asset_id) within one statement is an error, last one wins
+    rows = list({(row[0], row[1]): row for row in schedule}.values())
     try:
-        conn = psycopg2.connect(DB_CONNECTION)
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO optimization_schedules (target_hour, action, reason) VALUES (%s, %s, %s)",
-            (target_time, action, reason)
-        )
-        conn.commit()
-        cur.close()
-        conn.close()
+        with timed("schedule_save", rows=len(rows) + len(cancelled)), telemetry_db.connection() as conn, conn.cursor() as cur:
+            if rows:
+                execute_values(cur, SCHEDULE_UPSERT, rows, page_size=1000)
+            if cancelled:
+                execute_values(cur, SCHEDULE_CANCEL, list(cancelled), template="(%s::timestamptz, %s)", page_size=1000)
+        return True
     except Exception as e:
         logger.error(f"Error saving schedule: {e}")
+        return False
+
+def plan_for(key):
+    with plans_lock:
+        plan = plans.get(key)
+        if plan is None:
+            plan = plans[key] = RollingPlan(cost_threshold=OPTIMIZER_COST_THRESHOLD,
+                                            full_every=OPTIMIZER_FULL_RESOLVE_EVERY)
+        return plan
+
+def forget_plans(keys):
+    """Drop the plans of keys now optimized elsewhere: their next run here starts afresh."""
+    with plans_lock:
+        for key in keys:
+            plans.pop(key, None)
 
-def run_optimization():
-    global last_solar_predictions
-    if not last_solar_predictions:
+def plan_stats():
+    with plans_lock:
+        current = list(plans.items())
+    if OPTIMIZER_PARTITION_BY == "fleet":
+        plan = dict(current).get(FLEET_KEY)
+        return plan.stats() if plan else {}
+    return {key: plan.stats() for key, plan in current}
+
+def propose(plan, *args, **kwargs):
+    """plan.propose(...), on the solver pool when there is one."""
+    global solver_pool
+    if solver_pool is None:
+        return plan.propose(*args, **kwargs)
+    try:
+        return solver_pool.submit(propose_plan, plan, *args, **kwargs).result()
+    except BrokenProcessPool:
+        # A solver process died: replace the pool, the scheduler retries the run
+        solver_pool = start_solver_pool()
+        raise
+
+def start_solver_pool():
+    # spawn: never fork the FastAPI/Kafka threads into the workers
+    return ProcessPoolExecutor(max_workers=OPTIMIZER_PROCESSES, mp_context=get_context("spawn"))
+
+def key_revoked(key, generation):
+    """Whether `key` was revoked from this consumer since a run of `generation` was queued."""
+    return generation is not None and key_generations.get(key, 0) != generation
+
+def run_optimization(solar_predictions, key=FLEET_KEY, partition=None, generation=None):
+    """
+    Plan the flexible fleet against `solar_predictions`. With a `partition`,
+    (tenant_id, market_zone), only that tenant's assets in the zone are
+    planned, against the zone's prices, under the rolling plan of `key`.
+    A run queued at `generation` of its key stops before saving or
+    publishing anything once the key has been revoked.
+    """
+    if not solar_predictions:
         logger.warning("No solar predictions available for optimization")
         return
+    if key_revoked(key, generation):
+        logger.info(f"Skipping optimization for {key}: its partition was revoked")
+        return
 
-    logger.info("Running optimization algorithm...")
+    tenant_id, market_zone = partition or (None, None)
+    label = f" for tenant {tenant_id} in {market_zone}" if partition else ""
+    logger.info(f"Running optimization algorithm{label}...")
     
-    # 1. Prepare Solar Data
-    df_solar = pd.DataFrame(last_solar_predictions)
-    df_solar['timestamp'] = pd.to_datetime(df_solar['timestamp'])
+    slot_ns = OPTIMIZER_SLOT_MINUTES * NS_PER_MINUTE
+
+    # 1. Prepare Solar Data (hourly yields, kWh per hour)
+    df_solar = pd.DataFrame(solar_predictions)
+    solar_times = to_epoch_ns(df_solar['timestamp'])
+    solar_kwh = df_solar['predicted_yield_kwh'].to_numpy(dtype=float)
     
     # 2. Fetch Price Forecast
-    df_prices = get_price_forecast()
+    df_prices = get_price_forecast(market_zone)
     if df_prices.empty:
-        logger.warning("No price forecast available")
+        logger.warning(f"No price forecast available{label}")
         return
 
-    df_prices['time'] = pd.to_datetime(df_prices['time'])
-    
-    # 3. Merge (nearest match)
-    # Ensure timezone awareness
-    df_solar['timestamp'] = df_solar['timestamp'].dt.tz_localize(None)
-    df_prices['time'] = df_prices['time'].dt.tz_localize(None)
-    
-    df = pd.merge_asof(
-        df_solar.sort_values('timestamp'), 
-        df_prices.sort_values('time'), 
-        left_on='timestamp', 
-        right_on='time', 
-        direction='nearest'
-    )
+    price_times = to_epoch_ns(df_prices['time'])
+    prices = df_prices['price'].to_numpy(dtype=float)
     
-    # 4. Optimization Logic:
-    # Target: 5 hours of charging (Load Shifting)
-    # Priorities: 1. Negative Prices, 2. Highest Solar, 3. Lowest Prices
-    
-    df['score'] = (df['predicted_yield_kwh'] * 0.5) - (df['price'] * 0.5)
-    
-    # Pick top 5 slots
-    top_slots = df.nlargest(5, 'score')
-    
-    p = Producer({'bootstrap.servers': KAFKA_BROKERS})
-    
-    for _, row in top_slots.iterrows():
-        reason = "SOLAR_SURPLUS" if row['predicted_yield_kwh'] > 1.0 else "LOW_PRICE"
-        if row['price'] < 0:
-            reason = "NEGATIVE_PRICE"
-            
-        logger.info(f"Scheduling START_CHARGING at {row['timestamp']} due to {reason}")
-        
-        # Save to DB
-        save_schedule(row['timestamp'], "START_CHARGING", reason)
-        
-        # In a real system, we'd use a scheduler (like Celery or APScheduler) 
-        # to emit this EXACTLY at row['timestamp'].
-        # For the demo, we emit a "Planned" event.
-        message = {
-            "command": "START_CHARGING",
-            "target_assets": ["flexible_load"],
-            "scheduled_time": row['timestamp'].isoformat(),
-            "reason": reason
-        }
-        p.produce(COMMAND_TOPIC, json.dumps(message).encode('utf-8'))
+    # 3. Align both on the UTC slot grid covering the forecast: a yield or a
+    # price holds for its whole period, and finer ones are averaged per slot
+    with timed("merge", rows=len(df_solar) + len(df_prices)):
+        solar_step = infer_resolution(np.sort(solar_times))
+        slots = span(solar_times.min(), solar_times.max() + solar_step, slot_ns)
+        yield_kwh = align(slots, slot_ns, solar_times, solar_kwh, fill="hold", max_gap=solar_step)
+        price = align(slots, slot_ns, price_times, prices, fill="hold", max_gap=infer_resolution(price_times))
+        covered = ~np.isnan(yield_kwh) & ~np.isnan(price)
+        if not covered.all():
+            logger.warning(f"{int((~covered).sum())} of {len(slots)} slots have no price or solar forecast, left out")
+            slots, yield_kwh, price = slots[covered], yield_kwh[covered], price[covered]
+    if not len(slots):
+        logger.warning("Solar and price forecasts don't overlap")
+        return
     
-    p.flush()
+    # 4. Optimization Logic: load shifting for the whole flexible fleet at once.
+    # A slot's cost is its price minus the expected solar yield, so the
+    # cheapest slots are: 1. Negative Prices, 2. Highest Solar, 3. Lowest Prices.
+    # The previous plan is kept and only the part affected by changes re-solved.
+    if partition:
+        fleet = fleet_source.partition(tenant_id, market_zone)
+        if fleet is None:
+            logger.info(f"No flexible assets{label}, nothing to plan")
+            return
+        site_limit = fleet.site_limit_kw
+    else:
+        fleet = fleet_source.get()
+        site_limit = float(OPTIMIZER_SITE_LIMIT_KW) if OPTIMIZER_SITE_LIMIT_KW else fleet.site_limit_kw
+    plan = plan_for(key)
+    reasons = np.where(price < 0, "NEGATIVE_PRICE",
+                       np.where(yield_kwh > 1.0, "SOLAR_SURPLUS", "LOW_PRICE")).tolist()
+    started = time.perf_counter()
+    with timed("solve", rows=len(fleet)):
+        update = propose(
+            plan,
+            fleet,
+            slots,
+            price - yield_kwh,
+            reasons,
+            site_limit_kw=site_limit,
+            slot_hours=slot_ns / NS_PER_HOUR,
+        )
+    result = update.schedule
+    logger.info(f"{update.mode.capitalize()} plan{label} for {len(fleet)} assets x {len(slots)} slots: re-solved "
+                f"{update.solved_slots} slots ({update.solved_assets} changed assets) in "
+                f"{(time.perf_counter() - started) * 1000:.1f} ms")
+    unmet = result.unmet_kwh > 1e-6
+    if unmet.any():
+        logger.warning(f"{int(unmet.sum())} assets can't be fully charged in their windows "
+                       f"({result.unmet_kwh.sum():.1f} kWh unmet)")
+
+    # 5. Diff against the previous plan: only changes are saved and published
+    target_hours = list(to_datetimes(slots).to_pydatetime())
+    # Slot-major, so each slot's assets are contiguous
+    slot_idx, asset_idx = np.nonzero(update.started.T)
+    schedule = [(target_hours[t], fleet.asset_ids[a], "START_CHARGING", reasons[t], round(float(result.power_kw[a, t]), 3))
+                for t, a in zip(slot_idx.tolist(), asset_idx.tolist())]
+    cancel_slots, cancel_assets = np.nonzero(update.cancelled.T)
+    cancelled = sorted([(t, fleet.asset_ids[a]) for t, a in zip(cancel_slots.tolist(), cancel_assets.tolist())]
+                       + [(t, asset_id) for asset_id, t in update.removed], key=lambda cell: cell[0])
+    if not schedule and not cancelled:
+        plan.accept(update)
+        mark_success("optimization")
+        logger.info(f"Plan unchanged{label}, nothing to publish")
+        return
+    for t in np.unique(slot_idx):
+        logger.info(f"Scheduling START_CHARGING at {target_hours[t]} for {int((slot_idx == t).sum())} assets "
+                    f"({result.slot_load_kw[t]:.1f} kW) due to {reasons[t]}")
+
+    if key_revoked(key, generation):
+        logger.info(f"Not saving schedule for {key}: its partition was revoked during the run")
+        return
+
+    # Save to DB first: commands are only emitted for a committed schedule,
+    # and the plan only moves on once they are
+    if DB_CONNECTION and not save_schedules(schedule, [(target_hours[t], asset_id) for t, asset_id in cancelled]):
+        # Fail the run: the scheduler retries it and its offsets stay uncommitted
+        raise RuntimeError(f"Schedule{label} not saved, not emitting commands for this run")
+    plan.accept(update)
+
+    # In a real system, we'd use a scheduler (like Celery or APScheduler) 
+    # to emit this EXACTLY at the target hour.
+    # For the demo, we emit "Planned" events per slot, as one batch.
+    # A tenant's commands are keyed like its forecasts, so they stay in order on one partition
+    command_key = key.encode('utf-8') if partition else None
+    scope = {"tenant_id": tenant_id, "market_zone": market_zone} if partition else {}
+    published = 0
+    with timed("kafka_publish"):
+        for t, assets in _by_slot([(t, a) for t, a in zip(slot_idx.tolist(), asset_idx.tolist())]):
+            if key_revoked(key, generation):
+                break
+            for i in range(0, len(assets), COMMAND_BATCH_SIZE):
+                batch = assets[i:i + COMMAND_BATCH_SIZE]
+                message = {
+                    "command": "START_CHARGING",
+                    "target_assets": [fleet.asset_ids[a] for a in batch],
+                    "power_kw": np.round(result.power_kw[batch, t], 3).tolist(),
+                    "scheduled_time": target_hours[t].isoformat(),
+                    "reason": reasons[t],
+                    **scope
+                }
+                producer.produce(COMMAND_TOPIC, json.dumps(message).encode('utf-8'), key=command_key)
+                published += 1
+        for t, assets in _by_slot(cancelled):
+            if key_revoked(key, generation):
+                break
+            for i in range(0, len(assets), COMMAND_BATCH_SIZE):
+                message = {
+                    "command": "CANCEL_CHARGING",
+                    "target_assets": assets[i:i + COMMAND_BATCH_SIZE],
+                    "scheduled_time": target_hours[t].isoformat(),
+                    **scope
+                }
+                producer.produce(COMMAND_TOPIC, json.dumps(message).encode('utf-8'), key=command_key)
+                published += 1
+    count_rows("kafka_publish", published)
+    mark_success("optimization")
+    logger.info(f"Saved and queued {len(schedule)} changed and {len(cancelled)} cancelled scheduled commands{label}")
+
+def _by_slot(cells):
+    """Group slot-ordered (slot, asset) cells into (slot, [assets])."""
+    groups = []
+    for t, asset in cells:
+        if groups and groups[-1][0] == t:
+            groups[-1][1].append(asset)
+        else:
+            groups.append((t, [asset]))
+    return groups
+
+profiler = SamplingProfiler()
+offsets = OffsetTracker()
+# Latest known partition of each key, so a rebalance drops the plans it moves away
+key_partitions = {}
+# Bumped when a key's partition is revoked, so runs queued before that don't publish
+key_generations = {}
+scheduler = CoalescingScheduler(
+    lambda key, job: run_optimization(job[0], key=key, partition=job[1], generation=job[2]),
+    # Enough concurrent runs to keep the solver pool busy
+    workers=OPTIMIZER_WORKERS if OPTIMIZER_PARTITION_BY == "fleet" else max(OPTIMIZER_WORKERS, OPTIMIZER_PROCESSES),
+    debounce=OPTIMIZER_DEBOUNCE_SECONDS,
+    max_delay=OPTIMIZER_MAX_DELAY_SECONDS,
+    on_done=offsets.done
+)
+
+# Existing component counters, read at scrape time
+register_stats("emma_kafka_producer", producer.stats, description="Kafka producer",
+               counters={"produced": "produced", "delivered": "delivered", "failed": "failed"},
+               gauges={"queue_depth": "queue_depth"})
+register_stats("emma_optimizer_scheduler", scheduler.stats, description="Optimization scheduler",
+               counters={"submitted": "submitted", "coalesced": "coalesced", "runs": "runs", "failures": "failures"},
+               gauges={"queue_depth": "queue_depth", "running": "running", "oldest_wait_seconds": "oldest_wait_seconds"})
+register_stats("emma_price_cache", price_cache_stats, description="Price curve caches",
+               counters={"hits": "hits", "refreshes": "refreshes", "invalidations": "invalidations"},
+               gauges={"cached_prices": "cached_prices"})
+register_stats("emma_optimizer_consumer", lambda: dict(consumer_stats, outstanding_messages=offsets.outstanding()),
+               description="Solar predictions consumer",
+               counters={"received": "received", "skipped": "skipped", "errors": "errors", "reconnects": "reconnects"},
+               gauges={"message_age_seconds": "message_age_seconds", "outstanding_messages": "outstanding_messages"})
+
+def commit_finished(consumer, asynchronous=True):
+    """Commit offsets of messages whose optimization run has completed."""
+    positions = offsets.committable()
+    if not positions:
+        return
+    consumer.commit(offsets=[TopicPartition(SOLAR_TOPIC, p, o) for p, o in positions.items()], asynchronous=asynchronous)
+    offsets.mark_committed(positions)
+    consumer_stats["committed"] += len(positions)
+
+def update_partition_lag(consumer):
+    lag = {}
+    for tp in consumer.assignment():
+        low, high = consumer.get_watermark_offsets(tp, timeout=1.0, cached=True)
+        position = consumer.position([tp])[0].offset
+        if high >= 0 and position >= 0:
+            lag[tp.partition] = high - position
+    consumer_stats["partition_lag"] = lag
+    set_consumer_lag(SOLAR_TOPIC, lag)
+
+def handle_solar_message(msg):
+    token = (msg.partition(), msg.offset())
+    offsets.received(*token)
+    consumer_stats["received"] += 1
+    ts_type, ts_ms = msg.timestamp()
+    if ts_ms > 0:
+        consumer_stats["message_age_seconds"] = round(time.time() - ts_ms / 1000, 3)
+
+    try:
+        data = json.loads(msg.value().decode('utf-8'))
+    except Exception as e:
+        logger.error(f"Error processing solar prediction: {e}")
+        consumer_stats["skipped"] += 1
+        offsets.done([token])
+        return
+
+    if OPTIMIZER_PARTITION_BY == "tenant_zone":
+        # One plan per tenant and zone, from the forecasts keyed (and partitioned) by them
+        if data.get("group_by") != "tenant_zone" or not data.get("tenant_id") or not data.get("market_zone"):
+            consumer_stats["skipped"] += 1
+            offsets.done([token])
+            return
+        key, partition = str(data["group"]), (str(data["tenant_id"]), str(data["market_zone"]))
+        key_partitions[key] = msg.partition()
+    elif "group" in data:
+        # Per-asset/location forecasts; the fleet-wide message drives this optimizer
+        consumer_stats["skipped"] += 1
+        offsets.done([token])
+        return
+    else:
+        key, partition = FLEET_KEY, None
+
+    predictions = data.get("predictions", [])
+    logger.info(f"Received {len(predictions)} solar predictions for {key}. Queueing optimization.")
+    scheduler.submit(key, (predictions, partition, key_generations.get(key, 0)), token)
 
 def kafka_consumer_loop():
     if not KAFKA_BROKERS:
         return
-        
+
+    def on_revoke(consumer, partitions):
+        try:
+            commit_finished(consumer, asynchronous=False)
+        except KafkaException as e:
+            logger.warning(f"Could not commit before rebalance: {e}")
+        revoked = {tp.partition for tp in partitions}
+        offsets.forget(revoked)
+        # Another replica plans these keys now; if they come back, start from a full solve
+        moved = [key for key, partition in list(key_partitions.items()) if partition in revoked]
+        forget_plans(moved)
+        for key in moved:
+            key_partitions.pop(key, None)
+            key_generations[key] = key_generations.get(key, 0) + 1
+        # Their queued runs are stale; running ones stop before publishing
+        dropped = scheduler.drop(moved)
+        if moved:
+            logger.info(f"Revoked {len(moved)} keys, dropped {dropped} queued runs")
+
+    while True:
+        c = Consumer({
+            'bootstrap.servers': KAFKA_BROKERS,
+            'group.id': 'optimizer-group',
+            'auto.offset.reset': 'earliest',
+            # Offsets are committed once the optimization run using them has finished
+            'enable.auto.commit': False
+        })
+        try:
+            c.subscribe([SOLAR_TOPIC], on_revoke=on_revoke)
+            last_lag_check = 0.0
+            while True:
+                msg = c.poll(1.0)
+                commit_finished(c)
+                if time.monotonic() - last_lag_check > 10:
+                    update_partition_lag(c)
+                    last_lag_check = time.monotonic()
+
+                if msg is None: continue
+                if msg.error():
+                    if msg.error().code() == KafkaError._PARTITION_EOF: continue
+                    consumer_stats["errors"] += 1
+                    if msg.error().fatal():
+                        raise KafkaException(msg.error())
+                    # Transient (broker down, rebalance...): librdkafka recovers on its own
+                    logger.error(msg.error())
+                    continue
+
+                handle_solar_message(msg)
+        except Exception as e:
+            logger.error(f"Solar prediction consumer failed, reconnecting in 5s: {e}")
+            consumer_stats["reconnects"] += 1
+            time.sleep(5)
+        finally:
+            c.close()
+
+def market_alert_loop():
+    """Invalidate the price curve whenever MarketService reports a price event."""
+    if not KAFKA_BROKERS:
+        return
+
+    # Every optimizer instance must see every alert: own group, no offsets kept
     c = Consumer({
         'bootstrap.servers': KAFKA_BROKERS,
-        'group.id': 'optimizer-group',
-        'auto.offset.reset': 'earliest'
+        'group.id': f'optimizer-prices-{os.getenv("HOSTNAME", os.getpid())}',
+        'auto.offset.reset': 'latest',
+        'enable.auto.commit': False
     })
-
-    c.subscribe([SOLAR_TOPIC])
+    c.subscribe([MARKET_ALERTS_TOPIC])
 
     while True:
         msg = c.poll(1.0)
         if msg is None: continue
         if msg.error():
-            if msg.error().code() == KafkaError._PARTITION_EOF: continue
-            else:
-                logger.error(msg.error())
-                break
-
+            if msg.error().code() != KafkaError._PARTITION_EOF:
+                logger.error(f"Market alert consumer error: {msg.error()}")
+            continue
         try:
-            data = json.loads(msg.value().decode('utf-8'))
-            global last_solar_predictions
-            last_solar_predictions = data.get("predictions", [])
-            logger.info(f"Received {len(last_solar_predictions)} solar predictions. Triggering optimization.")
-            run_optimization()
+            alert = json.loads(msg.value().decode('utf-8'))
+            invalidate_prices(alert.get('zone'), f"{alert.get('alert_type')} in {alert.get('zone')} from {alert.get('starts_at')}")
         except Exception as e:
-            logger.error(f"Error processing solar prediction: {e}")
-
-    c.close()
+            logger.error(f"Error processing market alert: {e}")
+            invalidate_prices(None, "unreadable market alert")
 
 @app.on_event("startup")
 def startup_event():
+    global solver_pool
+    if OPTIMIZER_PARTITION_BY not in PARTITION_MODES:
+        raise ValueError(f"OPTIMIZER_PARTITION_BY must be one of {PARTITION_MODES}, got {OPTIMIZER_PARTITION_BY}")
+    if OPTIMIZER_SLOT_MINUTES <= 0 or 60 % OPTIMIZER_SLOT_MINUTES:
+        raise ValueError(f"OPTIMIZER_SLOT_MINUTES must divide an hour, got {OPTIMIZER_SLOT_MINUTES}")
+    if OPTIMIZER_PARTITION_BY == "tenant_zone" and OPTIMIZER_PROCESSES > 0:
+        solver_pool = start_solver_pool()
     thread = threading.Thread(target=kafka_consumer_loop, daemon=True)
     thread.start()
+    threading.Thread(target=market_alert_loop, daemon=True).start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    scheduler.stop()
+    if solver_pool is not None:
+        solver_pool.shutdown()
+    producer.close()
+    telemetry_db.close()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,169 @@
+import os
+import sys
+import time
+import threading
+from collections import Counter as Tally
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Hot-path stages run from a few ms (a price fetch) to minutes (a cold fleet training)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram("emma_stage_duration_seconds", "Duration of hot-path stages", ["stage"], buckets=STAGE_BUCKETS)
+STAGE_FAILURES = Counter("emma_stage_failures_total", "Hot-path stages that raised", ["stage"])
+STAGE_ROWS = Counter("emma_stage_rows_total", "Rows handled by hot-path stages", ["stage"])
+LAST_SUCCESS = Gauge("emma_last_success_timestamp_seconds", "Unix time of the last successful run", ["job"])
+CONSUMER_LAG = Gauge("emma_consumer_lag_messages", "Messages behind the partition's high watermark", ["topic", "partition"])
+
+
+@contextmanager
+def timed(stage, rows=None):
+    """Observe the block's duration (and `rows`, if given) under `stage`."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_FAILURES.labels(stage).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - started)
+    if rows is not None:
+        count_rows(stage, rows)
+
+
+def count_rows(stage, rows):
+    STAGE_ROWS.labels(stage).inc(rows)
+
+
+def mark_success(job):
+    LAST_SUCCESS.labels(job).set_to_current_time()
+
+
+def set_consumer_lag(topic, lag):
+    """`lag`: {partition: messages behind} for the partitions currently assigned."""
+    CONSUMER_LAG.clear()
+    for partition, behind in lag.items():
+        CONSUMER_LAG.labels(topic, str(partition)).set(behind)
+
+
+class StatsCollector:
+    """
+    Exposes a component's existing `stats()` dict, read at scrape time:
+    `counters` / `gauges` map a stats key to its metric name suffix.
+    """
+
+    def __init__(self, prefix, stats, counters=None, gauges=None, description=""):
+        self.prefix = prefix
+        self.stats = stats
+        self.counters = counters or {}
+        self.gauges = gauges or {}
+        self.description = description
+
+    def collect(self):
+        values = self.stats()
+        for key, suffix in self.counters.items():
+            if values.get(key) is not None:
+                family = CounterMetricFamily(f"{self.prefix}_{suffix}", f"{self.description} {key}".strip())
+                family.add_metric([], values[key])
+                yield family
+        for key, suffix in self.gauges.items():
+            if values.get(key) is not None:
+                family = GaugeMetricFamily(f"{self.prefix}_{suffix}", f"{self.description} {key}".strip())
+                family.add_metric([], values[key])
+                yield family
+
+
+def register_stats(prefix, stats, counters=None, gauges=None, description=""):
+    REGISTRY.register(StatsCollector(prefix, stats, counters, gauges, description))
+
+
+def exposition():
+    """(body, content type) of the Prometheus text exposition."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler that can be switched on under production load.
+
+    While running, a background thread samples the stack of every other
+    thread every `interval` seconds and counts them as collapsed stacks
+    ("module:function;module:function count", the flamegraph format). When
+    stopped it costs nothing; it stops by itself after `duration` seconds.
+    """
+
+    def __init__(self):
+        self._stacks = Tally()
+        self._samples = 0
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.interval = None
+        self.started_at = None
+        self.stopped_at = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=0.01, duration=60.0):
+        """Start a new profile (dropping the previous one). False if one is running."""
+        with self._lock:
+            if self.running:
+                return False
+            self._stacks = Tally()
+            self._samples = 0
+            self.interval = interval
+            self.started_at = time.time()
+            self.stopped_at = None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval, duration), name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+
+    def _run(self, interval, duration):
+        own = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + duration if duration else None
+        while not self._stop.wait(interval):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, frame in frames.items():
+                    if thread_id == own:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        name = names.get(code)
+                        if name is None:
+                            name = names[code] = f"{os.path.basename(code.co_filename)}:{code.co_name}"
+                        stack.append(name)
+                        frame = frame.f_back
+                    self._stacks[";".join(reversed(stack))] += 1
+                self._samples += 1
+        self.stopped_at = time.time()
+
+    def status(self):
+        with self._lock:
+            return {
+                "running": self.running,
+                "interval_seconds": self.interval,
+                "samples": self._samples,
+                "stacks": len(self._stacks),
+                "started_at": self.started_at,
+                "stopped_at": self.stopped_at,
+            }
+
+    def collapsed(self, limit=None):
+        """The profile as collapsed stacks, most sampled first."""
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common(limit))
@@ -0,0 +1,73 @@
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+logger = logging.getLogger("optimizer-engine")
+
+
+class PriceCurveCache:
+    """
+    In-memory, time-indexed price curve shared by all optimization runs.
+
+    `loader()` returns (time, price) rows for a window starting at the current
+    hour and reaching past the 24h horizon; the curve is reloaded only when
+    the hour boundary passes or after `invalidate()` (market alerts / price
+    updates). `get()` slices the cached curve to the horizon from the start
+    of the current hour, whose price still applies to the slot in progress.
+    """
+
+    def __init__(self, loader, horizon=timedelta(hours=24)):
+        self.loader = loader
+        self.horizon = horizon
+        self._curve = None
+        self._loaded_hour = None
+        self._stale = True
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.refreshes = 0
+        self.invalidations = 0
+
+    def invalidate(self, reason=""):
+        with self._lock:
+            self._stale = True
+            self.invalidations += 1
+        logger.info(f"Price curve invalidated{f': {reason}' if reason else ''}")
+
+    def get(self, now=None):
+        now = pd.Timestamp(now or datetime.now(timezone.utc))
+        hour = now.floor("h")
+        with self._lock:
+            if self._stale or self._curve is None or self._loaded_hour != hour:
+                self._refresh(hour)
+            else:
+                self.hits += 1
+            curve = self._curve
+        start, end = curve.index.searchsorted([hour, hour + self.horizon], side="left")
+        return curve.iloc[start:end].reset_index()
+
+    def _refresh(self, hour):
+        df = self.loader()
+        # Only mark fresh once prices are loaded: a failed load raises, and an
+        # empty one (the hour's prices not in market_prices yet) stays stale,
+        # so both are retried next run
+        curve = pd.DataFrame({"time": pd.to_datetime(df["time"], utc=True), "price": df["price"].astype(float)}) \
+            if not df.empty else pd.DataFrame({"time": pd.to_datetime([], utc=True), "price": []})
+        self._curve = curve.set_index("time").sort_index()
+        self._loaded_hour = hour
+        self._stale = df.empty
+        self.refreshes += 1
+        if df.empty:
+            logger.warning(f"No prices from {hour.isoformat()} yet, reloading on the next run")
+        else:
+            logger.info(f"Price curve refreshed: {len(self._curve)} prices from {hour.isoformat()}")
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "refreshes": self.refreshes,
+            "invalidations": self.invalidations,
+            "cached_prices": 0 if self._curve is None else len(self._curve),
+            "loaded_hour": None if self._loaded_hour is None else self._loaded_hour.isoformat(),
+        }
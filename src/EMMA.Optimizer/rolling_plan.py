@@ -0,0 +1,209 @@
+import threading
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from flexible_assets import OPEN_END
+from solver import FleetProblem, FleetSchedule, solve_fleet
+
+
+@dataclass
+class PlanUpdate:
+    """
+    Outcome of one re-optimization, aligned to the new slot grid.
+
+    `started` marks (asset, slot) cells to (re)publish: newly scheduled, or
+    whose power or reason changed. `cancelled` marks cells that were
+    scheduled before and no longer are; `removed` lists the (asset_id, slot)
+    cells of assets that left the fleet.
+    """
+    mode: str  # "full", "incremental" or "unchanged"
+    schedule: FleetSchedule
+    previous_kw: np.ndarray
+    started: np.ndarray
+    cancelled: np.ndarray
+    solved_slots: int
+    solved_assets: int
+    removed: List[Tuple[str, int]] = field(default_factory=list)
+    _state: dict = field(default=None, repr=False)
+
+
+class RollingPlan:
+    """
+    The fleet plan kept between optimization runs of one key.
+
+    Each run aligns the previous plan to the new slot grid (slots that have
+    passed drop out, new ones at the end of the horizon appear), then looks
+    for what changed: slots whose cost moved more than `cost_threshold`, and
+    assets that were added or whose parameters changed. The solver visits
+    slots cheapest first, so slots cheaper than every changed slot keep
+    their allocation; only the slots from the cheapest changed cost upwards
+    are cleared and re-solved, warm-started with the rest of the plan. A
+    full solve is done on the first run, when the site limit changes and
+    every `full_every` runs, so the plan can't drift.
+
+    Energy charged in slots that have passed counts towards the need of
+    assets with a bounded window; open-ended assets need their energy in
+    every horizon.
+
+    `propose()` doesn't change the plan: call `accept()` once its schedule
+    has been saved, so the next diff is made against what was published.
+    Plans pickle (without their lock), so `propose_plan` can run in a
+    process pool.
+    """
+
+    def __init__(self, cost_threshold=1.0, full_every=24, tolerance_kw=1e-3):
+        self.cost_threshold = cost_threshold
+        self.full_every = full_every
+        self.tolerance_kw = tolerance_kw
+        self._state = None
+        self._runs_since_full = 0
+        self._lock = threading.Lock()
+        self.runs = {"full": 0, "incremental": 0, "unchanged": 0}
+
+    def __getstate__(self):
+        with self._lock:
+            state = dict(self.__dict__, runs=dict(self.runs))
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._state = None
+
+    def propose(self, fleet, slots_ns, cost, reasons, site_limit_kw=None, slot_hours=1.0):
+        slots_ns = np.asarray(slots_ns, dtype=np.int64)
+        cost = np.asarray(cost, dtype=np.float64)
+        A, T = len(fleet), len(slots_ns)
+        with self._lock:
+            previous = self._state
+            runs_since_full = self._runs_since_full
+
+        prev_kw = np.zeros((A, T))
+        prev_reasons: List[Optional[str]] = [None] * T
+        delivered = np.zeros(A)
+        changed_assets = np.ones(A, dtype=bool)
+        changed_slots = np.ones(T, dtype=bool)
+        removed = []
+        floor = np.inf  # cheapest cost (before or after) among changed slots
+        if previous is not None:
+            _, new_pos, old_pos = np.intersect1d(slots_ns, previous["slots"], return_indices=True)
+            old_rows = np.array([previous["rows"].get(a, -1) for a in fleet.asset_ids], dtype=np.int64)
+            known = np.flatnonzero(old_rows >= 0)
+            rows = old_rows[known]
+            changed_assets[known] = ~(
+                (fleet.energy_kwh[known] == previous["energy_kwh"][rows])
+                & (fleet.max_power_kw[known] == previous["max_power_kw"][rows])
+                & (fleet.available_from[known] == previous["available_from"][rows])
+                & (fleet.available_until[known] == previous["available_until"][rows])
+            )
+            prev_kw[np.ix_(known, new_pos)] = previous["power_kw"][np.ix_(rows, old_pos)]
+            for new, old in zip(new_pos.tolist(), old_pos.tolist()):
+                prev_reasons[new] = previous["reasons"][old]
+            current = set(fleet.asset_ids)
+            for asset_id, row in previous["rows"].items():
+                if asset_id not in current:
+                    on = previous["power_kw"][row, old_pos] > self.tolerance_kw
+                    removed.extend((asset_id, t) for t in new_pos[on].tolist())
+
+            passed = previous["slots"] < slots_ns[0] if T else np.ones(len(previous["slots"]), dtype=bool)
+            delivered[known] = previous["delivered"][rows] \
+                + previous["power_kw"][rows][:, passed].sum(axis=1) * slot_hours
+            delivered[changed_assets | (fleet.available_until == OPEN_END)] = 0.0
+
+            moved = np.abs(cost[new_pos] - previous["cost"][old_pos]) > self.cost_threshold
+            changed_slots[new_pos] = moved
+            if changed_slots.any():
+                old_cost = np.full(T, np.inf)
+                old_cost[new_pos] = previous["cost"][old_pos]
+                floor = np.minimum(cost, old_cost)[changed_slots].min()
+
+        full = previous is None or runs_since_full + 1 >= self.full_every \
+            or previous["site_limit_kw"] != site_limit_kw
+        problem = FleetProblem(
+            cost=cost,
+            energy_kwh=np.maximum(fleet.energy_kwh - delivered, 0.0),
+            max_power_kw=fleet.max_power_kw,
+            available=fleet.availability(slots_ns, slot_hours),
+            site_limit_kw=site_limit_kw,
+            slot_hours=slot_hours,
+        )
+
+        if full:
+            mode = "full"
+            schedule = solve_fleet(problem)
+            solved_slots, solved_assets = T, A
+        elif not changed_slots.any() and not changed_assets.any() and not removed:
+            mode = "unchanged"
+            schedule = _as_schedule(problem, prev_kw)
+            solved_slots, solved_assets = 0, 0
+        else:
+            mode = "incremental"
+            affected = cost >= floor
+            warm = prev_kw.copy()
+            warm[changed_assets] = 0.0
+            warm[:, affected] = 0.0
+            # New or changed assets may need any slot, and removed ones free
+            # capacity anywhere; otherwise only the affected slots
+            slots = np.arange(T) if changed_assets.any() or removed else np.flatnonzero(affected)
+            schedule = solve_fleet(problem, fixed_kw=warm, slots=slots)
+            solved_slots, solved_assets = len(slots), int(changed_assets.sum())
+
+        tol = self.tolerance_kw
+        now_on = schedule.power_kw > tol
+        was_on = prev_kw > tol
+        reason_changed = np.array([new != old for new, old in zip(reasons, prev_reasons)], dtype=bool)
+        started = now_on & (~was_on | (np.abs(schedule.power_kw - prev_kw) > tol) | reason_changed[None, :])
+        cancelled = was_on & ~now_on
+
+        state = {
+            "slots": slots_ns,
+            "cost": cost,
+            "reasons": list(reasons),
+            "power_kw": schedule.power_kw,
+            "rows": {a: i for i, a in enumerate(fleet.asset_ids)},
+            "energy_kwh": fleet.energy_kwh,
+            "max_power_kw": fleet.max_power_kw,
+            "available_from": fleet.available_from,
+            "available_until": fleet.available_until,
+            "delivered": delivered,
+            "site_limit_kw": site_limit_kw,
+        }
+        return PlanUpdate(mode, schedule, prev_kw, started, cancelled, solved_slots, solved_assets,
+                          removed, _state=state)
+
+    def accept(self, update):
+        with self._lock:
+            self._state = update._state
+            self._runs_since_full = 0 if update.mode == "full" else self._runs_since_full + 1
+            self.runs[update.mode] += 1
+
+    def stats(self):
+        with self._lock:
+            state = self._state
+            return {
+                "runs": dict(self.runs),
+                "runs_since_full": self._runs_since_full,
+                "planned_assets": 0 if state is None else int((state["power_kw"] > self.tolerance_kw).any(axis=1).sum()),
+                "planned_slots": 0 if state is None else len(state["slots"]),
+            }
+
+
+def propose_plan(plan, *args, **kwargs):
+    """Pool entry point: `plan.propose(...)` on a pickled copy of the plan."""
+    return plan.propose(*args, **kwargs)
+
+
+def _as_schedule(problem, power_kw):
+    dt = problem.slot_hours
+    return FleetSchedule(
+        power_kw=power_kw,
+        unmet_kwh=np.maximum(problem.energy_kwh - power_kw.sum(axis=1) * dt, 0.0),
+        slot_load_kw=power_kw.sum(axis=0),
+        cost=float((power_kw * dt * problem.cost).sum()),
+    )
@@ -0,0 +1,188 @@
+from dataclasses import dataclass
+from typing import Optional, Union
+
+import numpy as np
+
+EPSILON = 1e-9
+
+
+@dataclass
+class FleetProblem:
+    """
+    Load-shifting problem for a fleet of flexible assets over T slots.
+
+    cost:          (T,) cost per kWh in each slot (lower is better)
+    energy_kwh:    (A,) energy each asset must receive over the horizon
+    max_power_kw:  (A,) per-asset power limit
+    available:     (A, T) bool, slots in each asset's time window
+    site_limit_kw: shared power limit per slot (scalar or (T,)), None for no limit
+    """
+    cost: np.ndarray
+    energy_kwh: np.ndarray
+    max_power_kw: np.ndarray
+    available: np.ndarray
+    site_limit_kw: Optional[Union[float, np.ndarray]] = None
+    slot_hours: float = 1.0
+
+    @property
+    def shape(self):
+        return self.available.shape
+
+
+@dataclass
+class FleetSchedule:
+    power_kw: np.ndarray  # (A, T)
+    unmet_kwh: np.ndarray  # (A,)
+    slot_load_kw: np.ndarray  # (T,)
+    cost: float
+
+
+def window_mask(starts, ends, slots):
+    """(A, T) mask of slots in [start, end) for each asset."""
+    t = np.arange(slots)
+    return (t >= np.asarray(starts)[:, None]) & (t < np.asarray(ends)[:, None])
+
+
+def solve_fleet(problem, fixed_kw=None, slots=None):
+    """
+    Schedule every asset's charging together.
+
+    Slots are filled cheapest first. Within a slot every available asset
+    asks for min(power limit, remaining need); when the site limit can't
+    cover all requests, the assets with the most expensive fallback (the
+    last later slot they would otherwise need, or none at all) are served
+    first. Each step is vectorized over assets, so the cost is O(T * A)
+    NumPy work. Energy still unmet behind a full site limit is then
+    repaired by moving other assets to their next cheapest slot with room
+    (O(T^2 * A) at worst, only when something is unmet).
+
+    This is a heuristic, not the LP optimum. When the site limit binds,
+    cost came out 1-4% above the HiGHS LP optimum (scipy linprog) on random
+    400-asset x 48-slot fleets, and some energy a feasible plan could
+    deliver may still be reported unmet when freeing it takes a chain of
+    moves rather than a single one.
+
+    `fixed_kw` (A, T) pre-seeds a plan (e.g. slots outside `slots`, the
+    subset of slot indices to solve, are kept as they are); needs are
+    reduced and the site limit is shared accordingly. Unreachable energy is
+    reported in `unmet_kwh` rather than violating a limit.
+    """
+    A, T = problem.shape
+    dt = problem.slot_hours
+    cost = np.asarray(problem.cost, dtype=np.float64)
+    slot_cap = np.asarray(problem.max_power_kw, dtype=np.float64) * dt  # kWh per asset per slot
+
+    power = np.zeros((A, T)) if fixed_kw is None else np.array(fixed_kw, dtype=np.float64)
+    need = np.maximum(np.asarray(problem.energy_kwh, dtype=np.float64) - power.sum(axis=1) * dt, 0.0)
+
+    if problem.site_limit_kw is None:
+        site_left = np.full(T, np.inf)
+    else:
+        site_left = np.broadcast_to(np.asarray(problem.site_limit_kw, dtype=np.float64), (T,)) * dt \
+            - power.sum(axis=0) * dt
+
+    slots = np.arange(T) if slots is None else np.asarray(slots)
+    order = slots[np.argsort(cost[slots], kind="stable")]
+    ordered_cost = np.append(cost[order], np.inf)
+    ordered_available = problem.available[:, order]
+    # Per asset, the positions (in visiting order) of its available slots, padded with len(order)
+    positions = np.argsort(~ordered_available, axis=1, kind="stable")
+    positions[~np.take_along_axis(ordered_available, positions, axis=1)] = len(order)
+    positions = np.concatenate([positions, np.full((A, 1), len(order))], axis=1)
+    seen = np.zeros(A, dtype=np.int64)  # available slots visited so far, per asset
+
+    for j, t in enumerate(order):
+        column = ordered_available[:, j]
+        seen += column
+
+        idx = np.flatnonzero(column & (need > EPSILON))
+        if idx.size == 0 or site_left[t] <= EPSILON:
+            continue
+
+        want = np.minimum(slot_cap[idx], need[idx])
+        total = want.sum()
+        if total <= site_left[t]:
+            alloc = want
+        else:
+            # Serve first the assets that lose most when denied this slot: the
+            # cost of the last later slot they would need instead (infinite
+            # when their window can't absorb it)
+            later = np.ceil(need[idx] / slot_cap[idx] - EPSILON).astype(np.int64)
+            k = np.minimum(seen[idx] + later - 1, len(order))
+            regret = ordered_cost[positions[idx, k]]
+            order_idx = np.argsort(-regret, kind="stable")
+            cumulative = np.cumsum(want[order_idx])
+            granted = np.clip(site_left[t] - (cumulative - want[order_idx]), 0.0, want[order_idx])
+            alloc = np.empty_like(want)
+            alloc[order_idx] = granted
+
+        power[idx, t] += alloc / dt
+        need[idx] -= alloc
+        site_left[t] -= alloc.sum()
+
+    if problem.site_limit_kw is not None and (need > EPSILON).any():
+        _repair_unmet(problem, power, need, site_left, slot_cap, cost, order)
+
+    return FleetSchedule(
+        power_kw=power,
+        unmet_kwh=np.maximum(need, 0.0),
+        slot_load_kw=power.sum(axis=0),
+        cost=float((power * dt * cost).sum()),
+    )
+
+
+def _repair_unmet(problem, power, need, site_left, slot_cap, cost, slots):
+    """
+    Deliver energy the greedy left unmet behind a full site limit, in place.
+
+    For each slot of `slots` (cheapest first) where assets short of energy
+    could still charge, the site capacity is freed by moving other assets'
+    charging to the cheapest slot where they have power and the site has
+    room left, cheapest moves first, and handed to the short assets. One
+    move per asset and slot: delivered energy improves, but the extra cost
+    of the moves isn't minimized as a whole.
+    """
+    dt = problem.slot_hours
+    open_slots = np.zeros(len(cost), dtype=bool)
+    open_slots[slots] = True
+    movable = problem.available & open_slots[None, :]
+
+    for t in slots:
+        short = np.flatnonzero((need > EPSILON) & problem.available[:, t])
+        if short.size == 0:
+            continue
+        want = np.minimum(need[short], slot_cap[short] - power[short, t] * dt)
+        wanted = want.sum()
+        if wanted <= EPSILON:
+            continue
+
+        # Movers: assets charging in t, each to its cheapest other slot with room
+        movers = np.flatnonzero(power[:, t] * dt > EPSILON)
+        movers = movers[need[movers] <= EPSILON]
+        room = slot_cap[movers, None] - power[movers] * dt
+        candidates = movable[movers] & (room > EPSILON) & (site_left > EPSILON)[None, :]
+        candidates[:, t] = False
+        dest = np.argmin(np.where(candidates, cost[None, :], np.inf), axis=1)
+        ok = candidates[np.arange(movers.size), dest]
+        movers, dest = movers[ok], dest[ok]
+        if movers.size == 0:
+            continue
+        amount = np.minimum(power[movers, t] * dt, room[ok, dest])
+
+        # Movers to the same slot cost the same extra: group them, share
+        # each destination's room in turn, then stop once the need is freed
+        by_cost = np.lexsort((dest, cost[dest]))
+        movers, dest, amount = movers[by_cost], dest[by_cost], amount[by_cost]
+        cumulative = np.cumsum(amount)
+        group_start = np.flatnonzero(np.r_[True, dest[1:] != dest[:-1]])
+        before = np.repeat(cumulative[group_start] - amount[group_start], np.diff(np.r_[group_start, dest.size]))
+        amount = np.clip(site_left[dest] - (cumulative - amount - before), 0.0, amount)
+        moved = np.clip(wanted - (np.cumsum(amount) - amount), 0.0, amount)
+
+        power[movers, t] -= moved / dt
+        power[movers, dest] += moved / dt
+        site_left -= np.bincount(dest, weights=moved, minlength=len(cost))
+        freed = moved.sum()
+        alloc = np.clip(freed - (np.cumsum(want) - want), 0.0, want)
+        power[short, t] += alloc / dt
+        need[short] -= alloc
@@ -0,0 +1,225 @@
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("optimizer-engine")
+
+DURATION_WINDOW = 256
+
+
+class OffsetTracker:
+    """
+    Tracks which consumed messages are finished so offsets are only committed
+    once every earlier message of the partition has been handled.
+    """
+
+    def __init__(self):
+        self._outstanding = {}  # partition -> set of offsets still being worked on
+        self._high = {}  # partition -> highest offset seen
+        self._committed = {}  # partition -> last committed position
+        self._lock = threading.Lock()
+
+    def received(self, partition, offset):
+        with self._lock:
+            self._outstanding.setdefault(partition, set()).add(offset)
+            self._high[partition] = max(offset, self._high.get(partition, -1))
+
+    def done(self, tokens):
+        with self._lock:
+            for partition, offset in tokens:
+                self._outstanding.get(partition, set()).discard(offset)
+
+    def committable(self):
+        """{partition: position} that can be committed now (next offset to consume)."""
+        positions = {}
+        with self._lock:
+            for partition, high in self._high.items():
+                outstanding = self._outstanding.get(partition)
+                position = min(outstanding) if outstanding else high + 1
+                if position > self._committed.get(partition, -1):
+                    positions[partition] = position
+        return positions
+
+    def mark_committed(self, positions):
+        with self._lock:
+            self._committed.update(positions)
+
+    def forget(self, partitions):
+        """Drop state for partitions this consumer no longer owns."""
+        with self._lock:
+            for partition in partitions:
+                self._outstanding.pop(partition, None)
+                self._high.pop(partition, None)
+                self._committed.pop(partition, None)
+
+    def outstanding(self):
+        with self._lock:
+            return sum(len(offsets) for offsets in self._outstanding.values())
+
+
+class _Pending:
+    __slots__ = ("inputs", "tokens", "first_at", "last_at", "attempts", "not_before")
+
+    def __init__(self, inputs, tokens, now):
+        self.inputs = inputs
+        self.tokens = list(tokens)
+        self.first_at = now
+        self.last_at = now
+        self.attempts = 0
+        self.not_before = 0.0
+
+
+class CoalescingScheduler:
+    """
+    Debouncing work queue in front of `run(key, inputs)`.
+
+    Submissions for the same key coalesce into the latest inputs; a key runs
+    once it has been quiet for `debounce` seconds (or has waited `max_delay`),
+    never concurrently with itself, on a pool of `workers` threads. The
+    tokens of every submission folded into a run are passed to `on_done`
+    once that run has finished (successfully or after `max_attempts`), which
+    is where the consumer commits its offsets.
+    """
+
+    def __init__(self, run, workers=2, debounce=2.0, max_delay=30.0, max_attempts=3, retry_delay=5.0, on_done=None):
+        self.run = run
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.on_done = on_done or (lambda tokens: None)
+        self._pending = {}
+        self._running = set()
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="optimizer-run")
+        self._stopped = False
+        self._durations = deque(maxlen=DURATION_WINDOW)
+        self._waits = deque(maxlen=DURATION_WINDOW)
+        self.submitted = 0
+        self.coalesced = 0
+        self.runs = 0
+        self.failures = 0
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="optimizer-dispatch", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, key, inputs, token=None):
+        tokens = [token] if token is not None else []
+        with self._cond:
+            now = time.monotonic()
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = _Pending(inputs, tokens, now)
+            else:
+                # Newer inputs supersede the queued ones
+                pending.inputs = inputs
+                pending.tokens.extend(tokens)
+                pending.last_at = now
+                self.coalesced += 1
+            self.submitted += 1
+            self._cond.notify()
+
+    def drop(self, keys):
+        """
+        Discard the queued runs of `keys`, e.g. after their partitions were
+        revoked. Their tokens are not passed to `on_done`; a run already in
+        progress is not interrupted. Returns the number of runs dropped.
+        """
+        with self._cond:
+            dropped = [key for key in keys if self._pending.pop(key, None) is not None]
+            self._cond.notify()
+        return len(dropped)
+
+    def _due_at(self, pending):
+        return max(min(pending.last_at + self.debounce, pending.first_at + self.max_delay), pending.not_before)
+
+    def _dispatch_loop(self):
+        with self._cond:
+            while not self._stopped:
+                now = time.monotonic()
+                next_due = None
+                for key in list(self._pending):
+                    if key in self._running:
+                        continue
+                    due = self._due_at(self._pending[key])
+                    if due <= now:
+                        pending = self._pending.pop(key)
+                        self._running.add(key)
+                        self._pool.submit(self._execute, key, pending)
+                    elif next_due is None or due < next_due:
+                        next_due = due
+                self._cond.wait(None if next_due is None else next_due - now)
+
+    def _execute(self, key, pending):
+        started = time.monotonic()
+        self._waits.append(started - pending.first_at)
+        try:
+            self.run(key, pending.inputs)
+            self.runs += 1
+            done = pending.tokens
+        except Exception as e:
+            self.failures += 1
+            pending.attempts += 1
+            if pending.attempts < self.max_attempts:
+                logger.error(f"Optimization for {key} failed (attempt {pending.attempts}), retrying: {e}")
+                done = None
+            else:
+                logger.error(f"Optimization for {key} failed {pending.attempts} times, giving up: {e}")
+                done = pending.tokens
+        finally:
+            self._durations.append(time.monotonic() - started)
+
+        if done is not None:
+            self.on_done(done)
+        with self._cond:
+            self._running.discard(key)
+            if done is None:
+                newer = self._pending.get(key)
+                if newer is None:
+                    pending.not_before = time.monotonic() + self.retry_delay
+                    self._pending[key] = pending
+                else:
+                    # Newer inputs arrived meanwhile: retry with them, keep our tokens
+                    newer.tokens = pending.tokens + newer.tokens
+                    newer.first_at = min(newer.first_at, pending.first_at)
+            self._cond.notify()
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._pending)
+
+    def oldest_wait(self):
+        with self._cond:
+            now = time.monotonic()
+            return max((now - p.first_at for p in self._pending.values()), default=0.0)
+
+    def stats(self):
+        def summary(values):
+            ordered = sorted(values)
+            if not ordered:
+                return {"last": None, "p50": None, "p95": None, "max": None}
+            return {
+                "last": round(values[-1], 3),
+                "p50": round(ordered[len(ordered) // 2], 3),
+                "p95": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 3),
+                "max": round(ordered[-1], 3),
+            }
+        return {
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "runs": self.runs,
+            "failures": self.failures,
+            "queue_depth": self.queue_depth(),
+            "running": len(self._running),
+            "oldest_wait_seconds": round(self.oldest_wait(), 3),
+            "queue_wait_seconds": summary(list(self._waits)),
+            "run_duration_seconds": summary(list(self._durations)),
+        }
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._dispatcher.join(timeout=1.0)
+        self._pool.shutdown(wait=True)
@@ -179,7 +179,19 @@ public static class SchemaSql
             reason TEXT,
             status TEXT DEFAULT 'PENDING'
         );
-        CREATE INDEX IF NOT EXISTS optimization_schedules_time_idx ON optimization_schedules (target_hour DESC);";
+        CREATE INDEX IF NOT EXISTS optimization_schedules_time_idx ON optimization_schedules (target_hour DESC);
+        ALTER TABLE optimization_schedules ADD COLUMN IF NOT EXISTS asset_id VARCHAR(50) NOT NULL DEFAULT 'flexible_load';
+        -- One-off: drop duplicate rows kept before the unique index existed
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_indexes
+                           WHERE schemaname = current_schema() AND indexname = 'optimization_schedules_target_asset_idx') THEN
+                DELETE FROM optimization_schedules a USING optimization_schedules b
+                    WHERE a.target_hour = b.target_hour AND a.asset_id = b.asset_id AND (a.at_time, a.id) < (b.at_time, b.id);
+            END IF;
+        END $$;
+        CREATE UNIQUE INDEX IF NOT EXISTS optimization_schedules_target_asset_idx ON optimization_schedules (target_hour, asset_id);
+        ALTER TABLE optimization_schedules ADD COLUMN IF NOT EXISTS power_kw DOUBLE PRECISION;";
 
     public const string ApiKeys = @"
         CREATE TABLE IF NOT EXISTS api_keys (
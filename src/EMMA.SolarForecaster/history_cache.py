@@ -0,0 +1,146 @@
+import os
+import glob
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+logger = logging.getLogger("solar-forecaster")
+
+HISTORY_COLUMNS = ["time", "asset_id", "power_kw"]
+
+
+class HistoryCache:
+    """
+    Local columnar cache of hourly history with a high-water mark.
+
+    Each refresh only fetches rows newer than the watermark (minus a small
+    overlap, because the continuous aggregate keeps rewriting its most recent
+    buckets), appends them as a new chunk and evicts chunks that fell out of
+    the training window. Chunks are mirrored to Parquet files in `cache_dir`,
+    so a restart warms from disk and only fetches what it missed.
+    """
+
+    def __init__(self, cache_dir, window=timedelta(days=30), overlap=timedelta(hours=2), max_chunks=48):
+        self.cache_dir = cache_dir
+        self.window = window
+        self.overlap = overlap
+        self.max_chunks = max_chunks
+        self._chunks = []  # list of (path, DataFrame), oldest first
+        self._frame = None
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def watermark(self):
+        if not self._chunks:
+            return None
+        return self._chunks[-1][1]["time"].max()
+
+    def __len__(self):
+        return sum(len(df) for _, df in self._chunks)
+
+    def load(self):
+        """Warm the cache from the chunk files left by a previous run."""
+        with self._lock:
+            self._chunks = []
+            for path in sorted(glob.glob(os.path.join(self.cache_dir, "chunk-*.parquet"))):
+                try:
+                    self._chunks.append((path, pd.read_parquet(path)))
+                except Exception as e:
+                    logger.warning(f"Discarding unreadable cache chunk {path}: {e}")
+                    os.remove(path)
+            self._frame = None
+            self._evict(datetime.now(timezone.utc) - self.window)
+        logger.info(f"History cache warmed from disk: {len(self)} rows, watermark={self.watermark}")
+
+    def refresh(self, fetch):
+        """
+        Pull new rows with `fetch(since) -> DataFrame[time, asset_id, power_kw]`,
+        which must return every row with time >= since (the cached rows from
+        `since` on are replaced by them), and return the full cached window.
+        """
+        with self._lock:
+            now = datetime.now(timezone.utc)
+            cutoff = now - self.window
+            watermark = self.watermark
+            since = cutoff if watermark is None else max(cutoff, watermark - self.overlap)
+
+            new_rows = fetch(since)
+            if new_rows is not None and not new_rows.empty:
+                new_rows = new_rows[HISTORY_COLUMNS].copy()
+                new_rows["time"] = pd.to_datetime(new_rows["time"], utc=True)
+                # The overlap is re-fetched, so drop our copy of it first
+                self._truncate_from(since)
+                self._append(new_rows)
+
+            self._evict(cutoff)
+            if len(self._chunks) > self.max_chunks:
+                self._compact()
+
+            logger.info(f"History cache refreshed: fetched {0 if new_rows is None else len(new_rows)} rows "
+                        f"since {since.isoformat()}, {len(self)} cached")
+            return self.frame()
+
+    def frame(self):
+        if self._frame is None:
+            if self._chunks:
+                self._frame = pd.concat([df for _, df in self._chunks], ignore_index=True)
+            else:
+                self._frame = pd.DataFrame(columns=HISTORY_COLUMNS)
+        return self._frame
+
+    def _chunk_path(self, df):
+        start = df["time"].min()
+        return os.path.join(self.cache_dir, f"chunk-{start.strftime('%Y%m%dT%H%M%S')}-{os.urandom(3).hex()}.parquet")
+
+    def _write(self, path, df):
+        tmp = path + ".tmp"
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+
+    def _append(self, df):
+        path = self._chunk_path(df)
+        self._write(path, df)
+        self._chunks.append((path, df.reset_index(drop=True)))
+        self._frame = None
+
+    def _truncate_from(self, since):
+        # Only the newest chunks can contain rows >= since
+        while self._chunks:
+            path, df = self._chunks[-1]
+            if df["time"].max() < since:
+                break
+            kept = df[df["time"] < since]
+            self._chunks.pop()
+            os.remove(path)
+            if not kept.empty:
+                self._append(kept)
+                break
+        self._frame = None
+
+    def _evict(self, cutoff):
+        while self._chunks:
+            path, df = self._chunks[0]
+            if df["time"].max() < cutoff:
+                # Whole chunk is out of the window
+                self._chunks.pop(0)
+                os.remove(path)
+                self._frame = None
+                continue
+            if df["time"].min() < cutoff:
+                kept = df[df["time"] >= cutoff].reset_index(drop=True)
+                self._write(path, kept)
+                self._chunks[0] = (path, kept)
+                self._frame = None
+            break
+
+    def _compact(self):
+        merged = self.frame()
+        for path, _ in self._chunks:
+            os.remove(path)
+        self._chunks = []
+        if not merged.empty:
+            self._append(merged)
+        logger.info(f"History cache compacted into one chunk ({len(merged)} rows)")
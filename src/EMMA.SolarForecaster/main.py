@@ -2,16 +2,31 @@ import os
 import time
 import json
 import logging
-from datetime import datetime, timedelta
-from typing import List
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import repeat
+from multiprocessing import get_context
+from typing import List, Optional
 
-from fastapi import FastAPI, BackgroundTasks
-import psycopg2
+import numpy as np
+
+from fastapi import FastAPI, Header, HTTPException, Query, Response
+from pydantic import BaseModel
 import pandas as pd
-from xgboost import XGBRegressor
-from confluent_kafka import Producer
 import requests
 
+from db import Database
+from forecast_cache import MAX_HORIZON_HOURS, ForecastCache
+from history_cache import HistoryCache
+from kafka_producer import InstrumentedProducer
+from metrics import SamplingProfiler, count_rows, exposition, mark_success, register_stats, timed
+from model_registry import ModelRegistry
+from time_grid import HOUR, hour_of_day, horizon, isoformat, to_epoch_ns
+from training import (build_profile_tasks, build_training_tasks, load_model, predict_groups, predict_yield,
+                      train_groups, train_or_reuse, train_profile, train_profiles)
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("solar-forecaster")
 
@@ -19,138 +34,496 @@ app = FastAPI(title="EMMA Solar Forecaster")
 
 # Configuration from environment variables (injected by Aspire)
 DB_CONNECTION = os.getenv("ConnectionStrings__telemetry-db")
+APP_DB_CONNECTION = os.getenv("ConnectionStrings__app-db")
 KAFKA_BROKERS = os.getenv("ConnectionStrings__messaging")
 KAFKA_TOPIC = "solar-predictions"
+CACHE_DIR = os.getenv("FORECASTER_CACHE_DIR", "./cache")
+HISTORY_WINDOW_DAYS = int(os.getenv("FORECASTER_HISTORY_DAYS", "30"))
+# global: one model for the whole fleet; asset / location / market_zone / tenant_zone: one model per group
+FORECAST_GROUP_BY = os.getenv("FORECAST_GROUP_BY", "global").lower()
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", str(os.cpu_count() or 1)))
+GROUP_BY_MODES = ("global", "asset", "location", "market_zone", "tenant_zone")
+# tenant_zone group ids are "<tenant_id>/<market_zone>"
+TENANT_ZONE_SEPARATOR = "/"
+# aggregate: hour-of-day profiles aggregated in TimescaleDB; raw: every hourly bucket, via the history cache
+FORECAST_FEATURES = os.getenv("FORECAST_FEATURES", "aggregate").lower()
+FEATURE_MODES = ("aggregate", "raw")
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+
+telemetry_db = Database(DB_CONNECTION, name="telemetry-db", maxconn=DB_POOL_SIZE)
+app_db = Database(APP_DB_CONNECTION, name="app-db", maxconn=2)
+history_cache = HistoryCache(os.path.join(CACHE_DIR, "history"), window=timedelta(days=HISTORY_WINDOW_DAYS))
+model_registry = ModelRegistry(os.path.join(CACHE_DIR, "models"))
+GLOBAL_KEY = "global"
+producer = InstrumentedProducer(KAFKA_BROKERS, "solar-forecaster")
+forecast_cache = ForecastCache(model_registry, ttl_seconds=int(os.getenv("FORECAST_CACHE_TTL_SECONDS", "300")))
+# Set by POST /predict to run the scheduled cycle early
+prediction_requested = threading.Event()
+profiler = SamplingProfiler()
+
+# Existing component counters, read at scrape time
+register_stats("emma_kafka_producer", producer.stats, description="Kafka producer",
+               counters={"produced": "produced", "delivered": "delivered", "failed": "failed"},
+               gauges={"queue_depth": "queue_depth"})
+register_stats("emma_history_cache", lambda: {"rows": len(history_cache)}, description="History cache",
+               gauges={"rows": "rows"})
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
-def get_historical_data():
+@app.get("/stats")
+def stats():
+    return {"kafka_producer": producer.stats()}
+
+@app.get("/metrics")
+def metrics():
+    body, content_type = exposition()
+    return Response(content=body, media_type=content_type)
+
+@app.post("/debug/profiler/start")
+def start_profiler(interval_ms: float = 10, duration_seconds: float = 60):
+    if not profiler.start(interval=interval_ms / 1000, duration=duration_seconds):
+        raise HTTPException(status_code=409, detail="Profiler already running")
+    return profiler.status()
+
+@app.post("/debug/profiler/stop")
+def stop_profiler():
+    profiler.stop()
+    return profiler.status()
+
+@app.get("/debug/profiler")
+def get_profile(limit: int = 200):
+    """Collapsed stacks of the current/last profile, ready for flamegraph tools."""
+    return Response(content=profiler.collapsed(limit), media_type="text/plain")
+
+def fetch_history_since(since):
+    query = """
+        SELECT bucket AS time, asset_id, avg_power AS power_kw
+        FROM asset_metrics_hourly
+        WHERE bucket >= %(since)s
+        ORDER BY bucket ASC;
+    """
+    with timed("history_fetch"):
+        df = telemetry_db.read_frame(query, {"since": since})
+    count_rows("history_fetch", len(df))
+    return df
+
+# Mean power per (group, UTC hour of day) over the history window, with the
+# number of hourly buckets behind each mean: what the hour-only model needs,
+# in at most 24 rows per group instead of every bucket
+PROFILE_BY_KEY = """
+    SELECT {key} AS group_key, EXTRACT(HOUR FROM bucket AT TIME ZONE 'UTC')::int AS hour_of_day,
+           AVG(avg_power) AS power_kw, COUNT(*) AS samples, MAX(bucket) AS last_bucket
+    FROM asset_metrics_hourly
+    WHERE bucket > %(since)s AND avg_power IS NOT NULL
+    GROUP BY 1, 2
+"""
+
+# Sites and zones are the sum of their assets for each hour (as in raw mode);
+# the device -> group mapping comes from app-db, so it is passed as arrays
+PROFILE_BY_GROUP = """
+    WITH group_hours AS (
+        SELECT g.group_key, m.bucket, SUM(m.avg_power) AS power_kw
+        FROM asset_metrics_hourly m
+        JOIN unnest(%(asset_ids)s::text[], %(group_keys)s::text[]) AS g (asset_id, group_key) USING (asset_id)
+        WHERE m.bucket > %(since)s AND m.avg_power IS NOT NULL
+        GROUP BY g.group_key, m.bucket
+    )
+    SELECT group_key, EXTRACT(HOUR FROM bucket AT TIME ZONE 'UTC')::int AS hour_of_day,
+           AVG(power_kw) AS power_kw, COUNT(*) AS samples, MAX(bucket) AS last_bucket
+    FROM group_hours
+    GROUP BY 1, 2
+"""
+
+def get_feature_profiles(group_by):
+    """
+    Hour-of-day training profiles per group, aggregated server-side from the
+    asset_metrics_hourly continuous aggregate.
+    Returns a DataFrame[group_key, hour_of_day, power_kw, samples, last_bucket]
+    sorted by group and hour.
+    """
     if not DB_CONNECTION:
         logger.error("DB_CONNECTION not set")
         return pd.DataFrame()
-    
+
+    params = {"since": datetime.now(timezone.utc) - timedelta(days=HISTORY_WINDOW_DAYS)}
+    if group_by in ("global", "asset"):
+        query = PROFILE_BY_KEY.format(key="'global'" if group_by == "global" else "asset_id")
+    else:
+        mapping = get_asset_groups(group_by)
+        if not mapping:
+            return pd.DataFrame()
+        params.update(asset_ids=list(mapping), group_keys=list(mapping.values()))
+        query = PROFILE_BY_GROUP
+
     try:
-        conn = psycopg2.connect(DB_CONNECTION)
-        query = """
-            SELECT time, power_kw 
-            FROM asset_metrics_hourly 
-            WHERE time > NOW() - INTERVAL '30 days'
-            ORDER BY time ASC;
-        """
-        df = pd.read_sql(query, conn)
-        conn.close()
+        with timed("feature_fetch"):
+            df = telemetry_db.read_frame(query, params)
+    except Exception as e:
+        logger.error(f"Error fetching feature profiles: {e}")
+        return pd.DataFrame()
+    count_rows("feature_fetch", len(df))
+    if df.empty:
         return df
+    df["group_key"] = df["group_key"].astype(str)
+    # Sorted here rather than in SQL: task building relies on Python's key order
+    df = df.sort_values(["group_key", "hour_of_day"], ignore_index=True)
+    logger.info(f"Fetched {len(df)} per-{group_by} profile rows summarizing {int(df['samples'].sum())} hourly buckets")
+    return df
+
+def profile_arrays(df):
+    return (df["hour_of_day"].to_numpy(dtype=np.int64), df["power_kw"].to_numpy(dtype=np.float64),
+            df["samples"].to_numpy(dtype=np.int64), to_epoch_ns(df["last_bucket"]))
+
+def get_historical_data():
+    if not DB_CONNECTION:
+        logger.error("DB_CONNECTION not set")
+        return history_cache.frame()
+    
+    try:
+        return history_cache.refresh(fetch_history_since)
     except Exception as e:
         logger.error(f"Error fetching data: {e}")
-        return pd.DataFrame()
+        # Serve the (possibly stale) cached window rather than nothing
+        return history_cache.frame()
 
 def get_weather_forecast():
     # In a real scenario, use Open-Meteo or similar
-    # For now, we return mock weather for the next 48 hours
+    # For now, we return mock weather for the next 48 hours, from the current UTC hour
     logger.info("Fetching weather forecast...")
-    forecast = []
-    for i in range(48):
-        forecast.append({
-            "hour": (datetime.utcnow() + timedelta(hours=i)).hour,
-            "temp": 20 + 5 * i / 48, # Simple mock temp
-            "cloud_cover": 20 if i % 24 > 10 else 80 # Day vs Night simulation
-        })
-    return pd.DataFrame(forecast)
+    times = horizon(HOUR, hours=48)
+    i = np.arange(len(times))
+    return pd.DataFrame({
+        "time": times,
+        "hour": hour_of_day(times),
+        "temp": 20 + 5 * i / 48, # Simple mock temp
+        "cloud_cover": np.where(i % 24 > 10, 20, 80) # Day vs Night simulation
+    })
+
+def get_asset_groups(group_by):
+    """Map asset ids (as stored in telemetry) to their location, market zone or tenant and zone."""
+    if not APP_DB_CONNECTION:
+        logger.error(f"ConnectionStrings__app-db not set, cannot group forecasts by {group_by}")
+        return {}
+
+    rows = app_db.fetch_all("SELECT device_id, latitude, longitude, market_zone, tenant_id FROM devices")
+
+    if group_by == "market_zone":
+        return {device_id: zone for device_id, _, _, zone, _ in rows if zone}
+    if group_by == "tenant_zone":
+        return {device_id: f"{tenant}{TENANT_ZONE_SEPARATOR}{zone}" for device_id, _, _, zone, tenant in rows
+                if tenant and zone}
+    return {device_id: f"{lat:.3f},{lon:.3f}" for device_id, lat, lon, _, _ in rows
+            if lat is not None and lon is not None}
+
+def to_predictions(times_ns, yields):
+    return [
+        {
+            "timestamp": ts,
+            "predicted_yield_kwh": value,
+            "confidence": 0.88
+        }
+        for ts, value in zip(isoformat(times_ns), np.round(yields, 2).tolist())
+    ]
+
+def next_24_hours():
+    """UTC epoch ns of the next 24 hourly slots, from the current hour, and their hours of day."""
+    df_next_24 = get_weather_forecast().head(24)
+    return df_next_24['time'].to_numpy(), df_next_24['hour'].to_numpy()
+
+def run_in_pool(fn, tasks, *args):
+    # spawn: never fork the FastAPI/Kafka threads into the workers
+    with ProcessPoolExecutor(max_workers=min(FORECAST_WORKERS, len(tasks)), mp_context=get_context("spawn")) as pool:
+        for results in pool.map(fn, tasks, *(repeat(arg) for arg in args)):
+            yield from results
 
 def train_and_predict():
     logger.info("Training XGBoost model and generating predictions...")
-    
-    # 1. Fetch historical data
-    df_hist = get_historical_data()
-    if df_hist.empty:
-        logger.warning("No historical data available for training")
-        return []
+    path = model_registry.model_path(GLOBAL_KEY, GLOBAL_KEY)
+    previous = model_registry.entries(GLOBAL_KEY).get(GLOBAL_KEY)
 
-    df_hist['hour'] = pd.to_datetime(df_hist['time']).dt.hour
-    
-    # 2. Train model
-    # Simple features: hour
-    X = df_hist[['hour']]
-    y = df_hist['power_kw']
-    
-    model = XGBRegressor(n_estimators=100, learning_rate=0.1, max_depth=5)
-    model.fit(X, y)
+    if FORECAST_FEATURES == "aggregate":
+        # 1. Fetch the fleet's hour-of-day profile, aggregated by TimescaleDB
+        profiles = get_feature_profiles("global")
+        if profiles.empty:
+            logger.warning("No historical data available for training")
+            return []
+
+        # 2. Train model on the profile (or reuse the registered one)
+        hours, power_kw, samples, last_buckets = profile_arrays(profiles)
+        with timed("model_fit", rows=len(profiles)):
+            model, entry = train_profile(hours, power_kw, samples, last_buckets.max(), path, previous)
+    else:
+        # 1. Fetch historical data
+        df_hist = get_historical_data()
+        if df_hist.empty:
+            logger.warning("No historical data available for training")
+            return []
+
+        # 2. Train model (or reuse / continue the registered one)
+        # Simple features: hour
+        with timed("feature_prep", rows=len(df_hist)):
+            times_ns, power_kw = to_epoch_ns(df_hist['time']), df_hist['power_kw'].to_numpy(dtype=np.float64)
+        with timed("model_fit", rows=len(df_hist)):
+            model, entry = train_or_reuse(times_ns, power_kw, path, previous)
+    if entry != previous:
+        model_registry.update(GLOBAL_KEY, {GLOBAL_KEY: entry})
+    logger.info(f"Global model {entry['mode']} ({entry['trees']} trees, {entry['rows']} rows)")
     
     # 3. Predict for next 24 hours using forecast
-    df_forecast = get_weather_forecast()
-    df_next_24 = df_forecast.head(24).copy()
-    
-    # Prepare features for prediction
-    X_pred = df_next_24[['hour']]
-    df_next_24['predicted_yield_kwh'] = model.predict(X_pred)
-    
-    # Ensure no negative predictions (solar can't be negative)
-    df_next_24['predicted_yield_kwh'] = df_next_24['predicted_yield_kwh'].clip(lower=0)
-    
-    predictions = []
-    now = datetime.utcnow()
-    for i, row in df_next_24.iterrows():
-        pred_time = now + timedelta(hours=i)
-        predictions.append({
-            "timestamp": pred_time.isoformat(),
-            "predicted_yield_kwh": float(round(row['predicted_yield_kwh'], 2)),
-            "confidence": 0.88
-        })
-    
-    return predictions
+    timestamps, pred_hours = next_24_hours()
+    with timed("model_predict", rows=len(pred_hours)):
+        yields = predict_yield(model, pred_hours)
+    return to_predictions(timestamps, yields)
+
+def train_and_predict_grouped(group_by):
+    """
+    Train one model per asset, location or market zone across a process pool.
+    Returns {group: predictions}.
+    """
+    started = time.perf_counter()
+    timestamps, pred_hours = next_24_hours()
+    if FORECAST_FEATURES == "aggregate":
+        profiles = get_feature_profiles(group_by)
+        if profiles.empty:
+            logger.warning("No historical data available for training")
+            return {}
+        tasks = build_profile_tasks(profiles["group_key"].to_numpy(), *profile_arrays(profiles), FORECAST_WORKERS)
+        train, rows, keep = train_profiles, len(profiles), set(profiles["group_key"])
+    else:
+        df_hist = get_historical_data()
+        if df_hist.empty:
+            logger.warning("No historical data available for training")
+            return {}
+
+        if group_by == "asset":
+            groups = df_hist['asset_id'].astype(str)
+        else:
+            groups = df_hist['asset_id'].astype(str).map(get_asset_groups(group_by))
+
+        with timed("feature_prep", rows=len(df_hist)):
+            df = pd.DataFrame({
+                "group": groups,
+                "time": to_epoch_ns(df_hist['time']),
+                "power_kw": df_hist['power_kw'].astype(np.float64)
+            }).dropna(subset=["group"])
+            if group_by != "asset":
+                # A site's (or zone's) yield is the sum of its assets for the hour
+                df = df.groupby(["group", "time"], as_index=False, sort=False)["power_kw"].sum()
+            # Deterministic row order keeps the per-group data fingerprints stable
+            df = df.sort_values(["group", "time"])
+
+            tasks = build_training_tasks(
+                df["group"].to_numpy(), df["time"].to_numpy(), df["power_kw"].to_numpy(), FORECAST_WORKERS)
+        train, rows, keep = train_groups, len(df), set(df["group"].unique())
+    if not tasks:
+        logger.warning(f"Not enough history to train any per-{group_by} model")
+        return {}
+
+    # Each task item gains its model path and previous registry entry
+    previous = model_registry.entries(group_by)
+    tasks = [[(*item, model_registry.model_path(group_by, item[0]), previous.get(item[0])) for item in task]
+             for task in tasks]
+
+    forecasts, entries, modes = {}, {}, {}
+    # Workers fit and predict each group in one go, so both count as the fit
+    with timed("model_fit", rows=rows):
+        for key, yields, entry in run_in_pool(train, tasks, pred_hours):
+            forecasts[key] = to_predictions(timestamps, yields)
+            if entry != previous.get(key):
+                entries[key] = entry
+            modes[entry["mode"]] = modes.get(entry["mode"], 0) + 1
+    if entries:
+        model_registry.update(group_by, entries)
+    model_registry.prune(group_by, keep=keep)
+
+    logger.info(f"Per-{group_by} models: {modes} in {len(tasks)} tasks "
+                f"on {FORECAST_WORKERS} workers in {time.perf_counter() - started:.1f}s")
+    return forecasts
+
+def predict_from_registry(group_by):
+    """
+    Forecast from the registered models without touching the database, so a
+    restarted service has predictions before its first training run.
+    Returns the fleet predictions and, in grouped mode, {group: predictions}.
+    """
+    entries = model_registry.entries(group_by)
+    if not entries:
+        return [], {}
+
+    timestamps, pred_hours = next_24_hours()
+    if group_by == "global":
+        with timed("model_predict", rows=len(pred_hours)):
+            model = load_model(model_registry.model_path(GLOBAL_KEY, GLOBAL_KEY))
+            yields = predict_yield(model, pred_hours)
+        return to_predictions(timestamps, yields), {}
+
+    keys = sorted(entries)
+    per_task = -(-len(keys) // (FORECAST_WORKERS * 4))
+    tasks = [[(key, model_registry.model_path(group_by, key)) for key in keys[i:i + per_task]]
+             for i in range(0, len(keys), per_task)]
+    with timed("model_predict", rows=len(keys) * len(pred_hours)):
+        forecasts = {key: to_predictions(timestamps, yields) for key, yields in run_in_pool(predict_groups, tasks, pred_hours)}
+    return fleet_mean(forecasts, group_by), forecasts
+
+def fleet_mean(forecasts, group_by):
+    """
+    The fleet-wide curve from per-group forecasts, in the global model's
+    units (one asset's yield): each group's curve sums its assets, so the
+    total is divided by the number of assets the groups cover. Groups
+    without a known size count as one asset.
+    """
+    sizes = {} if group_by == "asset" else Counter(get_asset_groups(group_by).values())
+    keys = list(forecasts)
+    totals = np.sum([[p["predicted_yield_kwh"] for p in forecasts[key]] for key in keys], axis=0)
+    assets = sum(max(sizes.get(key, 1), 1) for key in keys)
+    return [dict(p, predicted_yield_kwh=round(float(total) / assets, 2)) for p, total in zip(forecasts[keys[0]], totals)]
+
+def warm_start():
+    try:
+        preds, forecasts = predict_from_registry(FORECAST_GROUP_BY)
+        if preds:
+            logger.info(f"Warm start: forecasting from registered {FORECAST_GROUP_BY} models")
+            publish_forecasts(preds, grouped=forecasts or None)
+        else:
+            logger.info("No registered models yet, waiting for the first training run")
+    except Exception as e:
+        logger.error(f"Warm start from model registry failed: {e}")
 
 def prediction_loop():
+    warm_start()
     while True:
         try:
-            preds = train_and_predict()
-            if preds:
-                publish_to_kafka(preds)
+            if FORECAST_GROUP_BY == "global":
+                preds = train_and_predict()
+                if preds:
+                    publish_forecasts(preds)
+            else:
+                forecasts = train_and_predict_grouped(FORECAST_GROUP_BY)
+                if forecasts:
+                    publish_forecasts(fleet_mean(forecasts, FORECAST_GROUP_BY), grouped=forecasts)
+            mark_success("prediction")
             logger.info("Next prediction in 6 hours...")
-            time.sleep(6 * 3600) # 6 hours
+            prediction_requested.wait(6 * 3600) # 6 hours, or until POST /predict
+            prediction_requested.clear()
         except Exception as e:
             logger.error(f"Error in prediction loop: {e}")
             time.sleep(60)
 
 @app.on_event("startup")
 def startup_event():
-    import threading
+    if FORECAST_GROUP_BY not in GROUP_BY_MODES:
+        raise ValueError(f"FORECAST_GROUP_BY must be one of {GROUP_BY_MODES}, got {FORECAST_GROUP_BY}")
+    if FORECAST_FEATURES not in FEATURE_MODES:
+        raise ValueError(f"FORECAST_FEATURES must be one of {FEATURE_MODES}, got {FORECAST_FEATURES}")
+    if FORECAST_FEATURES == "raw":
+        history_cache.load()
+    forecast_cache.configure(FORECAST_GROUP_BY, resolve_groups=get_asset_groups)
     thread = threading.Thread(target=prediction_loop, daemon=True)
     thread.start()
 
-def publish_to_kafka(predictions):
+@app.on_event("shutdown")
+def shutdown_event():
+    producer.close()
+    telemetry_db.close()
+    app_db.close()
+
+def publish_forecasts(predictions, grouped=None):
+    """Expose a fresh set of forecasts to the API and publish them."""
+    forecast_cache.invalidate()
+    forecast_cache.set_latest(predictions, {"group_by": FORECAST_GROUP_BY, "groups": len(grouped or {})})
+    publish_to_kafka(predictions, grouped=grouped)
+
+def publish_to_kafka(predictions, grouped=None):
+    """
+    Publish the fleet forecast and, in grouped mode, one message per group keyed
+    by the group id. Messages are only queued on the shared producer; delivery
+    is reported asynchronously.
+    """
     if not KAFKA_BROKERS:
         logger.error("KAFKA_BROKERS not set")
         return
     
     try:
-        # Kafka config
-        conf = {
-            'bootstrap.servers': KAFKA_BROKERS,
-            'client.id': 'solar-forecaster'
-        }
-        p = Producer(conf)
-        
-        message = {
-            "source": "solar-forecaster",
-            "predictions": predictions,
-            "metadata": {
-                "model": "XGBoost",
-                "features": ["hour", "weather_mock"]
+        with timed("kafka_publish", rows=1 + len(grouped or {})):
+            message = {
+                "source": "solar-forecaster",
+                "predictions": predictions,
+                "metadata": {
+                    "model": "XGBoost",
+                    "features": ["hour", "weather_mock"]
+                }
             }
-        }
-        
-        p.produce(KAFKA_TOPIC, json.dumps(message).encode('utf-8'))
-        p.flush()
-        logger.info(f"Published {len(predictions)} predictions to Kafka topic: {KAFKA_TOPIC}")
+            if grouped:
+                # The fleet curve is per asset like the global model's; group curves sum their assets
+                message["metadata"].update({"group_by": FORECAST_GROUP_BY, "aggregate": "mean", "groups": len(grouped)})
+
+            producer.produce(KAFKA_TOPIC, json.dumps(message).encode('utf-8'))
+
+            for group, group_predictions in (grouped or {}).items():
+                group_message = {
+                    "source": "solar-forecaster",
+                    "group_by": FORECAST_GROUP_BY,
+                    "group": group,
+                    "predictions": group_predictions,
+                    "metadata": dict(message["metadata"], aggregate="sum")
+                }
+                if FORECAST_GROUP_BY == "tenant_zone":
+                    # The Optimizer plans each tenant's assets in the zone against the zone's prices
+                    tenant_id, _, market_zone = str(group).partition(TENANT_ZONE_SEPARATOR)
+                    group_message.update(tenant_id=tenant_id, market_zone=market_zone)
+                producer.produce(KAFKA_TOPIC, json.dumps(group_message).encode('utf-8'), key=str(group).encode('utf-8'))
+
+        logger.info(f"Queued {len(predictions)} predictions"
+                    f"{f' and {len(grouped)} per-{FORECAST_GROUP_BY} forecasts' if grouped else ''}"
+                    f" to Kafka topic: {KAFKA_TOPIC}")
     except Exception as e:
         logger.error(f"Error publishing to Kafka: {e}")
 
 @app.post("/predict")
-def trigger_prediction(background_tasks: BackgroundTasks):
-    background_tasks.add_task(train_and_predict)
-    return {"message": "Manual prediction task started"}
+def trigger_prediction():
+    # Training only ever runs on the scheduled loop; this just runs it early
+    prediction_requested.set()
+    return {"message": "Prediction cycle requested"}
+
+class ForecastRequest(BaseModel):
+    asset_ids: List[str]
+    horizons: List[int] = list(range(24))
+
+def serve_forecasts(asset_ids, horizons, if_none_match):
+    if not asset_ids:
+        raise HTTPException(status_code=400, detail="asset_ids must not be empty")
+    if any(h < 0 or h >= MAX_HORIZON_HOURS for h in horizons):
+        raise HTTPException(status_code=400, detail=f"horizons must be within 0..{MAX_HORIZON_HOURS - 1}")
+
+    # Revalidation is answered before any inference
+    etag = forecast_cache.etag(sorted(set(asset_ids)), sorted(set(horizons)))
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    etag, payload = forecast_cache.forecast(asset_ids, horizons)
+    return Response(content=json.dumps(payload), media_type="application/json", headers={"ETag": etag})
+
+@app.get("/forecasts")
+def get_forecasts(asset_ids: List[str] = Query(...), horizons: List[int] = Query(list(range(24))),
+                  if_none_match: Optional[str] = Header(None)):
+    return serve_forecasts(asset_ids, horizons, if_none_match)
+
+@app.post("/forecasts")
+def post_forecasts(request: ForecastRequest, if_none_match: Optional[str] = Header(None)):
+    return serve_forecasts(request.asset_ids, request.horizons, if_none_match)
+
+@app.get("/forecasts/latest")
+def get_latest_forecast(if_none_match: Optional[str] = Header(None)):
+    latest = forecast_cache.latest()
+    if latest is None:
+        raise HTTPException(status_code=404, detail="No forecast published yet")
+    etag = f'"{latest["version"]}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=json.dumps(latest), media_type="application/json", headers={"ETag": etag})
 
 if __name__ == "__main__":
     import uvicorn
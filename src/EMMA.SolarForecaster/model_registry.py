@@ -0,0 +1,83 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger("solar-forecaster")
+
+
+class ModelRegistry:
+    """
+    On-disk registry of fitted models, one scope per grouping mode
+    (global / asset / location / market_zone).
+
+    Models are stored by XGBoost itself (`save_model`, written by whichever
+    process trained them) under `<root>/<scope>/`; the registry keeps a
+    manifest per scope with each model's training-data fingerprint, watermark
+    and tree count, so restarts can predict immediately and unchanged data
+    skips retraining.
+    """
+
+    MODEL_EXTENSION = ".ubj"
+
+    def __init__(self, root):
+        self.root = root
+        self._manifests = {}
+        self._lock = threading.Lock()
+
+    def _scope_dir(self, scope):
+        return os.path.join(self.root, scope)
+
+    def _manifest_path(self, scope):
+        return os.path.join(self._scope_dir(scope), "manifest.json")
+
+    def model_path(self, scope, key):
+        # Keys are asset ids or coordinates, hash them into safe file names
+        name = hashlib.sha1(str(key).encode("utf-8")).hexdigest()[:20]
+        return os.path.join(self._scope_dir(scope), name + self.MODEL_EXTENSION)
+
+    def entries(self, scope):
+        with self._lock:
+            if scope not in self._manifests:
+                self._manifests[scope] = self._read_manifest(scope)
+            return dict(self._manifests[scope])
+
+    def _read_manifest(self, scope):
+        path = self._manifest_path(scope)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable model manifest {path}: {e}")
+            return {}
+        # Drop entries whose model file has gone missing
+        return {key: entry for key, entry in manifest.items() if os.path.exists(self.model_path(scope, key))}
+
+    def update(self, scope, entries, replace=False):
+        """Record freshly trained entries and persist the manifest."""
+        with self._lock:
+            manifest = {} if replace else dict(self._manifests.get(scope) or self._read_manifest(scope))
+            manifest.update(entries)
+            os.makedirs(self._scope_dir(scope), exist_ok=True)
+            path = self._manifest_path(scope)
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            os.replace(tmp, path)
+            self._manifests[scope] = manifest
+
+    def prune(self, scope, keep):
+        """Delete models for groups that no longer exist (e.g. decommissioned assets)."""
+        entries = self.entries(scope)
+        stale = [key for key in entries if key not in keep]
+        for key in stale:
+            try:
+                os.remove(self.model_path(scope, key))
+            except OSError:
+                pass
+        if stale:
+            self.update(scope, {key: entries[key] for key in entries if key in keep}, replace=True)
+            logger.info(f"Pruned {len(stale)} stale {scope} models from the registry")
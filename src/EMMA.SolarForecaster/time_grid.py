@@ -0,0 +1,148 @@
+"""
+Fixed UTC time grids.
+
+Times are int64 epoch nanoseconds in UTC throughout: no local time, no DST,
+and aligning series is integer arithmetic on whole arrays. A grid is a
+regular array of slot starts at a resolution (HOUR, QUARTER_HOUR, ...),
+each slot covering [start, start + resolution).
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+NS_PER_SECOND = 10**9
+NS_PER_MINUTE = 60 * NS_PER_SECOND
+NS_PER_HOUR = 60 * NS_PER_MINUTE
+QUARTER_HOUR = 15 * NS_PER_MINUTE
+HOUR = NS_PER_HOUR
+AGGREGATIONS = ("mean", "sum", "last")
+
+
+def now_ns():
+    return time.time_ns()
+
+
+def to_epoch_ns(times):
+    """
+    Timestamps (datetimes, pandas values or ISO 8601 strings, with any UTC
+    offset) as UTC epoch ns. Naive values are taken as UTC.
+    """
+    return pd.to_datetime(times, utc=True).to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+
+def to_datetimes(times_ns):
+    """UTC epoch ns as a tz-aware (UTC) DatetimeIndex."""
+    return pd.to_datetime(np.asarray(times_ns, dtype=np.int64), unit="ns", utc=True)
+
+
+def isoformat(times_ns):
+    """UTC epoch ns as ISO 8601 strings with a +00:00 offset, to the second."""
+    seconds = np.asarray(times_ns, dtype=np.int64).view("datetime64[ns]").astype("datetime64[s]")
+    return np.char.add(np.datetime_as_string(seconds, unit="s"), "+00:00").tolist()
+
+
+def resolution_ns(value):
+    """A resolution ("15min", "1h", a timedelta or minutes as a number) in ns."""
+    if isinstance(value, (int, float)):
+        value = pd.Timedelta(minutes=value)
+    resolution = int(pd.Timedelta(value).value)
+    if resolution <= 0:
+        raise ValueError(f"Resolution must be positive, got {value}")
+    return resolution
+
+
+def floor(times_ns, resolution):
+    return times_ns - times_ns % resolution
+
+
+def ceil(times_ns, resolution):
+    return times_ns + (-times_ns) % resolution
+
+
+def hour_of_day(times_ns):
+    return (np.asarray(times_ns, dtype=np.int64) // NS_PER_HOUR) % 24
+
+
+def grid(start_ns, periods, resolution):
+    """`periods` slot starts from `start_ns` (not rounded) every `resolution`."""
+    return np.int64(start_ns) + np.arange(periods, dtype=np.int64) * np.int64(resolution)
+
+
+def span(start_ns, end_ns, resolution):
+    """The grid of slots covering [start_ns, end_ns), aligned to `resolution`."""
+    start = floor(int(start_ns), resolution)
+    return grid(start, max(0, -(-(int(end_ns) - start) // resolution)), resolution)
+
+
+def horizon(resolution, hours=24, start_ns=None):
+    """The next `hours` of slots, from the one in progress at `start_ns` (now)."""
+    start = now_ns() if start_ns is None else int(start_ns)
+    return span(start, floor(start, resolution) + hours * NS_PER_HOUR, resolution)
+
+
+def infer_resolution(times_ns, default=HOUR):
+    """Smallest step between the ascending `times_ns`, `default` with fewer than two times."""
+    steps = np.diff(np.asarray(times_ns, dtype=np.int64))
+    steps = steps[steps > 0]
+    return int(steps.min()) if len(steps) else default
+
+
+def align(slots_ns, resolution, times_ns, values, how="mean", fill=None, max_gap=None):
+    """
+    A (time, value) series on the regular grid `slots_ns`, in O(n + slots):
+    no sorting, no per-row loop.
+
+    Each observation lands in the slot containing it, and the slot's value
+    is their `how`: "mean" (prices, power), "sum" (energy finer than the
+    grid) or "last" (the latest observation). Slots without observations
+    are NaN, or with fill="hold" keep the latest earlier observation,
+    including one before the grid, for up to `max_gap` ns after it: a
+    stepwise series such as hourly prices on a 15-minute grid.
+    """
+    if how not in AGGREGATIONS:
+        raise ValueError(f"how must be one of {AGGREGATIONS}, got {how}")
+    if fill not in (None, "hold"):
+        raise ValueError(f"fill must be None or 'hold', got {fill}")
+    slots_ns = np.asarray(slots_ns, dtype=np.int64)
+    times_ns = np.asarray(times_ns, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    count = len(slots_ns)
+    out = np.full(count, np.nan)
+    if count == 0:
+        return out
+
+    known = ~np.isnan(values)
+    times_ns, values = times_ns[known], values[known]
+    slot = (times_ns - slots_ns[0]) // resolution
+    inside = (slot >= 0) & (slot < count)
+    index, times, vals = slot[inside], times_ns[inside], values[inside]
+    counts = np.bincount(index, minlength=count)
+    filled = counts > 0
+
+    latest = np.full(count, np.iinfo(np.int64).min)
+    if how == "last" or fill == "hold":
+        np.maximum.at(latest, index, times)
+    if how == "last":
+        newest = times == latest[index]
+        out[index[newest]] = vals[newest]
+    else:
+        totals = np.bincount(index, weights=vals, minlength=count)
+        out[filled] = totals[filled] / counts[filled] if how == "mean" else totals[filled]
+    if fill is None:
+        return out
+
+    # Each empty slot takes the nearest filled slot before it, or the last
+    # observation before the grid
+    source = np.maximum.accumulate(np.where(filled, np.arange(count), -1))
+    held, held_at = out[source], latest[source]
+    before = slot < 0
+    if before.any():
+        seed = np.argmax(np.where(before, times_ns, np.iinfo(np.int64).min))
+        held = np.where(source >= 0, held, values[seed])
+        held_at = np.where(source >= 0, held_at, times_ns[seed])
+    else:
+        held[source < 0] = np.nan
+    if max_gap is not None:
+        held[slots_ns >= held_at + max_gap] = np.nan
+    return np.where(filled, out, held)
@@ -0,0 +1,198 @@
+import os
+import hashlib
+from datetime import datetime, timezone
+
+import numpy as np
+from xgboost import XGBRegressor
+
+from time_grid import hour_of_day
+
+# Kept free of FastAPI/Kafka/DB imports: this module is what spawned
+# training workers import.
+
+MODEL_PARAMS = {"n_estimators": 100, "learning_rate": 0.1, "max_depth": 5}
+MIN_TRAINING_ROWS = 24
+MAX_TASK_ROWS = 500_000
+# Boosting rounds added when continuing a model on new data, and the tree
+# count past which we refit from scratch instead
+INCREMENTAL_ROUNDS = 20
+MAX_TREES = 300
+
+
+def fingerprint(times_ns, power_kw, samples=None):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(times_ns, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(power_kw, dtype=np.float64).tobytes())
+    if samples is not None:
+        digest.update(np.ascontiguousarray(samples, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def fit_model(hours, power_kw, n_jobs=None, n_estimators=None, xgb_model=None, sample_weight=None):
+    params = dict(MODEL_PARAMS)
+    if n_estimators is not None:
+        params["n_estimators"] = n_estimators
+    model = XGBRegressor(n_jobs=n_jobs, **params)
+    model.fit(np.asarray(hours).reshape(-1, 1), power_kw, xgb_model=xgb_model, sample_weight=sample_weight)
+    return model
+
+
+def load_model(path, n_jobs=None):
+    model = XGBRegressor(n_jobs=n_jobs)
+    model.load_model(path)
+    return model
+
+
+def save_model(model, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    root, ext = os.path.splitext(path)
+    tmp = f"{root}.tmp{ext}"  # XGBoost picks the format from the extension
+    model.save_model(tmp)
+    os.replace(tmp, path)
+
+
+def predict_yield(model, hours):
+    # Solar can't be negative
+    return np.clip(model.predict(np.asarray(hours).reshape(-1, 1)), 0, None)
+
+
+def train_or_reuse(times_ns, power_kw, path, previous=None, n_jobs=None):
+    """
+    Fit (or reuse) the model stored at `path` for this training data.
+
+    - same data fingerprint as `previous`: load the stored model as-is
+    - only rows newer than the previous watermark changed: continue boosting
+      the stored model on those rows
+    - otherwise (no model yet, or too many trees): fit from scratch
+
+    Returns (model, registry entry).
+    """
+    fp = fingerprint(times_ns, power_kw)
+    watermark = int(times_ns.max())
+    model, mode = None, "full"
+
+    if previous is not None and os.path.exists(path):
+        if previous["fingerprint"] == fp:
+            return load_model(path, n_jobs=n_jobs), dict(previous, mode="reused")
+
+        new_rows = times_ns > previous["watermark"]
+        if previous["trees"] + INCREMENTAL_ROUNDS <= MAX_TREES:
+            if not new_rows.any():
+                # Only old rows were evicted/revised, the model still applies
+                model, mode = load_model(path, n_jobs=n_jobs), "reused"
+            else:
+                model = fit_model(hour_of_day(times_ns[new_rows]), power_kw[new_rows], n_jobs=n_jobs,
+                                  n_estimators=INCREMENTAL_ROUNDS, xgb_model=load_model(path).get_booster())
+                mode = "incremental"
+
+    if model is None:
+        model = fit_model(hour_of_day(times_ns), power_kw, n_jobs=n_jobs)
+    if mode != "reused":
+        save_model(model, path)
+
+    entry = {
+        "fingerprint": fp,
+        "watermark": watermark,
+        "rows": int(len(times_ns)),
+        "trees": int(model.get_booster().num_boosted_rounds()),
+        "trained_at": datetime.now(timezone.utc).isoformat() if mode != "reused" else previous["trained_at"],
+        "mode": mode,
+    }
+    return model, entry
+
+
+def train_profile(hours, power_kw, samples, watermark, path, previous=None, n_jobs=None):
+    """
+    Fit (or reuse) the model at `path` from an hour-of-day profile: the mean
+    power of each hour and the number of hourly buckets behind it. With the
+    squared error objective, fitting the means weighted by their counts
+    gives the same trees as fitting every bucket, on at most 24 rows, so a
+    changed profile is simply refit in full.
+
+    Returns (model, registry entry), like train_or_reuse.
+    """
+    fp = fingerprint(hours, power_kw, samples)
+    if previous is not None and previous["fingerprint"] == fp and os.path.exists(path):
+        return load_model(path, n_jobs=n_jobs), dict(previous, mode="reused")
+
+    model = fit_model(hours, power_kw, n_jobs=n_jobs, sample_weight=samples)
+    save_model(model, path)
+    entry = {
+        "fingerprint": fp,
+        "watermark": int(watermark),
+        "rows": int(np.sum(samples)),
+        "trees": int(model.get_booster().num_boosted_rounds()),
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+        "mode": "full",
+    }
+    return model, entry
+
+
+def build_training_tasks(keys, times_ns, power_kw, workers, max_rows=MAX_TASK_ROWS):
+    """
+    Split per-group training data into tasks for the pool. `keys` must be
+    sorted so each group is one contiguous slice. Tasks hold whole groups and
+    are capped at `max_rows` (bounding per-worker memory), but are also kept
+    small enough that every worker gets a few of them.
+    """
+    unique_keys, starts = np.unique(keys, return_index=True)
+    ends = np.append(starts[1:], len(keys))
+    target_rows = max(1, min(max_rows, -(-len(keys) // (workers * 4))))
+
+    tasks, current, current_rows = [], [], 0
+    for key, start, end in zip(unique_keys, starts, ends):
+        if end - start < MIN_TRAINING_ROWS:
+            continue
+        current.append((key, times_ns[start:end], power_kw[start:end]))
+        current_rows += end - start
+        if current_rows >= target_rows:
+            tasks.append(current)
+            current, current_rows = [], 0
+    if current:
+        tasks.append(current)
+    return tasks
+
+
+def train_groups(task, pred_hours):
+    """
+    Pool entry point: task items are (key, times_ns, power_kw, model path,
+    previous registry entry). Fits (or reuses) each group's model, writes it
+    to its path and predicts `pred_hours`. Returns [(key, yields, entry)].
+    """
+    results = []
+    for key, times_ns, power_kw, path, previous in task:
+        # One thread per model, the parallelism comes from the process pool
+        model, entry = train_or_reuse(times_ns, power_kw, path, previous, n_jobs=1)
+        results.append((key, predict_yield(model, pred_hours), entry))
+    return results
+
+
+def build_profile_tasks(keys, hours, power_kw, samples, watermarks, workers):
+    """
+    Split per-group hour-of-day profiles (sorted by key) into pool tasks of
+    whole groups, skipping groups with less than MIN_TRAINING_ROWS buckets.
+    """
+    unique_keys, starts = np.unique(keys, return_index=True)
+    ends = np.append(starts[1:], len(keys))
+    groups = [(key, hours[start:end], power_kw[start:end], samples[start:end], int(watermarks[start:end].max()))
+              for key, start, end in zip(unique_keys, starts, ends)
+              if samples[start:end].sum() >= MIN_TRAINING_ROWS]
+    per_task = max(1, -(-len(groups) // (workers * 4)))
+    return [groups[i:i + per_task] for i in range(0, len(groups), per_task)]
+
+
+def train_profiles(task, pred_hours):
+    """
+    Pool entry point: task items are (key, hours, power_kw, samples,
+    watermark, model path, previous registry entry). Returns [(key, yields, entry)].
+    """
+    results = []
+    for key, hours, power_kw, samples, watermark, path, previous in task:
+        model, entry = train_profile(hours, power_kw, samples, watermark, path, previous, n_jobs=1)
+        results.append((key, predict_yield(model, pred_hours), entry))
+    return results
+
+
+def predict_groups(task, pred_hours):
+    """Pool entry point: predict `pred_hours` from stored models, [(key, path)] -> [(key, yields)]."""
+    return [(key, predict_yield(load_model(path, n_jobs=1), pred_hours)) for key, path in task]
@@ -0,0 +1,187 @@
+import json
+import math
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from datetime import timedelta
+
+import numpy as np
+
+from seeding import numpy_rng, uuid_factory
+from sinks import create_sink
+
+PROGRESS_INTERVAL_SECONDS = 5
+
+
+class RateLimiter:
+    """Paces calls to `wait()` to at most `rate` per second (0 = unlimited)."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self.next_at > now:
+            time.sleep(self.next_at - now)
+        else:
+            # Don't accumulate credit while we were behind schedule
+            self.next_at = now
+        self.next_at += self.interval
+
+
+def plan_shards(fleet_size, start_time, end_time, step, workers, time_shards=1):
+    """
+    Split the backfill into (asset_index, chunk_start, n_steps) jobs: assets are
+    split into `workers // time_shards` contiguous groups, the time range into
+    `time_shards` contiguous chunks.
+    """
+    n_steps = int((end_time - start_time) / step) + 1
+    time_shards = max(1, min(time_shards, n_steps))
+    asset_shards = max(1, min(fleet_size, workers // time_shards))
+
+    jobs = []
+    steps_per_chunk = math.ceil(n_steps / time_shards)
+    for asset_index in np.array_split(np.arange(fleet_size), asset_shards):
+        for k in range(time_shards):
+            first = k * steps_per_chunk
+            count = min(steps_per_chunk, n_steps - first)
+            if count > 0:
+                jobs.append((asset_index, start_time + first * step, count))
+    return jobs
+
+
+def _backfill_worker(job_id, asset_index, chunk_start, n_steps, step, options, progress):
+    # Imported here: main imports this module, and workers may be spawned fresh
+    from main import create_fleet, TENANT_ID
+
+    # Same initial fleet in every worker; with a seed, independent reproducible
+    # streams per shard, otherwise fresh ones
+    seed = options["seed"]
+    fleet = create_fleet(options["fleet_size"], options["fleet_path"], options["fleet_seed"])
+    fleet.rng = numpy_rng(seed, job_id + 1)
+    fleet.new_event_id = uuid_factory(seed, "backfill", job_id)
+    limiter = RateLimiter(options["rate"])
+    sink = create_sink(options["sink"], part=job_id)
+
+    last_report = time.monotonic()
+    started = time.monotonic()
+
+    try:
+        current_time = chunk_start
+        for _ in range(n_steps):
+            tick = fleet.tick(current_time, index=asset_index)
+            for telemetry in fleet.payloads(tick, TENANT_ID, current_time):
+                limiter.wait()
+                sink.write(telemetry)
+
+            current_time += step
+            now = time.monotonic()
+            if now - last_report >= PROGRESS_INTERVAL_SECONDS:
+                progress.put((job_id, sink.stats()))
+                last_report = now
+    finally:
+        # Waits for outstanding acknowledgements before disconnecting
+        sink.close()
+
+    elapsed = time.monotonic() - started
+    stats = sink.stats()
+    progress.put((job_id, stats))
+    return dict(stats, job_id=job_id, elapsed=elapsed)
+
+
+def run_backfill(sink, start_time, end_time, step=timedelta(hours=1),
+                 fleet_size=0, fleet_path=None, seed=None, workers=None, time_shards=1, rate=0):
+    """
+    Backfill history from `start_time` to `end_time`. Every worker process builds
+    its own sink from the `sink` spec (see sinks.create_sink): its own MQTT client
+    or Kafka producer, or its own part file. `rate` is the total target
+    messages/sec across all workers (0 = unlimited). With a `seed` the output is
+    reproducible for a given worker/time_shards layout.
+
+    Note: with time_shards > 1 each chunk starts its own energy counters, so
+    energy_total_kwh is only monotonic within a chunk.
+    """
+    from main import create_fleet
+
+    workers = workers or os.cpu_count() or 1
+    # Unseeded runs still share one fleet definition (capacities, starting
+    # energy, synthetic ids) across shards
+    fleet_seed = seed if seed is not None else int(np.random.SeedSequence().entropy)
+    size = len(create_fleet(fleet_size, fleet_path, fleet_seed))
+    jobs = plan_shards(size, start_time, end_time, step, workers, time_shards)
+    total_expected = sum(len(index) * n_steps for index, _, n_steps in jobs)
+
+    options = {
+        "sink": sink,
+        "fleet_size": fleet_size,
+        "fleet_path": fleet_path,
+        "seed": seed,
+        "fleet_seed": fleet_seed,
+        "rate": rate / len(jobs) if rate else 0,
+    }
+
+    print(f"Backfilling {total_expected} messages ({size} assets, {start_time.isoformat()} -> {end_time.isoformat()}) "
+          f"with {len(jobs)} shards on {min(workers, len(jobs))} workers...")
+
+    started = time.monotonic()
+    manager = multiprocessing.Manager()
+    progress = manager.Queue()
+    state = {}
+    last_print = started
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        futures = [
+            pool.submit(_backfill_worker, job_id, index, chunk_start, n_steps, step, options, progress)
+            for job_id, (index, chunk_start, n_steps) in enumerate(jobs)
+        ]
+
+        # Wake up when the workers finish, not at the next progress tick
+        pending = set(futures)
+        while pending:
+            _, pending = wait(pending, timeout=PROGRESS_INTERVAL_SECONDS)
+            while True:
+                try:
+                    job_id, stats = progress.get_nowait()
+                except queue.Empty:
+                    break
+                state[job_id] = stats
+            now = time.monotonic()
+            if not pending or now - last_print < PROGRESS_INTERVAL_SECONDS:
+                continue
+            last_print = now
+            sent = sum(s["sent"] for s in state.values())
+            acked = sum(s["acked"] for s in state.values())
+            elapsed = now - started
+            print(f"Progress: {sent}/{total_expected} sent, {acked} acked "
+                  f"({sent / elapsed if elapsed else 0:.0f} msg/s)")
+        elapsed = time.monotonic() - started
+
+        results = []
+        for f in futures:
+            try:
+                results.append(f.result())
+            except Exception as e:
+                print(f"Backfill worker failed: {e}")
+
+    manager.shutdown()
+
+    sent = sum(r["sent"] for r in results)
+    acked = sum(r["acked"] for r in results)
+    failed = sum(r["failed"] for r in results)
+    report = {
+        "expected": total_expected,
+        "sent": sent,
+        "acked": acked,
+        "failed": failed,
+        "lost": total_expected - acked,
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_msgs_per_sec": round(acked / elapsed, 1) if elapsed else 0.0,
+        "loss_ratio": round((total_expected - acked) / total_expected, 6) if total_expected else 0.0,
+    }
+    print(f"Backfill complete: {json.dumps(report)}")
+    return report
@@ -0,0 +1,165 @@
+import gzip
+import json
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+
+SERIALIZERS = ("json", "orjson", "msgpack")
+COMPRESSIONS = ("none", "gzip", "zlib")
+
+ENVELOPE_VERSION = "2.0"
+GZIP_MAGIC = b"\x1f\x8b"
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def _load_serializer(name):
+    if name == "json":
+        return lambda obj: json.dumps(obj).encode("utf-8"), lambda data: json.loads(data)
+    if name == "orjson":
+        try:
+            import orjson
+        except ImportError:
+            raise RuntimeError("orjson is not installed. Please install it using: pip install orjson")
+        return orjson.dumps, orjson.loads
+    if name == "msgpack":
+        try:
+            import msgpack
+        except ImportError:
+            raise RuntimeError("msgpack is not installed. Please install it using: pip install msgpack")
+        return msgpack.packb, msgpack.unpackb
+    raise ValueError(f"Unknown serializer: {name}")
+
+
+class TelemetryEncoder:
+    """
+    Turns telemetry payloads into wire bytes.
+
+    `encode_reading` keeps the original one-reading-per-message document (the
+    default json serializer produces exactly the bytes of `json.dumps(payload)`).
+    `encode_envelope` packs N readings into one compact message:
+
+        {"envelope": {"version": "2.0", "batch_id": ..., "tenant_id": ..., "count": N},
+         "locations": [{...}, ...],
+         "readings": [{"asset_id": ..., "ts": <epoch µs>, "loc": <index>, "m": {...}}, ...]}
+
+    Per-reading event ids are derived from batch_id + position (see `decode`),
+    locations are interned into one table per envelope, and the debug
+    virtual_time_hour is dropped unless `include_debug` is set.
+
+    Only `decode` reads envelopes and non-JSON / compressed messages:
+    EMMA.Ingestion and the Fluent Bit bridge expect one JSON reading per
+    message, so those formats are for benchmarking, not for the platform.
+    """
+
+    def __init__(self, serializer="json", compression="none", include_debug=False, new_id=None):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        self.serializer = serializer
+        self.compression = compression
+        self.include_debug = include_debug
+        self.new_id = new_id or uuid.uuid4
+        self._dumps, _ = _load_serializer(serializer)
+        self._last_ts = (None, None)
+
+    def _compress(self, data):
+        if self.compression == "gzip":
+            return gzip.compress(data, compresslevel=6)
+        if self.compression == "zlib":
+            return zlib.compress(data, 6)
+        return data
+
+    def _epoch_us(self, ts_str):
+        # Readings from one tick share a timestamp string; parse it once.
+        # Integer microseconds, so the timestamp round-trips exactly
+        if self._last_ts[0] != ts_str:
+            ts = datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
+            self._last_ts = (ts_str, (ts - EPOCH) // MICROSECOND)
+        return self._last_ts[1]
+
+    def encode_reading(self, payload):
+        return self._compress(self._dumps(payload))
+
+    def encode_envelope(self, payloads):
+        locations = []
+        location_ids = {}
+        location_values = {}
+        readings = []
+
+        for payload in payloads:
+            location = payload.get("location")
+            # Generated payloads share one dict per location, so intern by identity
+            # first and only fall back to comparing values (e.g. replayed files)
+            loc = location_ids.get(id(location))
+            if loc is None:
+                value_key = tuple(sorted(location.items())) if location else ()
+                loc = location_values.get(value_key)
+                if loc is None:
+                    loc = len(locations)
+                    location_values[value_key] = loc
+                    locations.append(location)
+                location_ids[id(location)] = loc
+
+            reading = {
+                "asset_id": payload["header"]["asset_id"],
+                "ts": self._epoch_us(payload["timestamp"]),
+                "loc": loc,
+                "m": payload["measurements"],
+            }
+            if self.include_debug and "virtual_time_hour" in payload:
+                reading["vh"] = payload["virtual_time_hour"]
+            readings.append(reading)
+
+        envelope = {
+            "envelope": {
+                "version": ENVELOPE_VERSION,
+                "batch_id": str(self.new_id()),
+                "tenant_id": payloads[0]["header"]["tenant_id"] if payloads else None,
+                "count": len(readings),
+            },
+            "locations": locations,
+            "readings": readings,
+        }
+        return self._compress(self._dumps(envelope))
+
+
+def decode(data):
+    """Decode any message produced by TelemetryEncoder back into single-reading payloads."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if data[:2] == GZIP_MAGIC:
+        data = gzip.decompress(data)
+    elif data[:1] == b"\x78":
+        # zlib header (JSON and msgpack maps never start with 0x78)
+        data = zlib.decompress(data)
+
+    if data[:1] in (b"{", b"["):
+        doc = json.loads(data)
+    else:
+        _, loads = _load_serializer("msgpack")
+        doc = loads(data)
+
+    if "envelope" not in doc:
+        return [doc]
+
+    header = doc["envelope"]
+    batch_id = uuid.UUID(header["batch_id"])
+    locations = doc["locations"]
+    payloads = []
+    for seq, reading in enumerate(doc["readings"]):
+        ts = EPOCH + reading["ts"] * MICROSECOND
+        payload = {
+            "header": {
+                "event_id": str(uuid.uuid5(batch_id, str(seq))),
+                "version": "1.0",
+                "asset_id": reading["asset_id"],
+                "tenant_id": header["tenant_id"]
+            },
+            "location": locations[reading["loc"]],
+            "measurements": reading["m"],
+            "timestamp": ts.isoformat().replace("+00:00", "Z"),
+        }
+        if "vh" in reading:
+            payload["virtual_time_hour"] = reading["vh"]
+        payloads.append(payload)
+    return payloads
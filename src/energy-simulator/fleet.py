@@ -0,0 +1,257 @@
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import uuid
+
+import numpy as np
+
+# Asset type codes used in the column arrays
+INVERTER = 0
+CHARGER = 1
+ASSET_TYPES = ("inverter", "charger")
+
+# Physical constants shared with the per-object model in main.py
+TICK_SECONDS = 10
+PEAK_POWER_KW = 50.0
+CHARGER_POWER_KW = 11.0
+CHARGE_START_PROBABILITY = 0.2
+CHARGE_TICKS_MIN = 3
+CHARGE_TICKS_MAX = 10
+NOISE = 0.02
+
+
+class GeneratedAssetIds:
+    """
+    Sequence of asset ids generated on demand as f"{prefix}-{n:07d}", one
+    contiguous block per prefix, so large fleets don't hold millions of strings.
+    """
+
+    def __init__(self):
+        self._starts = []
+        self._prefixes = []
+        self._first = []
+        self._size = 0
+
+    def add(self, prefix, count, first=0):
+        if count <= 0:
+            return
+        self._starts.append(self._size)
+        self._prefixes.append(prefix)
+        self._first.append(first)
+        self._size += count
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._size
+        if not 0 <= i < self._size:
+            raise IndexError(i)
+        g = bisect_right(self._starts, i) - 1
+        return f"{self._prefixes[g]}-{i - self._starts[g] + self._first[g]:07d}"
+
+    def __iter__(self):
+        for g, prefix in enumerate(self._prefixes):
+            end = self._starts[g + 1] if g + 1 < len(self._starts) else self._size
+            for n in range(self._first[g], self._first[g] + end - self._starts[g]):
+                yield f"{prefix}-{n:07d}"
+
+
+@dataclass
+class FleetTick:
+    """Column-oriented measurements for the assets advanced in one tick."""
+    index: np.ndarray
+    virtual_hour: np.ndarray
+    power_kw: np.ndarray
+    energy_total_kwh: np.ndarray
+    inverter_temp_c: np.ndarray  # NaN for chargers
+
+    def __len__(self):
+        return len(self.index)
+
+
+class FleetEngine:
+    """
+    Vectorized twin of `Asset`: keeps the state of every asset in column arrays
+    and advances the whole fleet (or a subset of it) one tick at a time.
+
+    The random draws follow the same distributions as `Asset.generate_telemetry`,
+    so a fleet run is statistically equivalent to N independent Asset objects.
+    """
+
+    def __init__(self, asset_ids, asset_types, location_idx, locations, energy_total_kwh=None,
+                 capacity_kw=None, rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        # Event id generator; swapped for a seeded one in reproducible runs
+        self.new_event_id = uuid.uuid4
+        n = len(asset_ids)
+
+        # Any sequence works (e.g. GeneratedAssetIds); plain iterables become a list
+        self.asset_ids = asset_ids if hasattr(asset_ids, "__getitem__") else list(asset_ids)
+        if isinstance(asset_types, np.ndarray) and asset_types.dtype.kind in "iu":
+            self.asset_type = asset_types.astype(np.int8, copy=False)
+        else:
+            self.asset_type = np.array([ASSET_TYPES.index(t) for t in asset_types], dtype=np.int8)
+        # Shared location table: each asset only stores an index into it
+        self.location_idx = np.asarray(location_idx, dtype=np.int32)
+        self.locations = list(locations)
+
+        if energy_total_kwh is None:
+            energy_total_kwh = self.rng.uniform(100, 5000, n)
+        self.energy_total_kwh = np.asarray(energy_total_kwh, dtype=np.float64).copy()
+
+        # Peak inverter output / charger power, per asset
+        if capacity_kw is None:
+            capacity_kw = np.where(self.asset_type == INVERTER, PEAK_POWER_KW, CHARGER_POWER_KW)
+        self.capacity_kw = np.asarray(capacity_kw, dtype=np.float64)
+
+        # Virtual State
+        self.virtual_hour = np.full(n, 6.0)  # Start at 06:00
+        self.is_charging = np.zeros(n, dtype=bool)
+        self.charging_ticks_remaining = np.zeros(n, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.asset_ids)
+
+    @classmethod
+    def from_assets(cls, assets, rng=None):
+        # Build a fleet from existing Asset objects, sharing identical location dicts
+        locations = []
+        location_idx = []
+        for asset in assets:
+            for i, location in enumerate(locations):
+                if location is asset.location:
+                    location_idx.append(i)
+                    break
+            else:
+                locations.append(asset.location)
+                location_idx.append(len(locations) - 1)
+
+        fleet = cls(
+            [a.asset_id for a in assets],
+            [a.asset_type for a in assets],
+            location_idx,
+            locations,
+            energy_total_kwh=[a.energy_total_kwh for a in assets],
+            rng=rng,
+        )
+        fleet.virtual_hour[:] = [a.virtual_hour for a in assets]
+        fleet.is_charging[:] = [a.is_charging for a in assets]
+        fleet.charging_ticks_remaining[:] = [a.charging_ticks_remaining for a in assets]
+        return fleet
+
+    @classmethod
+    def synthetic(cls, size, locations, inverter_share=0.6, rng=None):
+        # Spread `size` assets round-robin across the given {name: location} table
+        names = list(locations)
+        location_idx = np.arange(size) % len(names)
+        n_inverters = int(round(size * inverter_share))
+
+        asset_ids = []
+        asset_types = []
+        for i in range(size):
+            code = names[location_idx[i]][:3].upper()
+            if i < n_inverters:
+                asset_ids.append(f"INV-SIM-{code}-{i:07d}")
+                asset_types.append("inverter")
+            else:
+                asset_ids.append(f"EV-SIM-{code}-{i:07d}")
+                asset_types.append("charger")
+
+        return cls(asset_ids, asset_types, location_idx, [locations[n] for n in names], rng=rng)
+
+    def tick(self, timestamp_override=None, index=None, dt_seconds=TICK_SECONDS):
+        """
+        Advance the selected assets (all of them when `index` is None) by one tick
+        and return their noisy measurements as a FleetTick. `dt_seconds` (scalar or
+        one value per selected asset) is the physical time the tick represents.
+        """
+        sel = slice(None) if index is None else np.asarray(index, dtype=np.intp)
+        rng = self.rng
+
+        if timestamp_override is not None:
+            # Historical Mode: virtual hour follows the hour of the timestamp
+            self.virtual_hour[sel] = timestamp_override.hour + (timestamp_override.minute / 60.0)
+        else:
+            # Real-time Mode: fast forward 0.5 virtual hours per tick
+            self.virtual_hour[sel] = (self.virtual_hour[sel] + 0.5) % 24
+
+        hour = self.virtual_hour[sel]
+        n = len(hour)
+        inverter = self.asset_type[sel] == INVERTER
+        charger = ~inverter
+
+        # Inverters: solar curve between 06:00 and 20:00 with a 0.8-1.0 cloud factor
+        daylight = inverter & (hour >= 6) & (hour <= 20)
+        cloud_factor = rng.uniform(0.8, 1.0, n)
+        capacity_kw = self.capacity_kw[sel]
+        solar_kw = capacity_kw * np.sin((hour - 6) / (20 - 6) * np.pi) * cloud_factor
+        power_kw = np.where(daylight, np.maximum(solar_kw, 0.0), 0.0)
+
+        # Chargers: same state machine as Asset, evaluated for all chargers at once
+        charging = self.is_charging[sel]
+        ticks = self.charging_ticks_remaining[sel]
+        was_charging = charger & charging
+        ticks = np.where(was_charging, ticks - 1, ticks)
+        stopped = was_charging & (ticks <= 0)
+        started = charger & ~charging & (rng.random(n) < CHARGE_START_PROBABILITY)
+        ticks = np.where(started, rng.integers(CHARGE_TICKS_MIN, CHARGE_TICKS_MAX + 1, n), ticks)
+        charging = (charging & ~stopped) | started
+        self.is_charging[sel] = charging
+        self.charging_ticks_remaining[sel] = ticks
+        power_kw = np.where(charger & charging, capacity_kw, power_kw)
+
+        # Energy accumulates on physical time (10s per tick by default), not virtual time
+        energy_total_kwh = self.energy_total_kwh[sel] + power_kw * (np.asarray(dt_seconds) / 3600)
+        self.energy_total_kwh[sel] = energy_total_kwh
+
+        # Inverter temp follows power + random
+        temp_c = np.where(inverter, 25.0 + power_kw / 2.0 + rng.uniform(-2, 2, n), np.nan)
+
+        # Apply random noise (+/- 2%) to every reported measurement
+        noise = rng.uniform(-NOISE, NOISE, (3, n)) + 1
+        return FleetTick(
+            index=np.arange(len(self)) if index is None else sel,
+            virtual_hour=hour,
+            power_kw=power_kw * noise[0],
+            energy_total_kwh=energy_total_kwh * noise[1],
+            inverter_temp_c=temp_c * noise[2],
+        )
+
+    def payloads(self, tick, tenant_id, timestamp_override=None):
+        """Yield one telemetry dict per asset in `tick`, in the same shape as Asset.generate_telemetry."""
+        if timestamp_override is not None:
+            ts = timestamp_override
+        else:
+            ts = datetime.now(timezone.utc)
+        ts_str = ts.isoformat().replace("+00:00", "Z")
+
+        types = self.asset_type[tick.index]
+        loc_idx = self.location_idx[tick.index]
+        hours = np.round(tick.virtual_hour, 2).tolist()
+        power = tick.power_kw.tolist()
+        energy = tick.energy_total_kwh.tolist()
+        temp = tick.inverter_temp_c.tolist()
+
+        for j, i in enumerate(tick.index.tolist()):
+            measurements = {
+                "power_kw": power[j],
+                "energy_total_kwh": energy[j],
+            }
+            if types[j] == INVERTER:
+                measurements["inverter_temp_c"] = temp[j]
+
+            yield {
+                "header": {
+                    "event_id": str(self.new_event_id()),
+                    "version": "1.0",
+                    "asset_id": self.asset_ids[i],
+                    "tenant_id": tenant_id
+                },
+                "location": self.locations[loc_idx[j]],
+                "measurements": measurements,
+                "timestamp": ts_str,
+                # debug field to see virtual time
+                "virtual_time_hour": hours[j]
+            }
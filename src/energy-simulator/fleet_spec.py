@@ -0,0 +1,193 @@
+import csv
+import json
+
+import numpy as np
+
+from fleet import ASSET_TYPES, CHARGER_POWER_KW, INVERTER, PEAK_POWER_KW, FleetEngine, GeneratedAssetIds
+
+# Keys copied from a location definition into every payload's "location"
+LOCATION_KEYS = ("latitude", "longitude", "market_zone", "country_code")
+TYPE_PREFIXES = {"inverter": "INV", "charger": "EV"}
+
+
+def _sample(spec, n, rng, default):
+    """
+    Draw `n` values from a distribution spec:
+      42                                             -> constant
+      {"distribution": "uniform", "low": a, "high": b}
+      {"distribution": "normal", "mean": m, "std": s, "min": lo, "max": hi}
+      {"distribution": "lognormal", "mean": m, "sigma": s}
+      {"distribution": "choice", "values": [...], "weights": [...]}
+    """
+    if spec is None:
+        return np.full(n, float(default))
+    if isinstance(spec, (int, float)):
+        return np.full(n, float(spec))
+
+    kind = spec.get("distribution", "constant")
+    if kind == "constant":
+        values = np.full(n, float(spec.get("value", default)))
+    elif kind == "uniform":
+        values = rng.uniform(spec["low"], spec["high"], n)
+    elif kind == "normal":
+        values = rng.normal(spec["mean"], spec["std"], n)
+    elif kind == "lognormal":
+        values = rng.lognormal(spec["mean"], spec["sigma"], n)
+    elif kind == "choice":
+        weights = spec.get("weights")
+        if weights is not None:
+            weights = np.asarray(weights, dtype=np.float64)
+            weights = weights / weights.sum()
+        values = rng.choice(np.asarray(spec["values"], dtype=np.float64), n, p=weights)
+    else:
+        raise ValueError(f"Unknown distribution: {kind}")
+
+    if "min" in spec or "max" in spec:
+        values = np.clip(values, spec.get("min", -np.inf), spec.get("max", np.inf))
+    return values
+
+
+def _location_code(name):
+    return name[:3].upper()
+
+
+def fleet_from_spec(spec, rng=None):
+    """
+    Build a FleetEngine from a declarative spec, e.g. (YAML):
+
+        locations:
+          madrid: {latitude: 40.4168, longitude: -3.7038, market_zone: "BZN|ES", country_code: ES}
+          lyon:   {latitude: 45.7640, longitude: 4.8357, market_zone: "BZN|FR", country_code: FR}
+        groups:
+          - type: inverter
+            market_zone: "BZN|ES"        # or `locations: [madrid]`; default all locations
+            count_per_location: 5000     # or `count`, spread evenly over the locations
+            capacity_kw: {distribution: normal, mean: 50, std: 10, min: 5}
+          - type: charger
+            count: 2000
+            capacity_kw: {distribution: choice, values: [7.4, 11, 22], weights: [0.3, 0.5, 0.2]}
+
+    Assets get ids like INV-ES-MAD-0000042 (override the part before the location
+    with `prefix`). Ids are generated on demand rather than stored.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+
+    location_names = list(spec["locations"])
+    locations = [{k: spec["locations"][name].get(k) for k in LOCATION_KEYS} for name in location_names]
+    location_index = {name: i for i, name in enumerate(location_names)}
+
+    asset_ids = GeneratedAssetIds()
+    next_number = {}
+    types, location_idx, capacity, energy = [], [], [], []
+
+    for group in spec["groups"]:
+        asset_type = group["type"]
+        if asset_type not in ASSET_TYPES:
+            raise ValueError(f"Unknown asset type: {asset_type}")
+
+        if "locations" in group:
+            selected = [location_index[name] for name in group["locations"]]
+        elif "market_zone" in group:
+            selected = [i for i, loc in enumerate(locations) if loc["market_zone"] == group["market_zone"]]
+        else:
+            selected = list(range(len(locations)))
+        if not selected:
+            raise ValueError(f"Group {group} matches no locations")
+
+        if "count_per_location" in group:
+            counts = [int(group["count_per_location"])] * len(selected)
+        else:
+            total = int(group["count"])
+            counts = [total // len(selected) + (1 if k < total % len(selected) else 0) for k in range(len(selected))]
+
+        default_capacity = PEAK_POWER_KW if asset_type == "inverter" else CHARGER_POWER_KW
+        for loc, count in zip(selected, counts):
+            if count <= 0:
+                continue
+            country = locations[loc]["country_code"] or "XX"
+            prefix = f"{group.get('prefix', f'{TYPE_PREFIXES[asset_type]}-{country}')}-{_location_code(location_names[loc])}"
+            asset_ids.add(prefix, count, first=next_number.get(prefix, 0))
+            next_number[prefix] = next_number.get(prefix, 0) + count
+
+            types.append(np.full(count, ASSET_TYPES.index(asset_type), dtype=np.int8))
+            location_idx.append(np.full(count, loc, dtype=np.int32))
+            capacity.append(_sample(group.get("capacity_kw"), count, rng, default_capacity))
+            energy.append(_sample(group.get("energy_total_kwh"), count, rng, 0.0)
+                          if "energy_total_kwh" in group else rng.uniform(100, 5000, count))
+
+    if not types:
+        raise ValueError("Fleet spec defines no assets")
+
+    return FleetEngine(
+        asset_ids,
+        np.concatenate(types),
+        np.concatenate(location_idx),
+        locations,
+        energy_total_kwh=np.concatenate(energy),
+        capacity_kw=np.concatenate(capacity),
+        rng=rng,
+    )
+
+
+def fleet_from_rows(rows, rng=None):
+    """
+    Build a FleetEngine from explicit asset rows with columns asset_id, asset_type,
+    latitude, longitude, market_zone, country_code and optional capacity_kw.
+    Identical locations are interned into one shared table.
+    """
+    asset_ids, types, location_idx, capacity = [], [], [], []
+    locations = []
+    location_index = {}
+
+    for row in rows:
+        asset_type = row["asset_type"]
+        key = (float(row["latitude"]), float(row["longitude"]), row["market_zone"], row["country_code"])
+        loc = location_index.get(key)
+        if loc is None:
+            loc = len(locations)
+            location_index[key] = loc
+            locations.append(dict(zip(LOCATION_KEYS, key)))
+
+        asset_ids.append(row["asset_id"])
+        types.append(ASSET_TYPES.index(asset_type))
+        location_idx.append(loc)
+        value = row.get("capacity_kw")
+        if value in (None, ""):
+            value = PEAK_POWER_KW if asset_type == "inverter" else CHARGER_POWER_KW
+        capacity.append(float(value))
+
+    types = np.asarray(types, dtype=np.int8)
+    return FleetEngine(asset_ids, types, location_idx, locations, capacity_kw=capacity, rng=rng)
+
+
+def load_fleet(path, rng=None):
+    """Load a fleet from a YAML/JSON spec or a CSV/Parquet asset list."""
+    lower = path.lower()
+    if lower.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise RuntimeError("PyYAML is not installed. Please install it using: pip install pyyaml")
+        with open(path, encoding="utf-8") as f:
+            return fleet_from_spec(yaml.safe_load(f), rng=rng)
+    if lower.endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            return fleet_from_spec(json.load(f), rng=rng)
+    if lower.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            return fleet_from_rows(csv.DictReader(f), rng=rng)
+    if lower.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("pyarrow is not installed. Please install it using: pip install pyarrow")
+        table = pq.read_table(path)
+        return fleet_from_rows(table.to_pylist(), rng=rng)
+    raise ValueError(f"Unsupported fleet file: {path}")
+
+
+def fleet_summary(fleet):
+    counts = np.bincount(fleet.asset_type, minlength=len(ASSET_TYPES))
+    inverter_kw = fleet.capacity_kw[fleet.asset_type == INVERTER].sum()
+    return (f"{len(fleet)} assets ({counts[0]} inverters, {counts[1]} chargers) across "
+            f"{len(fleet.locations)} locations, {inverter_kw / 1000:.1f} MW solar capacity")
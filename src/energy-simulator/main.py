@@ -1,32 +1,35 @@
 import os
-import sys
-import json
 import time
 import math
 import random
 import uuid
 from datetime import datetime, timezone, timedelta
 import argparse
+import asyncio
 
-try:
-    import paho.mqtt.client as mqtt
-except ImportError:
-    print("Error: paho-mqtt is not installed.")
-    print("Please install it using: pip install paho-mqtt")
-    sys.exit(1)
+from fleet import TICK_SECONDS, FleetEngine
+from fleet_spec import fleet_summary, load_fleet
+from backfill import run_backfill
+from scheduler import LiveScheduler, build_intervals
+from seeding import SEED_EPOCH, numpy_rng, parse_time, uuid_factory
+from sinks import create_sink, read_payloads, TELEMETRY_TOPIC
 
 # Configuration
 DEFAULT_BROKER_URL = "localhost"
 DEFAULT_BROKER_PORT = 1883
-TOPIC = "telemetry-raw"
+TOPIC = TELEMETRY_TOPIC
 TENANT_ID = os.getenv("TENANT_ID", "DEFAULT_TENANT")
 
 class Asset:
-    def __init__(self, asset_id, asset_type, location):
+    # Compact per-asset state: no per-instance __dict__, location is a shared reference
+    __slots__ = ("asset_id", "asset_type", "location", "energy_total_kwh",
+                 "virtual_hour", "is_charging", "charging_ticks_remaining")
+
+    def __init__(self, asset_id, asset_type, location, rng=random):
         self.asset_id = asset_id
         self.asset_type = asset_type # 'inverter' or 'charger'
         self.location = location
-        self.energy_total_kwh = random.uniform(100, 5000)
+        self.energy_total_kwh = rng.uniform(100, 5000)
         
         # Virtual State
         self.virtual_hour = 6.0 # Start at 06:00
@@ -128,95 +131,257 @@ class Asset:
             
         return measurements
 
-def run_simulation(broker_url, broker_port, mode):
-    # Define Locations
-    locations = {
-        "madrid":  {"latitude": 40.4168, "longitude": -3.7038, "market_zone": "BZN|ES", "country_code": "ES"},
-        "malaga":  {"latitude": 36.7213, "longitude": -4.4214, "market_zone": "BZN|ES", "country_code": "ES"},
-        "granada": {"latitude": 37.1773, "longitude": -3.5986, "market_zone": "BZN|ES", "country_code": "ES"},
-        "sevilla": {"latitude": 37.3891, "longitude": -5.9845, "market_zone": "BZN|ES", "country_code": "ES"},
-        "albacete": {"latitude": 38.9943, "longitude": -1.8585, "market_zone": "BZN|ES", "country_code": "ES"}
-    }
+# Define Locations
+LOCATIONS = {
+    "madrid":  {"latitude": 40.4168, "longitude": -3.7038, "market_zone": "BZN|ES", "country_code": "ES"},
+    "malaga":  {"latitude": 36.7213, "longitude": -4.4214, "market_zone": "BZN|ES", "country_code": "ES"},
+    "granada": {"latitude": 37.1773, "longitude": -3.5986, "market_zone": "BZN|ES", "country_code": "ES"},
+    "sevilla": {"latitude": 37.3891, "longitude": -5.9845, "market_zone": "BZN|ES", "country_code": "ES"},
+    "albacete": {"latitude": 38.9943, "longitude": -1.8585, "market_zone": "BZN|ES", "country_code": "ES"}
+}
 
-    # Create Assets spread across locations
+def create_demo_assets(rng=random):
+    # Create Assets spread across locations; `rng` draws their initial state
+    locations = LOCATIONS
     assets = []
     
     # Madrid (Keep existing)
-    assets.append(Asset("INV-ES-MAD-001", "inverter", locations["madrid"]))
-    assets.append(Asset("EV-ES-MAD-002", "charger", locations["madrid"]))
+    assets.append(Asset("INV-ES-MAD-001", "inverter", locations["madrid"], rng))
+    assets.append(Asset("EV-ES-MAD-002", "charger", locations["madrid"], rng))
     
     # Malaga
-    assets.append(Asset("INV-ES-MAL-001", "inverter", locations["malaga"]))
-    assets.append(Asset("EV-ES-MAL-002", "charger", locations["malaga"]))
+    assets.append(Asset("INV-ES-MAL-001", "inverter", locations["malaga"], rng))
+    assets.append(Asset("EV-ES-MAL-002", "charger", locations["malaga"], rng))
     
     # Granada
-    assets.append(Asset("INV-ES-GRA-001", "inverter", locations["granada"]))
+    assets.append(Asset("INV-ES-GRA-001", "inverter", locations["granada"], rng))
     
     # Sevilla
-    assets.append(Asset("INV-ES-SEV-001", "inverter", locations["sevilla"]))
-    assets.append(Asset("EV-ES-SEV-001", "charger", locations["sevilla"]))
+    assets.append(Asset("INV-ES-SEV-001", "inverter", locations["sevilla"], rng))
+    assets.append(Asset("EV-ES-SEV-001", "charger", locations["sevilla"], rng))
     
     # Albacete
-    assets.append(Asset("INV-ES-ALB-001", "inverter", locations["albacete"]))
+    assets.append(Asset("INV-ES-ALB-001", "inverter", locations["albacete"], rng))
+    return assets
 
-    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, f"energy_simulator_{uuid.uuid4()}")
-    
+def create_fleet(fleet_size=0, fleet_path=None, seed=None):
+    # Fleet file (YAML/JSON spec, CSV/Parquet asset list), synthetic fleet of
+    # `fleet_size` assets, or the demo fleet. A seed makes initial state,
+    # telemetry values and event ids reproducible.
+    rng = numpy_rng(seed)
+    if fleet_path:
+        fleet = load_fleet(fleet_path, rng=rng)
+    elif fleet_size > 0:
+        fleet = FleetEngine.synthetic(fleet_size, LOCATIONS, rng=rng)
+    else:
+        # A local generator: seeding must not reset the process-wide `random`
+        fleet = FleetEngine.from_assets(create_demo_assets(random.Random(seed)), rng=rng)
+    fleet.new_event_id = uuid_factory(seed)
+    return fleet
+
+def create_telemetry_source(engine="object", fleet_size=0, fleet_path=None, seed=None, clock_start=None):
+    """
+    Returns `(generate, fleet_size)` where `generate() -> list[dict]` produces one
+    telemetry payload per asset for the current live tick.
+
+    - engine="object": one Asset instance per asset (original model)
+    - engine="fleet": vectorized FleetEngine; `fleet_size` > 0 builds a synthetic fleet,
+      `fleet_path` loads one from a file (and implies the fleet engine)
+
+    A `seed` or `clock_start` switches to the fleet engine on a virtual clock:
+    tick n is stamped clock_start + n * 10s instead of the wall clock.
+    """
+    if engine == "fleet" or fleet_path or seed is not None or clock_start is not None:
+        fleet = create_fleet(fleet_size, fleet_path, seed)
+        print(f"Fleet: {fleet_summary(fleet)}")
+        ticks = 0
+
+        def generate():
+            nonlocal ticks
+            timestamp = None
+            if clock_start is not None:
+                timestamp = clock_start + timedelta(seconds=ticks * TICK_SECONDS)
+            ticks += 1
+            tick = fleet.tick()
+            return list(fleet.payloads(tick, TENANT_ID, timestamp))
+        return generate, len(fleet)
+
+    assets = create_demo_assets()
+
+    def generate():
+        return [asset.generate_telemetry() for asset in assets]
+    return generate, len(assets)
+
+def run_replay(sink_spec, input_path, speed=0, restamp=False):
+    """
+    Push a recorded JSONL/Parquet stream through a sink.
+
+    speed=0 replays as fast as the sink accepts; speed=N paces the stream at N x
+    its recorded rate using the recorded timestamps. restamp=True shifts the
+    stream so it starts now and derives fresh (deterministic) event ids, so the
+    ingestion dedup doesn't drop a second run of the same recording.
+    """
+    print(f"Replaying {input_path}" + (f" at {speed}x" if speed else "") + "...")
+    started = time.monotonic()
     try:
-        print(f"Connecting to MQTT broker at {broker_url}:{broker_port}...")
-        client.connect(broker_url, broker_port)
+        sink = create_sink(sink_spec)
+    except Exception as e:
+        print(f"Failed to open sink: {e}")
+        return
+
+    first_ts = None
+    shift = None
+    run_tag = None
+    with sink:
+        for telemetry in read_payloads(input_path):
+            if speed or restamp:
+                ts = parse_time(telemetry["timestamp"])
+                if first_ts is None:
+                    first_ts = ts
+                    shift = datetime.now(timezone.utc) - ts
+                    run_tag = str(int(shift.total_seconds()))
+                if speed:
+                    due = (ts - first_ts).total_seconds() / speed
+                    delay = due - (time.monotonic() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+                if restamp:
+                    header = dict(telemetry["header"])
+                    header["event_id"] = str(uuid.uuid5(uuid.UUID(header["event_id"]), run_tag))
+                    telemetry = dict(telemetry, header=header,
+                                     timestamp=(ts + shift).isoformat().replace("+00:00", "Z"))
+            sink.write(telemetry)
+    elapsed = time.monotonic() - started
+    stats = sink.stats()
+    print(f"Replay complete: {stats['sent']} messages in {elapsed:.1f}s ({stats['sent'] / elapsed if elapsed else 0:.0f} msg/s), {stats['failed']} failed.")
+
+def run_live_async(sink_spec, fleet_size=0, live=None, fleet_path=None, seed=None, clock_start=None):
+    # asyncio live mode: per-asset intervals on a heap scheduler, smooth pacing, sampled logs
+    live = dict(live or {})
+    fleet = create_fleet(fleet_size, fleet_path, seed)
+    print(f"Fleet: {fleet_summary(fleet)}")
+    intervals = build_intervals(fleet, live.pop("default_interval", 10), live.pop("intervals", None))
+
+    try:
+        print(f"Opening {sink_spec.get('kind', 'mqtt')} sink...")
+        sink = create_sink(sink_spec)
     except Exception as e:
         print(f"Failed to connect: {e}")
         return
 
+    print(f"Starting async real-time simulation of {len(fleet)} assets. Press Ctrl+C to stop.")
+    scheduler = LiveScheduler(fleet, sink, TENANT_ID, intervals, rng=numpy_rng(seed, 1), clock_start=clock_start, **live)
+    try:
+        asyncio.run(scheduler.run())
+    except KeyboardInterrupt:
+        print("\nSimulation stopped.")
+    finally:
+        sink.close()
+
+def run_simulation(sink_spec, mode, engine="object", fleet_size=0, backfill=None, input_path=None, scheduler="loop", live=None,
+                   fleet_path=None, seed=None, start_time=None, replay=None):
+    """
+    `seed` makes telemetry values, event ids and timestamps reproducible: live
+    modes run on a virtual clock starting at `start_time` (default SEED_EPOCH),
+    and history starts at `start_time` instead of "now - days".
+    """
+    if seed is not None and start_time is None:
+        start_time = SEED_EPOCH
+
+    if mode == "replay":
+        run_replay(sink_spec, input_path, **(replay or {}))
+        return
+
     if mode == "history":
-        print("Generating historical data for the last 30 days...")
-        # Generate 30 days of data, 1 hour step
-        end_time = datetime.now(timezone.utc)
-        start_time = end_time - timedelta(days=30)
-        
-        current_time = start_time
-        total_messages = 0
-        
-        while current_time <= end_time:
-            for asset in assets:
-                telemetry = asset.generate_telemetry(timestamp_override=current_time)
-                client.publish(TOPIC, json.dumps(telemetry))
-                total_messages += 1
-            
-            # Step 1 hour
-            current_time += timedelta(hours=1)
-            
-            if total_messages % 100 == 0:
-                print(f"Generated data up to {current_time.isoformat()}... ({total_messages} msgs)")
-                
-        print(f"Historical data generation complete. Sent {total_messages} messages.")
-        client.disconnect()
+        # History always runs on the fleet engine, sharded across worker processes
+        backfill = dict(backfill or {})
+        days = backfill.pop("days", 30)
+        if start_time is not None:
+            end_time = start_time + timedelta(days=days)
+            print(f"Generating {days} days of historical data from {start_time.isoformat()}...")
+        else:
+            end_time = datetime.now(timezone.utc)
+            start_time = end_time - timedelta(days=days)
+            print(f"Generating historical data for the last {days} days...")
+        run_backfill(sink_spec, start_time, end_time, fleet_size=fleet_size, fleet_path=fleet_path, seed=seed, **backfill)
+        return
+
+    if scheduler == "async":
+        run_live_async(sink_spec, fleet_size, live, fleet_path=fleet_path, seed=seed, clock_start=start_time)
+        return
+
+    generate, size = create_telemetry_source(engine, fleet_size, fleet_path, seed=seed, clock_start=start_time)
+    # Per-message logging only makes sense for small fleets
+    verbose = size <= 100
+
+    try:
+        print(f"Opening {sink_spec.get('kind', 'mqtt')} sink...")
+        sink = create_sink(sink_spec)
+    except Exception as e:
+        print(f"Failed to connect: {e}")
         return
 
     # Real-time Simulation Mode
     print("Starting real-time simulation. Press Ctrl+C to stop.")
-    client.loop_start()
     
     try:
         while True:
-            for asset in assets:
-                telemetry = asset.generate_telemetry()
-                client.publish(TOPIC, json.dumps(telemetry))
-                print(f"[{datetime.now().time()}] Sent {asset.asset_id}: {telemetry['measurements']['power_kw']:.2f}kW")
+            batch = generate()
+            for telemetry in batch:
+                sink.write(telemetry)
+                if verbose:
+                    print(f"[{datetime.now().time()}] Sent {telemetry['header']['asset_id']}: {telemetry['measurements']['power_kw']:.2f}kW")
+            if not verbose:
+                print(f"[{datetime.now().time()}] Sent {len(batch)} messages")
+            sink.flush(timeout=0)
 
             time.sleep(10)
             
     except KeyboardInterrupt:
         print("\nSimulation stopped.")
     finally:
-        client.loop_stop()
-        client.disconnect()
+        sink.close()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Energy Asset Digital Twin Simulator")
     parser.add_argument("--url", type=str, help="MQTT Broker URL", default=os.getenv("MQTT_BROKER_URL", DEFAULT_BROKER_URL))
     parser.add_argument("--port", type=int, help="MQTT Port", default=None)
-    parser.add_argument("--mode", type=str, choices=["live", "history"], default="live", help="Simulation mode")
+    parser.add_argument("--mode", type=str, choices=["live", "history", "replay"], default="live", help="Simulation mode")
+    parser.add_argument("--engine", type=str, choices=["object", "fleet"], default=os.getenv("SIMULATOR_ENGINE", "object"), help="Per-object Asset model or vectorized NumPy fleet")
+    parser.add_argument("--fleet", type=str, default=os.getenv("SIMULATOR_FLEET"), help="Fleet file: YAML/JSON spec or CSV/Parquet asset list (implies the fleet engine)")
+    parser.add_argument("--fleet-size", type=int, default=int(os.getenv("SIMULATOR_FLEET_SIZE", "0")), help="Synthetic fleet size for the fleet engine (0 = demo fleet)")
+    # Live scheduling options
+    parser.add_argument("--scheduler", type=str, choices=["loop", "async"], default=os.getenv("SIMULATOR_SCHEDULER", "loop"), help="Live: fixed 10s loop or asyncio per-asset scheduler (fleet engine)")
+    parser.add_argument("--interval", action="append", default=[], metavar="KEY=SECONDS", help="Live async: reporting interval per asset type or asset id, e.g. charger=30 (repeatable)")
+    parser.add_argument("--default-interval", type=float, default=10, help="Live async: default reporting interval in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Live async: +/- fraction of jitter applied to each interval")
+    parser.add_argument("--log-sample", type=float, default=0.0, help="Live async: fraction of messages logged individually")
+    parser.add_argument("--log-every", type=float, default=10.0, help="Live async: seconds between throughput summaries")
+    # Output sink options
+    parser.add_argument("--sink", type=str, choices=["mqtt", "kafka", "jsonl", "parquet"], default=os.getenv("SIMULATOR_SINK", "mqtt"), help="Where telemetry is written")
+    parser.add_argument("--output", type=str, default=None, help="Output file for jsonl (.jsonl / .jsonl.gz) and parquet sinks")
+    parser.add_argument("--kafka-brokers", type=str, default=os.getenv("KAFKA_BROKERS", os.getenv("ConnectionStrings__messaging")), help="Kafka bootstrap servers for the kafka sink")
+    parser.add_argument("--topic", type=str, default=TOPIC, help="MQTT/Kafka topic")
+    parser.add_argument("--input", type=str, default=None, help="Replay: recorded JSONL/Parquet file")
+    parser.add_argument("--speed", type=float, default=0, help="Replay: pace at N x the recorded rate (0 = as fast as possible)")
+    parser.add_argument("--restamp", action="store_true", help="Replay: shift timestamps to now and derive fresh event ids")
+    # Reproducibility options
+    parser.add_argument("--seed", type=int, default=int(os.environ["SIMULATOR_SEED"]) if os.getenv("SIMULATOR_SEED") else None, help="Seed for reproducible values, event ids and virtual timestamps (implies the fleet engine)")
+    parser.add_argument("--start", type=str, default=None, help="Virtual clock start / history start (ISO-8601 UTC); defaults to 2025-01-01 when seeded")
+    # Wire encoding options (mqtt/kafka sinks). Only the default (one JSON reading per
+    # message) is read by EMMA.Ingestion and the Fluent Bit bridge: the rest is for
+    # benchmarking the wire format against a test broker
+    parser.add_argument("--serializer", type=str, choices=["json", "orjson", "msgpack"], default="json", help="Message serializer (non-json: benchmarking only, not read by ingestion)")
+    parser.add_argument("--compression", type=str, choices=["none", "gzip", "zlib"], default="none", help="Per-message compression (benchmarking only, not read by ingestion)")
+    parser.add_argument("--batch-size", type=int, default=1, help="Readings per message; > 1 publishes batched envelopes (benchmarking only, not read by ingestion)")
+    parser.add_argument("--batch-by", type=str, choices=["fleet", "asset"], default="fleet", help="Envelope grouping: any assets, or one asset per envelope")
+    # History backfill options
+    parser.add_argument("--days", type=float, default=30, help="History: days to backfill")
+    parser.add_argument("--step-minutes", type=float, default=60, help="History: minutes between readings")
+    parser.add_argument("--workers", type=int, default=None, help="History: worker processes (default: CPU count)")
+    parser.add_argument("--time-shards", type=int, default=1, help="History: split the time range across workers too")
+    parser.add_argument("--rate", type=float, default=0, help="Target messages/sec (history: total across workers, async live: publish pacing; 0 = unlimited)")
+    parser.add_argument("--max-inflight", type=int, default=1000, help="Max unacknowledged MQTT publishes per client")
     
     args = parser.parse_args()
     
@@ -236,4 +401,64 @@ if __name__ == "__main__":
     if broker_port is None:
         broker_port = int(os.getenv("MQTT_BROKER_PORT", DEFAULT_BROKER_PORT))
     
-    run_simulation(broker_url, broker_port, args.mode)
+    if args.sink == "mqtt":
+        # Backfills publish at QoS1 so losses show up in the final report
+        sink_spec = {
+            "kind": "mqtt",
+            "broker_url": broker_url,
+            "broker_port": broker_port,
+            "topic": args.topic,
+            "qos": 1 if args.mode == "history" else 0,
+            "max_inflight": args.max_inflight,
+        }
+    elif args.sink == "kafka":
+        if not args.kafka_brokers:
+            parser.error("--kafka-brokers (or KAFKA_BROKERS) is required for the kafka sink")
+        sink_spec = {"kind": "kafka", "brokers": args.kafka_brokers, "topic": args.topic}
+    else:
+        if not args.output:
+            parser.error(f"--output is required for the {args.sink} sink")
+        sink_spec = {"kind": args.sink, "path": args.output}
+
+    if args.serializer != "json" or args.compression != "none" or args.batch_size > 1:
+        if args.sink not in ("mqtt", "kafka"):
+            parser.error("--serializer/--compression/--batch-size only apply to the mqtt and kafka sinks")
+        print("Warning: EMMA.Ingestion and the Fluent Bit bridge only read single JSON readings; "
+              "these messages are for benchmarking and won't be ingested")
+        sink_spec["encoding"] = {
+            "serializer": args.serializer,
+            "compression": args.compression,
+            "batch_size": args.batch_size,
+            "batch_by": args.batch_by,
+        }
+    if args.seed is not None:
+        sink_spec.setdefault("encoding", {})["seed"] = args.seed
+
+    if args.mode == "replay" and not args.input:
+        parser.error("--input is required for replay mode")
+
+    backfill = {
+        "days": args.days,
+        "step": timedelta(minutes=args.step_minutes),
+        "workers": args.workers,
+        "time_shards": args.time_shards,
+        "rate": args.rate,
+    }
+    intervals = {}
+    for item in args.interval:
+        key, sep, value = item.partition("=")
+        if not sep:
+            parser.error(f"--interval expects KEY=SECONDS, got {item!r}")
+        intervals[key] = float(value)
+    live = {
+        "default_interval": args.default_interval,
+        "intervals": intervals,
+        "jitter": args.jitter,
+        "rate": args.rate,
+        "log_every": args.log_every,
+        "log_sample": args.log_sample,
+    }
+    run_simulation(sink_spec, args.mode, engine=args.engine, fleet_size=args.fleet_size, backfill=backfill,
+                   input_path=args.input, scheduler=args.scheduler, live=live, fleet_path=args.fleet,
+                   seed=args.seed, start_time=parse_time(args.start) if args.start else None,
+                   replay={"speed": args.speed, "restamp": args.restamp})
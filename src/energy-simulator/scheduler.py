@@ -0,0 +1,181 @@
+import asyncio
+import heapq
+import math
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from fleet import ASSET_TYPES, TICK_SECONDS
+
+# Max readings generated per scheduler wake-up, and how often to yield to the loop
+MAX_BATCH = 10000
+YIELD_EVERY = 1000
+# How often a full sink (in-flight window, producer queue) is checked for room again
+BACKPRESSURE_SLEEP = 0.01
+
+
+def build_intervals(fleet, default=TICK_SECONDS, overrides=None):
+    """
+    Per-asset reporting interval in seconds. `overrides` maps either an asset type
+    ("inverter", "charger") or an asset id to an interval; asset ids win.
+    """
+    intervals = np.full(len(fleet), float(default))
+    overrides = overrides or {}
+
+    for type_code, type_name in enumerate(ASSET_TYPES):
+        if type_name in overrides:
+            intervals[fleet.asset_type == type_code] = float(overrides[type_name])
+
+    asset_overrides = {k: v for k, v in overrides.items() if k not in ASSET_TYPES}
+    if asset_overrides:
+        for i, asset_id in enumerate(fleet.asset_ids):
+            if asset_id in asset_overrides:
+                intervals[i] = float(asset_overrides[asset_id])
+    return intervals
+
+
+class AsyncRateLimiter:
+    """Smooths publishes to at most `rate` per second (0 = unlimited) without per-message sleeps."""
+
+    MIN_SLEEP = 0.005
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_at = time.monotonic()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self.next_at < now:
+            # Don't accumulate credit while idle
+            self.next_at = now
+        self.next_at += self.interval
+        delay = self.next_at - now
+        if delay >= self.MIN_SLEEP:
+            await asyncio.sleep(delay)
+
+
+class LiveScheduler:
+    """
+    Heap-based live scheduler: every asset reports on its own interval (with
+    +/- `jitter` fraction per cycle), and initial phases are spread across one
+    interval so a large fleet publishes as a smooth stream instead of bursts.
+
+    Assets that fall due together are advanced in one vectorized FleetEngine tick.
+
+    With `clock_start` the scheduler runs on a virtual clock: due assets are
+    released in fixed `quantum` steps and stamped clock_start + offset, so with a
+    seeded fleet and rng the stream is identical from run to run regardless of
+    how the event loop is scheduled.
+    """
+
+    def __init__(self, fleet, sink, tenant_id, intervals, jitter=0.1, rate=0,
+                 log_every=10.0, log_sample=0.0, flush_every=1.0, rng=None,
+                 clock_start=None, quantum=0.1):
+        self.fleet = fleet
+        self.sink = sink
+        self.tenant_id = tenant_id
+        self.intervals = np.asarray(intervals, dtype=np.float64)
+        self.jitter = jitter
+        self.limiter = AsyncRateLimiter(rate)
+        self.log_every = log_every
+        self.log_sample = log_sample
+        self.flush_every = flush_every
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.clock_start = clock_start
+        self.quantum = quantum
+
+        # Due times are offsets in seconds from the scheduler start
+        now = time.monotonic()
+        self._t0 = now
+        first_due = self.rng.uniform(0, 1, len(fleet)) * self.intervals
+        self._heap = list(zip(first_due.tolist(), range(len(fleet))))
+        heapq.heapify(self._heap)
+
+        self._stopped = False
+        self._window_sent = 0
+        self._window_lag = 0.0
+        self._window_started = now
+        self._last_flush = now
+
+    def stop(self):
+        self._stopped = True
+
+    def _pop_due(self, now):
+        heap = self._heap
+        due = []
+        index = []
+        while heap and heap[0][0] <= now and len(index) < MAX_BATCH:
+            due_at, i = heapq.heappop(heap)
+            due.append(due_at)
+            index.append(i)
+        if not index:
+            return None, 0.0
+
+        index = np.asarray(index, dtype=np.intp)
+        due = np.asarray(due)
+        intervals = self.intervals[index]
+        jitter = self.rng.uniform(-self.jitter, self.jitter, len(index)) if self.jitter else 0.0
+        # Schedule from the due time (not now) so a late batch doesn't drift the cadence
+        next_due = np.maximum(due + intervals * (1 + jitter), now)
+        for due_at, i in zip(next_due.tolist(), index.tolist()):
+            heapq.heappush(heap, (due_at, i))
+        return index, float(now - due.min())
+
+    async def _publish(self, index, timestamp=None):
+        tick = self.fleet.tick(index=index, dt_seconds=self.intervals[index])
+        sample = self.rng.random(len(index)) < self.log_sample if self.log_sample else None
+
+        for j, telemetry in enumerate(self.fleet.payloads(tick, self.tenant_id, timestamp)):
+            await self.limiter.wait()
+            while not self.sink.ready():
+                # Wait for acks here rather than blocking the event loop inside write()
+                await asyncio.sleep(BACKPRESSURE_SLEEP)
+            self.sink.write(telemetry)
+            if sample is not None and sample[j]:
+                print(f"[{datetime.now().time()}] Sent {telemetry['header']['asset_id']}: {telemetry['measurements']['power_kw']:.2f}kW")
+            if j % YIELD_EVERY == YIELD_EVERY - 1:
+                await asyncio.sleep(0)
+        self._window_sent += len(index)
+
+    def _maybe_log(self, now):
+        elapsed = now - self._window_started
+        if elapsed < self.log_every:
+            return
+        stats = self.sink.stats()
+        print(f"[{datetime.now().time()}] Sent {self._window_sent} messages in {elapsed:.1f}s "
+              f"({self._window_sent / elapsed:.0f} msg/s), max lag {self._window_lag * 1000:.0f} ms, "
+              f"totals {stats}")
+        self._window_sent = 0
+        self._window_lag = 0.0
+        self._window_started = now
+
+    async def run(self):
+        while not self._stopped and self._heap:
+            elapsed = time.monotonic() - self._t0
+            due = self._heap[0][0]
+            if self.clock_start is not None:
+                # Virtual clock: release everything due up to the next quantum boundary
+                due = math.ceil(due / self.quantum) * self.quantum
+            delay = due - elapsed
+            if delay > 0:
+                # Wake up at least once a second to honour stop() and keep logging
+                await asyncio.sleep(min(delay, 1.0))
+            elif self.clock_start is not None:
+                index, _ = self._pop_due(due)
+                self._window_lag = max(self._window_lag, elapsed - due)
+                await self._publish(index, self.clock_start + timedelta(seconds=due))
+            else:
+                index, lag = self._pop_due(elapsed)
+                self._window_lag = max(self._window_lag, lag)
+                await self._publish(index)
+
+            now = time.monotonic()
+            if now - self._last_flush >= self.flush_every:
+                # Bounds how long partially filled envelopes / buffers wait; off the
+                # loop, since publishing many envelopes can wait for the broker
+                await asyncio.get_running_loop().run_in_executor(None, self.sink.flush, 0)
+                self._last_flush = now
+            self._maybe_log(now)
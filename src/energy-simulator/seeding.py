@@ -0,0 +1,32 @@
+import random
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Virtual clock origin for seeded runs that don't pass an explicit --start
+SEED_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def numpy_rng(seed=None, *stream):
+    """Fresh generator when unseeded; otherwise an independent, reproducible stream per (seed, *stream)."""
+    if seed is None:
+        return np.random.default_rng()
+    return np.random.default_rng([seed, *stream])
+
+
+def uuid_factory(seed=None, *stream):
+    """uuid.uuid4 when unseeded; otherwise a reproducible sequence of version-4 UUIDs."""
+    if seed is None:
+        return uuid.uuid4
+    rng = random.Random(":".join(str(s) for s in (seed, *stream)))
+
+    def next_uuid():
+        return uuid.UUID(int=rng.getrandbits(128), version=4)
+    return next_uuid
+
+
+def parse_time(value):
+    # ISO-8601, "Z" suffix allowed; naive values are taken as UTC
+    ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
@@ -0,0 +1,465 @@
+import gzip
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from encoding import TelemetryEncoder
+from seeding import uuid_factory
+
+TELEMETRY_TOPIC = "telemetry-raw"
+
+# Flattened column layout used by the columnar sink. The first columns mirror
+# asset_metrics (time, asset_id, power_kw, energy_total_kwh, temperature) so the
+# files map column for column onto the table, without going through the broker
+# path. Postgres COPY doesn't read Parquet: convert to CSV first (e.g. with
+# pyarrow.csv or DuckDB), or load with a Parquet-aware tool.
+PARQUET_COLUMNS = (
+    "time", "asset_id", "power_kw", "energy_total_kwh", "temperature",
+    "tenant_id", "event_id", "latitude", "longitude", "market_zone", "country_code",
+    "virtual_time_hour",
+)
+
+
+class InflightWindow:
+    """
+    Bounds the number of unacknowledged publishes and counts acknowledged readings.
+    Each message carries a weight (readings per message) so envelopes are
+    accounted in readings, like single-reading messages.
+    """
+
+    def __init__(self, max_inflight):
+        self.max_inflight = max_inflight
+        self._slots = threading.Semaphore(max_inflight)
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._weights = {}
+        self._early_acks = set()
+        self.sent = 0
+        self.acked = 0
+
+    def acquire(self, timeout):
+        if not self._slots.acquire(timeout=timeout):
+            return False
+        with self._lock:
+            self._inflight += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self._inflight -= 1
+        self._slots.release()
+
+    def full(self):
+        with self._lock:
+            return self._inflight >= self.max_inflight
+
+    def mark_sent(self, mid, weight=1):
+        with self._lock:
+            self.sent += weight
+            if mid in self._early_acks:
+                # The ack raced ahead of publish() returning
+                self._early_acks.discard(mid)
+                self.acked += weight
+            else:
+                self._weights[mid] = weight
+
+    def mark_acked(self, mid):
+        with self._lock:
+            weight = self._weights.pop(mid, None)
+            if weight is None:
+                self._early_acks.add(mid)
+            else:
+                self.acked += weight
+            self._inflight -= 1
+        self._slots.release()
+
+    def pending(self):
+        with self._lock:
+            return self.sent - self.acked
+
+
+class Sink:
+    """Destination for telemetry payloads (dicts shaped like Asset.generate_telemetry)."""
+
+    def __init__(self):
+        self.sent = 0
+        self.acked = 0
+        self.failed = 0
+
+    def write(self, payload):
+        raise NotImplementedError
+
+    def publish(self, data, key=None, weight=1):
+        """Send pre-encoded bytes carrying `weight` readings (message sinks only)."""
+        raise NotImplementedError(f"{type(self).__name__} does not accept pre-encoded messages")
+
+    def ready(self):
+        """Whether the next write goes out without waiting for the broker to catch up."""
+        return True
+
+    def write_batch(self, payloads):
+        for payload in payloads:
+            self.write(payload)
+
+    def flush(self, timeout=30):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def stats(self):
+        return {"sent": self.sent, "acked": self.acked, "failed": self.failed}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MqttSink(Sink):
+    """Publishes through the MQTT broker (Fluent Bit bridge), one message per payload."""
+
+    def __init__(self, broker_url, broker_port, topic=TELEMETRY_TOPIC, qos=0, max_inflight=1000, client_id=None, encoder=None):
+        super().__init__()
+        try:
+            import paho.mqtt.client as mqtt
+        except ImportError:
+            raise RuntimeError("paho-mqtt is not installed. Please install it using: pip install paho-mqtt")
+        self._mqtt = mqtt
+
+        self.topic = topic
+        self.qos = qos
+        self.encoder = encoder or TelemetryEncoder()
+        self.window = InflightWindow(max_inflight)
+
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id or f"energy_simulator_{uuid.uuid4()}")
+        self.client.max_inflight_messages_set(max_inflight)
+        # on_publish fires on PUBACK for QoS1, and once written to the socket for QoS0
+        self.client.on_publish = lambda client, userdata, mid, reason_code=None, properties=None: self.window.mark_acked(mid)
+        self.client.connect(broker_url, broker_port)
+        self.client.loop_start()
+
+    def write(self, payload):
+        self.publish(self.encoder.encode_reading(payload))
+
+    def publish(self, data, key=None, weight=1):
+        if not self.window.acquire(timeout=30):
+            self.failed += weight
+            return
+        info = self.client.publish(self.topic, data, qos=self.qos)
+        # NO_CONN still queues QoS>0 messages in paho; they go out on reconnect
+        if info.rc == self._mqtt.MQTT_ERR_SUCCESS or (self.qos > 0 and info.rc == self._mqtt.MQTT_ERR_NO_CONN):
+            self.window.mark_sent(info.mid, weight)
+            self.sent += weight
+        else:
+            self.window.release()
+            self.failed += weight
+
+    def ready(self):
+        return not self.window.full()
+
+    def flush(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while self.window.pending() and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def stats(self):
+        return {"sent": self.sent, "acked": self.window.acked, "failed": self.failed}
+
+    def close(self):
+        self.flush()
+        self.client.loop_stop()
+        self.client.disconnect()
+
+
+class KafkaSink(Sink):
+    """Produces straight to Kafka, bypassing the MQTT bridge. Keyed by asset_id."""
+
+    def __init__(self, brokers, topic=TELEMETRY_TOPIC, client_id="energy-simulator", encoder=None, **config):
+        super().__init__()
+        try:
+            from confluent_kafka import Producer
+        except ImportError:
+            raise RuntimeError("confluent-kafka is not installed. Please install it using: pip install confluent-kafka")
+
+        self.topic = topic
+        self.encoder = encoder or TelemetryEncoder()
+        conf = {
+            "bootstrap.servers": brokers,
+            "client.id": client_id,
+            "linger.ms": 20,
+            "batch.num.messages": 10000,
+            "compression.type": "lz4",
+            "queue.buffering.max.messages": 500000,
+        }
+        conf.update(config)
+        self.producer = Producer(conf)
+        self.max_queued = int(conf["queue.buffering.max.messages"])
+
+    def _on_delivery(self, weight):
+        def callback(err, msg):
+            if err is not None:
+                self.failed += weight
+            else:
+                self.acked += weight
+        return callback
+
+    def write(self, payload):
+        self.publish(self.encoder.encode_reading(payload), key=payload["header"]["asset_id"])
+
+    def publish(self, data, key=None, weight=1):
+        if isinstance(key, str):
+            key = key.encode("utf-8")
+        while True:
+            try:
+                self.producer.produce(self.topic, data, key=key, on_delivery=self._on_delivery(weight))
+                break
+            except BufferError:
+                # Local queue full: serve delivery callbacks until there's room
+                self.producer.poll(0.1)
+        self.sent += weight
+        self.producer.poll(0)
+
+    def ready(self):
+        if len(self.producer) < self.max_queued:
+            return True
+        self.producer.poll(0)
+        return len(self.producer) < self.max_queued
+
+    def flush(self, timeout=30):
+        self.producer.flush(timeout)
+
+
+class JsonlSink(Sink):
+    """Writes one JSON document per line; gzip-compressed when the path ends in .gz."""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        if path.endswith(".gz"):
+            self._file = gzip.open(path, "wt", encoding="utf-8", compresslevel=6)
+        else:
+            self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, payload):
+        self._file.write(json.dumps(payload))
+        self._file.write("\n")
+        self.sent += 1
+        self.acked += 1
+
+    def flush(self, timeout=30):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetSink(Sink):
+    """
+    Buffers payloads into flattened columns and writes zstd-compressed Parquet
+    row groups, for analysis tools and bulk loaders (see PARQUET_COLUMNS).
+    """
+
+    def __init__(self, path, row_group_size=100_000):
+        super().__init__()
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("pyarrow is not installed. Please install it using: pip install pyarrow")
+        self._pa = pa
+        self.path = path
+        self.row_group_size = row_group_size
+        self.schema = pa.schema([
+            ("time", pa.timestamp("us", tz="UTC")),
+            ("asset_id", pa.string()),
+            ("power_kw", pa.float64()),
+            ("energy_total_kwh", pa.float64()),
+            ("temperature", pa.float64()),
+            ("tenant_id", pa.string()),
+            ("event_id", pa.string()),
+            ("latitude", pa.float64()),
+            ("longitude", pa.float64()),
+            ("market_zone", pa.string()),
+            ("country_code", pa.string()),
+            ("virtual_time_hour", pa.float64()),
+        ])
+        self._writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+        self._columns = {name: [] for name in PARQUET_COLUMNS}
+        # Readings from one tick share a timestamp string; parse it once
+        self._last_ts = (None, None)
+
+    def _parse_time(self, ts_str):
+        if self._last_ts[0] != ts_str:
+            self._last_ts = (ts_str, datetime.fromisoformat(ts_str.replace("Z", "+00:00")))
+        return self._last_ts[1]
+
+    def write(self, payload):
+        header = payload["header"]
+        location = payload.get("location") or {}
+        measurements = payload["measurements"]
+        cols = self._columns
+        cols["time"].append(self._parse_time(payload["timestamp"]))
+        cols["asset_id"].append(header["asset_id"])
+        cols["power_kw"].append(measurements.get("power_kw"))
+        cols["energy_total_kwh"].append(measurements.get("energy_total_kwh"))
+        cols["temperature"].append(measurements.get("inverter_temp_c"))
+        cols["tenant_id"].append(header.get("tenant_id"))
+        cols["event_id"].append(header.get("event_id"))
+        cols["latitude"].append(location.get("latitude"))
+        cols["longitude"].append(location.get("longitude"))
+        cols["market_zone"].append(location.get("market_zone"))
+        cols["country_code"].append(location.get("country_code"))
+        cols["virtual_time_hour"].append(payload.get("virtual_time_hour"))
+        self.sent += 1
+        if len(cols["time"]) >= self.row_group_size:
+            self.flush()
+
+    def flush(self, timeout=30):
+        n = len(self._columns["time"])
+        if not n:
+            return
+        table = self._pa.Table.from_pydict(self._columns, schema=self.schema)
+        self._writer.write_table(table)
+        self._columns = {name: [] for name in PARQUET_COLUMNS}
+        self.acked += n
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+
+
+class EnvelopeSink(Sink):
+    """
+    Buffers payloads and publishes them as batched envelopes through a message sink.
+
+    batch_by="fleet" packs the next N readings of any assets into one message;
+    batch_by="asset" packs N consecutive readings of the same asset (keyed by asset_id).
+    """
+
+    def __init__(self, inner, encoder, batch_size=100, batch_by="fleet"):
+        super().__init__()
+        if batch_by not in ("fleet", "asset"):
+            raise ValueError(f"Unknown batch_by: {batch_by}")
+        self.inner = inner
+        self.encoder = encoder
+        self.batch_size = batch_size
+        self.batch_by = batch_by
+        self.messages = 0
+        self._buffers = {}
+
+    def write(self, payload):
+        header = payload["header"]
+        key = header["asset_id"] if self.batch_by == "asset" else header["tenant_id"]
+        buffer = self._buffers.setdefault(key, [])
+        buffer.append(payload)
+        if len(buffer) >= self.batch_size:
+            self._publish(key, self._buffers.pop(key))
+
+    def _publish(self, key, payloads):
+        self.inner.publish(self.encoder.encode_envelope(payloads), key=key, weight=len(payloads))
+        self.messages += 1
+
+    def ready(self):
+        return self.inner.ready()
+
+    def flush(self, timeout=30):
+        buffers, self._buffers = self._buffers, {}
+        for key, payloads in buffers.items():
+            self._publish(key, payloads)
+        self.inner.flush(timeout)
+
+    def stats(self):
+        return dict(self.inner.stats(), messages=self.messages)
+
+    def close(self):
+        self.flush()
+        self.inner.close()
+
+
+def part_path(path, part):
+    # history.jsonl.gz -> history.part003.jsonl.gz
+    directory, name = os.path.split(path)
+    stem, dot, ext = name.partition(".")
+    return os.path.join(directory, f"{stem}.part{part:03d}{dot}{ext}")
+
+
+def create_sink(spec, part=None):
+    """
+    Build a sink from a picklable spec dict, e.g.
+    {"kind": "mqtt", "broker_url": ..., "broker_port": ..., "qos": 1}
+    {"kind": "kafka", "brokers": ..., "topic": ...}
+    {"kind": "jsonl", "path": "history.jsonl.gz"} / {"kind": "parquet", "path": "history.parquet"}
+
+    Message sinks (mqtt/kafka) also accept an "encoding" dict:
+    {"serializer": "json|orjson|msgpack", "compression": "none|gzip|zlib",
+     "batch_size": N, "batch_by": "fleet|asset", "seed": S}; batch_size > 1 switches to envelopes.
+
+    `part` gives each backfill worker its own file (or MQTT client id).
+    """
+    spec = dict(spec)
+    kind = spec.pop("kind", "mqtt")
+    encoding = dict(spec.pop("encoding", None) or {})
+    batch_size = encoding.pop("batch_size", 1)
+    batch_by = encoding.pop("batch_by", "fleet")
+    seed = encoding.pop("seed", None)
+
+    if kind in ("mqtt", "kafka"):
+        # Seeded runs get reproducible envelope batch ids (one stream per worker)
+        encoder = TelemetryEncoder(new_id=uuid_factory(seed, part if part is not None else 0), **encoding)
+        if kind == "mqtt":
+            if part is not None:
+                spec["client_id"] = f"energy_simulator_{part}_{uuid.uuid4()}"
+            sink = MqttSink(encoder=encoder, **spec)
+        else:
+            sink = KafkaSink(encoder=encoder, **spec)
+        if batch_size > 1:
+            return EnvelopeSink(sink, encoder, batch_size=batch_size, batch_by=batch_by)
+        return sink
+    if encoding or batch_size > 1:
+        raise ValueError(f"Encoding options are only supported by mqtt/kafka sinks, not {kind}")
+    if kind in ("jsonl", "parquet"):
+        if part is not None:
+            spec["path"] = part_path(spec["path"], part)
+        return JsonlSink(**spec) if kind == "jsonl" else ParquetSink(**spec)
+    raise ValueError(f"Unknown sink kind: {kind}")
+
+
+def read_payloads(path):
+    """Yield telemetry payloads back from a JSONL(.gz) or Parquet file written by the sinks above."""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path)
+        for batch in parquet.iter_batches():
+            for row in batch.to_pylist():
+                measurements = {"power_kw": row["power_kw"], "energy_total_kwh": row["energy_total_kwh"]}
+                if row["temperature"] is not None:
+                    measurements["inverter_temp_c"] = row["temperature"]
+                yield {
+                    "header": {
+                        "event_id": row["event_id"],
+                        "version": "1.0",
+                        "asset_id": row["asset_id"],
+                        "tenant_id": row["tenant_id"]
+                    },
+                    "location": {
+                        "latitude": row["latitude"],
+                        "longitude": row["longitude"],
+                        "market_zone": row["market_zone"],
+                        "country_code": row["country_code"]
+                    },
+                    "measurements": measurements,
+                    "timestamp": row["time"].isoformat().replace("+00:00", "Z"),
+                    "virtual_time_hour": row["virtual_time_hour"]
+                }
+        return
+
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
@@ -1,6 +1,11 @@
 import sys
 import json
 import time
+import uuid
+import random
+import argparse
+import threading
+from datetime import datetime, timezone
 
 try:
     import paho.mqtt.client as mqtt
@@ -9,14 +14,17 @@ except ImportError:
     print("Please install it using: pip install paho-mqtt")
     sys.exit(1)
 
+DEFAULT_TOPIC = "telemetry-raw"
+
+
 def test_bridge(port):
     broker = "localhost"
-    topic = "telemetry-raw"
-    
+    topic = DEFAULT_TOPIC
+
     print(f"Connecting to MQTT broker at {broker}:{port}...")
-    
+
     client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, "test_publisher")
-    
+
     try:
         client.connect(broker, int(port))
     except Exception as e:
@@ -29,12 +37,12 @@ def test_bridge(port):
         "value": 123.45,
         "message": "Hello from test script"
     }
-    
+
     print(f"Publishing to topic '{topic}': {json.dumps(payload)}")
-    
+
     info = client.publish(topic, json.dumps(payload))
     info.wait_for_publish()
-    
+
     if info.rc == mqtt.MQTT_ERR_SUCCESS:
         print("Message published successfully!")
     else:
@@ -42,10 +50,333 @@ def test_bridge(port):
 
     client.disconnect()
 
+
+# ---------------------------------------------------------------------------
+# End-to-end benchmark
+#
+# Publishes telemetry-shaped messages at a fixed rate, each stamped with a run
+# id, a sequence number and the send time, and measures when they arrive on the
+# far side: an MQTT subscriber, the Kafka topic behind the bridge, or rows in
+# asset_metrics written by EMMA.Ingestion.
+# ---------------------------------------------------------------------------
+
+class LatencyRecorder:
+    """Thread-safe record of send and receive times per sequence number."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sent_ns = {}
+        self.received_ns = {}
+        self.duplicates = 0
+
+    def sent(self, seq, ts_ns):
+        with self._lock:
+            self.sent_ns[seq] = ts_ns
+
+    def received(self, seq, ts_ns):
+        with self._lock:
+            if seq in self.received_ns:
+                self.duplicates += 1
+            else:
+                self.received_ns[seq] = ts_ns
+
+    def has(self, seq):
+        with self._lock:
+            return seq in self.received_ns
+
+    def received_count(self):
+        with self._lock:
+            return len(self.received_ns)
+
+    def report(self, publish_elapsed):
+        with self._lock:
+            latencies = sorted(
+                (self.received_ns[seq] - sent) / 1e6
+                for seq, sent in self.sent_ns.items()
+                if seq in self.received_ns
+            )
+            received = sorted(self.received_ns.values())
+            sent_count = len(self.sent_ns)
+            duplicates = self.duplicates
+
+        def percentile(p):
+            if not latencies:
+                return None
+            k = min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))
+            return round(latencies[k], 2)
+
+        receive_span = (received[-1] - received[0]) / 1e9 if len(received) > 1 else 0.0
+        lost = sent_count - len(latencies)
+        return {
+            "sent": sent_count,
+            "received": len(latencies),
+            "lost": lost,
+            "loss_ratio": round(lost / sent_count, 6) if sent_count else 0.0,
+            "duplicates": duplicates,
+            "publish_rate_msgs_per_sec": round(sent_count / publish_elapsed, 1) if publish_elapsed else 0.0,
+            "sustained_throughput_msgs_per_sec": round(len(received) / receive_span, 1) if receive_span else 0.0,
+            "latency_ms": {
+                "min": round(latencies[0], 2) if latencies else None,
+                "p50": percentile(50),
+                "p95": percentile(95),
+                "p99": percentile(99),
+                "max": round(latencies[-1], 2) if latencies else None,
+            },
+        }
+
+
+def _bench_fields(doc, run_id):
+    # Fluent Bit may add its own keys; we only need our "bench" stamp
+    bench = doc.get("bench") if isinstance(doc, dict) else None
+    if not bench or bench.get("run_id") != run_id:
+        return None
+    return bench["seq"]
+
+
+class MqttSubscriber:
+    """Far side on a plain MQTT broker (e.g. a local mosquitto)."""
+
+    def __init__(self, broker, port, topic, run_id, recorder, qos=1):
+        self.run_id = run_id
+        self.recorder = recorder
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, f"bench_subscriber_{run_id}")
+        self.client.on_message = self._on_message
+        self.client.connect(broker, int(port))
+        self.client.subscribe(topic, qos=qos)
+
+    def _on_message(self, client, userdata, msg):
+        now = time.time_ns()
+        try:
+            seq = _bench_fields(json.loads(msg.payload), self.run_id)
+        except ValueError:
+            return
+        if seq is not None:
+            self.recorder.received(seq, now)
+
+    def start(self):
+        self.client.loop_start()
+        # Give the SUBSCRIBE a moment to land before publishing starts
+        time.sleep(0.5)
+
+    def stop(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+
+class KafkaSubscriber:
+    """Far side on the Kafka topic the bridge writes to (or a single-node Kafka/Redpanda)."""
+
+    def __init__(self, brokers, topic, run_id, recorder):
+        try:
+            from confluent_kafka import Consumer
+        except ImportError:
+            print("Error: confluent-kafka is not installed.")
+            print("Please install it using: pip install confluent-kafka")
+            sys.exit(1)
+        self.run_id = run_id
+        self.recorder = recorder
+        self.consumer = Consumer({
+            "bootstrap.servers": brokers,
+            "group.id": f"bench-{run_id}",
+            "auto.offset.reset": "latest",
+            "enable.auto.commit": False,
+            "fetch.wait.max.ms": 10,
+        })
+        self.consumer.subscribe([topic])
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            msg = self.consumer.poll(0.1)
+            if msg is None or msg.error():
+                continue
+            now = time.time_ns()
+            try:
+                seq = _bench_fields(json.loads(msg.value()), self.run_id)
+            except ValueError:
+                continue
+            if seq is not None:
+                self.recorder.received(seq, now)
+
+    def start(self):
+        self._thread.start()
+        # Wait for partition assignment so "latest" doesn't skip our first messages
+        deadline = time.time() + 10
+        while not self.consumer.assignment() and time.time() < deadline:
+            time.sleep(0.1)
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self.consumer.close()
+
+
+class AssetMetricsPoller:
+    """
+    Far side in TimescaleDB: polls asset_metrics for this run's rows. Bench rows
+    are marked with temperature = run marker and carry the sequence number in
+    energy_total_kwh. Latency resolution is bounded by `poll_interval`.
+    """
+
+    def __init__(self, dsn, run_marker, started_at, recorder, poll_interval=0.1):
+        try:
+            import psycopg2
+        except ImportError:
+            print("Error: psycopg2 is not installed.")
+            print("Please install it using: pip install psycopg2-binary")
+            sys.exit(1)
+        self.conn = psycopg2.connect(dsn)
+        self.conn.autocommit = True
+        self.run_marker = run_marker
+        self.started_at = started_at
+        self.recorder = recorder
+        self.poll_interval = poll_interval
+        self._low_water = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def _loop(self):
+        with self.conn.cursor() as cur:
+            while not self._stopped.is_set():
+                # Only look at sequence numbers we haven't seen contiguously yet
+                cur.execute(
+                    "SELECT energy_total_kwh FROM asset_metrics "
+                    "WHERE time >= %s AND temperature = %s AND energy_total_kwh >= %s",
+                    (self.started_at, self.run_marker, self._low_water),
+                )
+                now = time.time_ns()
+                for (seq,) in cur.fetchall():
+                    self.recorder.received(int(seq), now)
+                while self.recorder.has(self._low_water):
+                    self._low_water += 1
+                self._stopped.wait(self.poll_interval)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self.conn.close()
+
+
+def build_message(run_id, run_marker, seq, tenant_id, assets, padding):
+    sent_ns = time.time_ns()
+    payload = {
+        "header": {
+            "event_id": str(uuid.uuid4()),
+            "version": "1.0",
+            "asset_id": f"BENCH-{run_id}-{seq % assets:04d}",
+            "tenant_id": tenant_id
+        },
+        "location": {"latitude": 40.4168, "longitude": -3.7038, "market_zone": "BZN|ES", "country_code": "ES"},
+        # energy_total_kwh carries the sequence number and inverter_temp_c the
+        # run marker, so rows can be traced in asset_metrics
+        "measurements": {"power_kw": 0.0, "energy_total_kwh": float(seq), "inverter_temp_c": run_marker},
+        "timestamp": datetime.fromtimestamp(sent_ns / 1e9, tz=timezone.utc).isoformat().replace("+00:00", "Z"),
+        "bench": {"run_id": run_id, "seq": seq, "sent_ns": sent_ns},
+    }
+    if padding:
+        payload["padding"] = "x" * padding
+    return payload, sent_ns
+
+
+def run_benchmark(args):
+    run_id = uuid.uuid4().hex[:8]
+    run_marker = float(random.randint(1_000_000, 9_999_999))
+    recorder = LatencyRecorder()
+    started_at = datetime.now(timezone.utc)
+
+    # Pad messages up to the requested size
+    base, _ = build_message(run_id, run_marker, 0, args.tenant, args.assets, 0)
+    padding = max(0, args.payload_bytes - len(json.dumps(base)) - len(', "padding": ""'))
+
+    if args.consumer == "mqtt":
+        subscriber = MqttSubscriber(args.sub_broker or args.broker, args.sub_port or args.port, args.topic, run_id, recorder, qos=args.qos)
+    elif args.consumer == "kafka":
+        subscriber = KafkaSubscriber(args.kafka_brokers, args.kafka_topic, run_id, recorder)
+    else:
+        subscriber = AssetMetricsPoller(args.db, run_marker, started_at, recorder, poll_interval=args.poll_interval)
+    subscriber.start()
+
+    publisher = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, f"bench_publisher_{run_id}")
+    publisher.max_inflight_messages_set(args.max_inflight)
+    publisher.connect(args.broker, int(args.port))
+    publisher.loop_start()
+
+    total = args.count or int(args.rate * args.duration)
+    print(f"Benchmark {run_id}: {total} messages at {args.rate:.0f} msg/s, ~{args.payload_bytes} bytes, "
+          f"QoS{args.qos}, consumer={args.consumer}")
+
+    interval = 1.0 / args.rate
+    next_at = time.monotonic()
+    publish_started = time.monotonic()
+    for seq in range(total):
+        delay = next_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        next_at += interval
+
+        payload, sent_ns = build_message(run_id, run_marker, seq, args.tenant, args.assets, padding)
+        recorder.sent(seq, sent_ns)
+        publisher.publish(args.topic, json.dumps(payload), qos=args.qos)
+
+        if seq and seq % max(1, int(args.rate * 5)) == 0:
+            print(f"  sent {seq}/{total}, received {recorder.received_count()}")
+    publish_elapsed = time.monotonic() - publish_started
+
+    # Let in-flight messages drain through the pipeline
+    deadline = time.monotonic() + args.drain
+    while recorder.received_count() < total and time.monotonic() < deadline:
+        time.sleep(0.1)
+
+    subscriber.stop()
+    publisher.loop_stop()
+    publisher.disconnect()
+
+    report = recorder.report(publish_elapsed)
+    report.update({"run_id": run_id, "consumer": args.consumer, "payload_bytes": args.payload_bytes,
+                   "target_rate_msgs_per_sec": args.rate, "qos": args.qos})
+    print(json.dumps(report, indent=2))
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MQTT bridge smoke test and end-to-end latency/throughput benchmark")
+    parser.add_argument("port", help="MQTT broker port")
+    parser.add_argument("--broker", default="localhost", help="MQTT broker host")
+    parser.add_argument("--topic", default=DEFAULT_TOPIC, help="MQTT topic to publish to")
+    # Benchmark mode is enabled by --duration or --count
+    parser.add_argument("--duration", type=float, default=None, help="Benchmark: seconds to publish for")
+    parser.add_argument("--count", type=int, default=None, help="Benchmark: number of messages (overrides --duration)")
+    parser.add_argument("--rate", type=float, default=100, help="Benchmark: messages/sec")
+    parser.add_argument("--payload-bytes", type=int, default=512, help="Benchmark: approximate message size")
+    parser.add_argument("--qos", type=int, choices=[0, 1], default=1, help="Benchmark: MQTT QoS")
+    parser.add_argument("--max-inflight", type=int, default=1000, help="Benchmark: max unacknowledged QoS1 publishes")
+    parser.add_argument("--assets", type=int, default=10, help="Benchmark: distinct asset ids to spread messages over")
+    parser.add_argument("--tenant", default="BENCH", help="Benchmark: tenant id stamped on messages")
+    parser.add_argument("--consumer", choices=["mqtt", "kafka", "postgres"], default="mqtt", help="Benchmark: where to observe messages")
+    parser.add_argument("--sub-broker", default=None, help="mqtt consumer: broker host (default: --broker)")
+    parser.add_argument("--sub-port", default=None, help="mqtt consumer: broker port (default: port)")
+    parser.add_argument("--kafka-brokers", default="localhost:9092", help="kafka consumer: bootstrap servers")
+    parser.add_argument("--kafka-topic", default=DEFAULT_TOPIC, help="kafka consumer: topic")
+    parser.add_argument("--db", default=None, help="postgres consumer: telemetry-db DSN")
+    parser.add_argument("--poll-interval", type=float, default=0.1, help="postgres consumer: seconds between polls")
+    parser.add_argument("--drain", type=float, default=30, help="Benchmark: seconds to wait for stragglers")
+    parser.add_argument("--json-out", default=None, help="Benchmark: also write the report to this file")
+
     if len(sys.argv) < 2:
-        print("Usage: python3 test_mqtt_bridge.py <mqtt_port>")
+        print("Usage: python3 test_mqtt_bridge.py <mqtt_port> [--duration N --rate R ...]")
         sys.exit(1)
-        
-    port = sys.argv[1]
-    test_bridge(port)
+
+    args = parser.parse_args()
+    if args.duration is None and args.count is None:
+        test_bridge(args.port)
+    else:
+        if args.consumer == "postgres" and not args.db:
+            parser.error("--db is required for the postgres consumer")
+        run_benchmark(args)